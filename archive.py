@@ -0,0 +1,336 @@
+"""
+Archive Module
+Moves old production history to the partitioned archive tables
+
+PRODUCT_BATCH and BATCH_CONSUMPTION keep only batches produced after the
+archive watermark; older batches and their consumption rows are moved to
+PRODUCT_BATCH_ARCHIVE and BATCH_CONSUMPTION_ARCHIVE, which are partitioned
+by production_date. Readers that need history (traceability, Queries 2-5,
+batch cost) add the archive only when the watermark says the requested lots
+or range can be there, so day-to-day work stays on small hot tables.
+"""
+
+from datetime import date, timedelta
+import re
+
+
+# Hot table -> archive table (same columns; consumption also carries production_date)
+ARCHIVE_TABLES = {
+    'PRODUCT_BATCH': 'PRODUCT_BATCH_ARCHIVE',
+    'BATCH_CONSUMPTION': 'BATCH_CONSUMPTION_ARCHIVE'
+}
+
+HOT_TABLE_PATTERN = re.compile(r'\b(PRODUCT_BATCH|BATCH_CONSUMPTION)\b')
+
+# Batches produced in the last year stay hot by default
+DEFAULT_RETENTION_DAYS = 365
+
+# Product batches moved per transaction
+DEFAULT_CHUNK_SIZE = 500
+
+# Rows older than the first yearly partition land in p_history
+FIRST_PARTITION_YEAR = 2000
+
+MIN_DATE = date(1000, 1, 1)
+
+WATERMARK_SQL = """
+    SELECT archived_through, received_through
+    FROM ARCHIVE_WATERMARK
+    WHERE id = 1
+"""
+
+# The watermark only moves forward
+ADVANCE_WATERMARK_SQL = """
+    UPDATE ARCHIVE_WATERMARK
+    SET archived_through = %s
+    WHERE id = 1 AND (archived_through IS NULL OR archived_through < %s)
+"""
+
+ADVANCE_RECEIVED_SQL = """
+    UPDATE ARCHIVE_WATERMARK
+    SET received_through = %s
+    WHERE id = 1 AND (received_through IS NULL OR received_through < %s)
+"""
+
+OLDEST_BATCH_SQL = """
+    SELECT MIN(production_date) AS production_date
+    FROM PRODUCT_BATCH
+"""
+
+# information_schema returns upper-case column names unless aliased
+ARCHIVE_PARTITIONS_SQL = """
+    SELECT table_name AS table_name, partition_name AS partition_name
+    FROM information_schema.PARTITIONS
+    WHERE table_schema = DATABASE()
+      AND table_name IN ('PRODUCT_BATCH_ARCHIVE', 'BATCH_CONSUMPTION_ARCHIVE')
+"""
+
+# p_future is empty (nothing after the watermark is archived), so splitting it is cheap
+ADD_PARTITIONS_SQL = """
+    ALTER TABLE {table} REORGANIZE PARTITION p_future INTO (
+        {partitions},
+        PARTITION p_future VALUES LESS THAN (MAXVALUE)
+    )
+"""
+
+# Oldest closed batches first; the row locks keep them from changing mid-move
+NEXT_CHUNK_SQL = """
+    SELECT lot_number
+    FROM PRODUCT_BATCH
+    WHERE production_date <= %s
+    ORDER BY production_date, lot_number
+    LIMIT %s
+    FOR UPDATE
+"""
+
+COPY_BATCHES_SQL = """
+    INSERT INTO PRODUCT_BATCH_ARCHIVE (
+        lot_number, product_id, manufacturer_id, plan_id, batch_id,
+        quantity_produced, total_cost, per_unit_cost, production_date
+    )
+    SELECT lot_number, product_id, manufacturer_id, plan_id, batch_id,
+           quantity_produced, total_cost, per_unit_cost, production_date
+    FROM PRODUCT_BATCH
+    WHERE lot_number IN ({placeholders})
+"""
+
+COPY_CONSUMPTION_SQL = """
+    INSERT INTO BATCH_CONSUMPTION_ARCHIVE (product_batch_lot, ingredient_batch_lot, quantity_consumed, production_date)
+    SELECT bc.product_batch_lot, bc.ingredient_batch_lot, bc.quantity_consumed, pb.production_date
+    FROM BATCH_CONSUMPTION bc
+    JOIN PRODUCT_BATCH pb ON pb.lot_number = bc.product_batch_lot
+    WHERE bc.product_batch_lot IN ({placeholders})
+"""
+
+CHUNK_RECEIVED_SQL = """
+    SELECT MAX(ib.received_date)
+    FROM BATCH_CONSUMPTION bc
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = bc.ingredient_batch_lot
+    WHERE bc.product_batch_lot IN ({placeholders})
+"""
+
+DELETE_CONSUMPTION_SQL = "DELETE FROM BATCH_CONSUMPTION WHERE product_batch_lot IN ({placeholders})"
+
+DELETE_BATCHES_SQL = "DELETE FROM PRODUCT_BATCH WHERE lot_number IN ({placeholders})"
+
+# Row estimates per table and archive partition
+STATUS_SQL = """
+    SELECT table_name AS table_name, partition_name AS partition_name, table_rows AS table_rows
+    FROM information_schema.PARTITIONS
+    WHERE table_schema = DATABASE()
+      AND table_name IN ('PRODUCT_BATCH', 'BATCH_CONSUMPTION', 'PRODUCT_BATCH_ARCHIVE', 'BATCH_CONSUMPTION_ARCHIVE')
+    ORDER BY table_name, partition_ordinal_position
+"""
+
+# Rows that break the hot/archive split or the archive's references
+VERIFY_SQL = """
+    SELECT 'PRODUCT_BATCH' AS table_name, lot_number, 'hot batch inside the archived range' AS problem
+    FROM PRODUCT_BATCH
+    WHERE production_date <= %s
+    UNION ALL
+    SELECT 'PRODUCT_BATCH_ARCHIVE', lot_number, 'archived batch after the watermark'
+    FROM PRODUCT_BATCH_ARCHIVE
+    WHERE production_date > %s
+    UNION ALL
+    SELECT 'PRODUCT_BATCH_ARCHIVE', a.lot_number, 'lot number also in PRODUCT_BATCH'
+    FROM PRODUCT_BATCH_ARCHIVE a
+    JOIN PRODUCT_BATCH pb ON pb.lot_number = a.lot_number
+    UNION ALL
+    SELECT 'BATCH_CONSUMPTION_ARCHIVE', bca.product_batch_lot, 'consumption without an archived batch'
+    FROM BATCH_CONSUMPTION_ARCHIVE bca
+    LEFT JOIN PRODUCT_BATCH_ARCHIVE a
+        ON a.lot_number = bca.product_batch_lot AND a.production_date = bca.production_date
+    WHERE a.lot_number IS NULL
+    UNION ALL
+    SELECT 'BATCH_CONSUMPTION_ARCHIVE', bca.product_batch_lot, 'consumption of a missing ingredient lot'
+    FROM BATCH_CONSUMPTION_ARCHIVE bca
+    LEFT JOIN INGREDIENT_BATCH ib ON ib.lot_number = bca.ingredient_batch_lot
+    WHERE ib.lot_number IS NULL
+    ORDER BY table_name, lot_number
+"""
+
+
+def archive_sql(sql):
+    """The same statement reading the archive tables instead of the hot ones"""
+    return HOT_TABLE_PATTERN.sub(lambda match: ARCHIVE_TABLES[match.group(1)], sql)
+
+
+class Watermark:
+    """
+    Where the archive ends
+    
+    archived_through is the last production_date moved to the archive and
+    received_through the latest received_date of an ingredient lot with
+    archived consumption; both are None until the first archive run.
+    """
+    
+    def __init__(self, archived_through=None, received_through=None):
+        self.archived_through = archived_through
+        self.received_through = received_through
+        
+    @property
+    def empty(self):
+        return self.archived_through is None
+        
+    def covers_receipts(self, start=None):
+        """Whether consumption of lots received on or after start can be archived"""
+        return self.received_through is not None and (start is None or start <= self.received_through)
+
+
+def load_watermark(db_connection):
+    """
+    Current watermark, read from the server on every call
+    
+    Not cached: an archive run in another process must be seen at once,
+    or readers would skip the rows it just moved. It is a one-row primary
+    key lookup.
+    """
+    row = db_connection.fetch_one(WATERMARK_SQL, row_factory='dict')
+    if row is None:
+        return Watermark()
+    return Watermark(row['archived_through'], row['received_through'])
+
+
+def partition_years(existing, first_year, last_year):
+    """
+    Yearly partitions to add so every year from first_year to last_year has one
+    
+    Partitions can only be split off p_future, above the newest existing
+    year; archive runs move oldest batches first and the watermark only
+    moves forward, so the years below it are already covered.
+    
+    Args:
+        existing (set): Years that already have a partition
+        first_year (int): Oldest production year being archived
+        last_year (int): Year of the new watermark
+    
+    Returns:
+        list: Years to add, in order
+    """
+    start = max(first_year, FIRST_PARTITION_YEAR)
+    if existing:
+        start = max(start, max(existing) + 1)
+    return list(range(start, last_year + 1))
+
+
+class Archiver:
+    """Moves closed production batches to the archive tables and reports on the split"""
+    
+    def __init__(self, db_connection, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.db = db_connection
+        self.chunk_size = chunk_size
+        
+    def watermark(self):
+        return load_watermark(self.db)
+        
+    def ensure_partitions(self, first_year, last_year):
+        """
+        Add yearly partitions to both archive tables up to last_year
+        
+        Returns:
+            list: Partition names added
+        """
+        existing = {}
+        for row in self.db.fetch_all(ARCHIVE_PARTITIONS_SQL, row_factory='dict'):
+            name = row['partition_name'] or ''
+            if re.fullmatch(r'p\d{4}', name):
+                existing.setdefault(row['table_name'], set()).add(int(name[1:]))
+        
+        added = []
+        for table in ARCHIVE_TABLES.values():
+            years = partition_years(existing.get(table, set()), first_year, last_year)
+            if not years:
+                continue
+            partitions = ',\n        '.join(
+                f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')" for year in years
+            )
+            self.db.execute_query(ADD_PARTITIONS_SQL.format(table=table, partitions=partitions), fetch=False)
+            added.extend(f"{table}.p{year}" for year in years)
+        return added
+        
+    def archive(self, through=None, retention_days=DEFAULT_RETENTION_DAYS):
+        """
+        Move every batch produced on or before a date to the archive
+        
+        The watermark is advanced first, so new batches cannot be recorded
+        in the range being moved; each chunk of batches is then copied and
+        deleted in one transaction. An interrupted run leaves a consistent
+        split and the next run finishes it.
+        
+        Args:
+            through (date): Last production date to archive (default: retention_days ago)
+            retention_days (int): Days of production to keep hot when through is omitted
+        
+        Returns:
+            dict: archived_through, product_batches, consumption_rows and partitions_added
+        """
+        through = through or date.today() - timedelta(days=retention_days)
+        if through >= date.today():
+            raise ValueError("Only batches produced before today can be archived")
+        
+        oldest = self.db.fetch_one(OLDEST_BATCH_SQL, row_factory='dict')['production_date']
+        added = []
+        if oldest is not None and oldest <= through:
+            added = self.ensure_partitions(oldest.year, through.year)
+        
+        self.db.execute_query(ADVANCE_WATERMARK_SQL, (through, through), fetch=False)
+        
+        batches = consumption = 0
+        while True:
+            moved = self._move_chunk(through)
+            if moved is None:
+                break
+            batches += moved[0]
+            consumption += moved[1]
+        
+        self.db.invalidate(('PRODUCT_BATCH', 'BATCH_CONSUMPTION', 'ARCHIVE_WATERMARK', *ARCHIVE_TABLES.values()))
+        return {
+            'archived_through': self.watermark().archived_through,
+            'product_batches': batches,
+            'consumption_rows': consumption,
+            'partitions_added': added
+        }
+        
+    def _move_chunk(self, through):
+        """Move the next chunk in one transaction; None when nothing is left"""
+        with self.db.checkout() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(NEXT_CHUNK_SQL, (through, self.chunk_size))
+                lots = [row[0] for row in cursor.fetchall()]
+                if not lots:
+                    connection.rollback()
+                    return None
+                
+                placeholders = ', '.join(['%s'] * len(lots))
+                cursor.execute(CHUNK_RECEIVED_SQL.format(placeholders=placeholders), lots)
+                received = cursor.fetchone()[0]
+                cursor.execute(COPY_BATCHES_SQL.format(placeholders=placeholders), lots)
+                cursor.execute(COPY_CONSUMPTION_SQL.format(placeholders=placeholders), lots)
+                consumption = cursor.rowcount
+                cursor.execute(DELETE_CONSUMPTION_SQL.format(placeholders=placeholders), lots)
+                # Copied first, so trg_finished_goods_summary_delete keeps counting them
+                cursor.execute(DELETE_BATCHES_SQL.format(placeholders=placeholders), lots)
+                if received is not None:
+                    cursor.execute(ADVANCE_RECEIVED_SQL, (received, received))
+                connection.commit()
+                return len(lots), consumption
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+    
+    def status(self):
+        """Watermark plus estimated rows per hot table and archive partition"""
+        watermark = self.watermark()
+        return {
+            'archived_through': watermark.archived_through,
+            'received_through': watermark.received_through,
+            'tables': self.db.fetch_all(STATUS_SQL, row_factory='dict')
+        }
+        
+    def verify(self):
+        """Rows on the wrong side of the watermark or with a broken archive reference"""
+        archived_through = self.watermark().archived_through or MIN_DATE
+        return self.db.fetch_all(VERIFY_SQL, (archived_through, archived_through), row_factory='dict')
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Batch Import Module
+Bulk intake of ingredient batch receipts from CSV or JSONL files
+"""
+
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import Error
+
+
+REQUIRED_FIELDS = ('ingredient_id', 'batch_id', 'quantity', 'cost_per_unit', 'expiration_date')
+
+INSERT_BATCH_SQL = """
+    INSERT INTO INGREDIENT_BATCH
+    (lot_number, ingredient_id, supplier_id, manufacturer_id, batch_id, quantity,
+     cost_per_unit, expiration_date, received_date)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURRENT_DATE)
+"""
+
+# Minimum shelf life for manufacturer intake (application-enforced rule)
+MIN_DAYS_TO_EXPIRY = 90
+
+
+def compute_lot_number(ingredient_id, supplier_id, batch_id):
+    """Lot number as trg_compute_ingredient_lot_number builds it"""
+    return f"{ingredient_id}-{supplier_id}-{batch_id}"
+
+
+def read_records(path, file_format=None):
+    """
+    Stream records from a CSV (with header) or JSONL file
+    
+    Args:
+        path (str): File to read
+        file_format (str): 'csv' or 'jsonl'; inferred from the extension if omitted
+    
+    Yields:
+        tuple: (line number, record dict or None, parse error or None)
+    """
+    if file_format is None:
+        file_format = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for record in reader:
+                yield reader.line_num, record, None
+        else:
+            for line_no, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f"invalid JSON: {e.msg}"
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, None, "expected a JSON object"
+                    continue
+                yield line_no, record, None
+
+
+class RowValidationError(Exception):
+    """Validation failure for a single input row"""
+
+
+class ImportReport:
+    """Counts, generated lot numbers and per-row errors for one import"""
+    
+    def __init__(self):
+        self.inserted = 0
+        self.lots = []
+        self.errors = []
+    
+    def add_error(self, line_no, message):
+        self.errors.append({'line': line_no, 'error': message})
+    
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'failed': len(self.errors),
+            'lots': self.lots,
+            'errors': self.errors
+        }
+
+
+class IngredientBatchImporter:
+    """
+    Validates receipt rows in Python and inserts them in chunks
+    
+    Each chunk is written with one executemany (rewritten by the connector
+    into a multi-row INSERT) and committed as its own transaction. If a chunk
+    is rejected by the server, its rows are retried one at a time so only the
+    offending rows are reported.
+    """
+    
+    def __init__(self, db_connection, supplier_id=None, manufacturer_id=None,
+                 chunk_size=500, enforce_expiry_rule=None):
+        self.db = db_connection
+        self.supplier_id = supplier_id
+        self.manufacturer_id = manufacturer_id
+        self.chunk_size = chunk_size
+        # The 90-day rule applies to manufacturer intake only
+        if enforce_expiry_rule is None:
+            enforce_expiry_rule = manufacturer_id is not None
+        self.enforce_expiry_rule = enforce_expiry_rule
+        self.min_expiration = (datetime.now() + timedelta(days=MIN_DAYS_TO_EXPIRY)).date()
+        self.owned_ingredients = None
+    
+    def _parse(self, record):
+        """Validate one record and return its INSERT parameters"""
+        missing = [f for f in REQUIRED_FIELDS if str(record.get(f) or '').strip() == '']
+        if self.supplier_id is None and str(record.get('supplier_id') or '').strip() == '':
+            missing.append('supplier_id')
+        if missing:
+            raise RowValidationError(f"missing {', '.join(missing)}")
+        
+        try:
+            ingredient_id = int(record['ingredient_id'])
+            if self.supplier_id is not None:
+                supplier_id = self.supplier_id
+                if str(record.get('supplier_id') or '').strip() not in ('', str(supplier_id)):
+                    raise RowValidationError(f"supplier_id must be {supplier_id}")
+            else:
+                supplier_id = int(record['supplier_id'])
+            quantity = Decimal(str(record['quantity']))
+            cost_per_unit = Decimal(str(record['cost_per_unit']))
+            expiration = datetime.strptime(str(record['expiration_date']).strip(), '%Y-%m-%d').date()
+        except (ValueError, InvalidOperation) as e:
+            raise RowValidationError(f"bad value: {e}")
+        
+        batch_id = str(record['batch_id']).strip()
+        if len(batch_id) > 20:
+            raise RowValidationError("batch_id longer than 20 characters")
+        if quantity < 0:
+            raise RowValidationError("quantity must not be negative")
+        if cost_per_unit <= 0:
+            raise RowValidationError("cost_per_unit must be positive")
+        if self.enforce_expiry_rule and expiration < self.min_expiration:
+            raise RowValidationError(
+                f"expiration date must be at least {MIN_DAYS_TO_EXPIRY} days out "
+                f"(minimum {self.min_expiration})"
+            )
+        
+        if self.owned_ingredients is not None and ingredient_id not in self.owned_ingredients:
+            raise RowValidationError(f"ingredient {ingredient_id} is not supplied by {supplier_id}")
+        
+        lot_number = compute_lot_number(ingredient_id, supplier_id, batch_id)
+        return (lot_number, ingredient_id, supplier_id, self.manufacturer_id, batch_id,
+                quantity, cost_per_unit, expiration)
+    
+    def _existing_lots(self, cursor, lot_numbers):
+        placeholders = ', '.join(['%s'] * len(lot_numbers))
+        cursor.execute(
+            f"SELECT lot_number FROM INGREDIENT_BATCH WHERE lot_number IN ({placeholders})",
+            tuple(lot_numbers)
+        )
+        return {row[0] for row in cursor.fetchall()}
+    
+    def _flush(self, connection, chunk, report):
+        """Write one chunk of (line number, params) pairs in its own transaction"""
+        cursor = connection.cursor()
+        try:
+            existing = self._existing_lots(cursor, [params[0] for _, params in chunk])
+            rows = []
+            for line_no, params in chunk:
+                if params[0] in existing:
+                    report.add_error(line_no, f"duplicate lot number {params[0]}")
+                else:
+                    rows.append((line_no, params))
+            if not rows:
+                return
+            
+            try:
+                cursor.executemany(INSERT_BATCH_SQL, [params for _, params in rows])
+                connection.commit()
+                self.db.invalidate(['INGREDIENT_BATCH'])
+                report.inserted += len(rows)
+                report.lots.extend(params[0] for _, params in rows)
+                return
+            except Error:
+                connection.rollback()
+            
+            # Isolate the rows the server rejected
+            for line_no, params in rows:
+                try:
+                    cursor.execute(INSERT_BATCH_SQL, params)
+                    report.inserted += 1
+                    report.lots.append(params[0])
+                except Error as e:
+                    report.add_error(line_no, e.msg)
+            connection.commit()
+            self.db.invalidate(['INGREDIENT_BATCH'])
+        
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    def import_file(self, path, file_format=None):
+        """
+        Import every record in a file
+        
+        Args:
+            path (str): CSV or JSONL file
+            file_format (str): 'csv' or 'jsonl' (optional)
+        
+        Returns:
+            ImportReport: Inserted lots and per-row errors
+        """
+        report = ImportReport()
+        seen_lots = set()
+        chunk = []
+        
+        with self.db.checkout() as connection:
+            # Suppliers may only create batches of ingredients they define
+            if self.supplier_id is not None:
+                cursor = connection.cursor()
+                cursor.execute(
+                    "SELECT ingredient_id FROM INGREDIENT WHERE supplier_id = %s",
+                    (self.supplier_id,)
+                )
+                self.owned_ingredients = {row[0] for row in cursor.fetchall()}
+                cursor.close()
+            
+            for line_no, record, parse_error in read_records(path, file_format):
+                if parse_error:
+                    report.add_error(line_no, parse_error)
+                    continue
+                try:
+                    params = self._parse(record)
+                except RowValidationError as e:
+                    report.add_error(line_no, str(e))
+                    continue
+                
+                if params[0] in seen_lots:
+                    report.add_error(line_no, f"lot {params[0]} appears earlier in the file")
+                    continue
+                seen_lots.add(params[0])
+                
+                chunk.append((line_no, params))
+                if len(chunk) >= self.chunk_size:
+                    self._flush(connection, chunk, report)
+                    chunk = []
+            
+            if chunk:
+                self._flush(connection, chunk, report)
+        
+        return report
\ No newline at end of file
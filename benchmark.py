@@ -0,0 +1,485 @@
+"""
+Benchmark Module
+Latency, throughput and handler-counter benchmarks for queries, reports
+and batch recording
+
+Runs against the database configured in .env (load it with
+data_generator.py first). Results can be saved as a JSON baseline and a
+later run compared against it; the comparison exits non-zero when any
+target regresses beyond the tolerance.
+
+Usage:
+    python benchmark.py --scale medium --save baselines/medium.json
+    python benchmark.py --scale medium --compare baselines/medium.json --tolerance 0.25
+    python benchmark.py --reset --scale small --save baselines/small.json
+    python benchmark.py --only trigger.consumption    # legacy vs merged consumption trigger
+"""
+
+import argparse
+from datetime import datetime
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import mysql.connector
+
+from data_generator import DataGenerator, TableWriter, load_tables, run_script, split_sql_script
+from database_connection import DatabaseConnection, connection_config
+from lot_allocator import LotAllocator
+from manufacturer_menu import ManufacturerMenu
+from query_executor import QueryExecutor
+from viewer_menu import ViewerMenu
+
+
+# Picks the busiest manufacturer and its newest batch as benchmark inputs
+BENCH_INPUTS_SQL = """
+    SELECT pb.manufacturer_id, pb.product_id, pb.lot_number
+    FROM PRODUCT_BATCH pb
+    JOIN (
+        SELECT manufacturer_id
+        FROM PRODUCT_BATCH
+        GROUP BY manufacturer_id
+        ORDER BY COUNT(*) DESC, manufacturer_id
+        LIMIT 1
+    ) busiest ON busiest.manufacturer_id = pb.manufacturer_id
+    ORDER BY pb.production_date DESC, pb.lot_number DESC
+    LIMIT 1
+"""
+
+BUSIEST_SUPPLIER_SQL = """
+    SELECT supplier_id
+    FROM INGREDIENT
+    GROUP BY supplier_id
+    ORDER BY COUNT(*) DESC, supplier_id
+    LIMIT 1
+"""
+
+ACTIVE_PRODUCTS_SQL = """
+    SELECT p.product_id, p.standard_batch_size, rp.plan_id
+    FROM PRODUCT p
+    JOIN RECIPE_PLAN rp ON p.product_id = rp.product_id AND rp.is_active = TRUE
+    WHERE p.manufacturer_id = %s
+    ORDER BY p.product_id
+"""
+
+RECORD_PROCEDURES = ('RecordProductionBatch', 'RecordProductionBatchSet')
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# The two BEFORE INSERT triggers trg_consume_ingredient_lot replaced, kept
+# so the per-row consumption cost can be compared before and after
+CONSUMPTION_TRIGGER_NAMES = (
+    'trg_consume_ingredient_lot', 'trg_prevent_expired_consumption', 'trg_decrement_on_hand'
+)
+
+LEGACY_CONSUMPTION_TRIGGERS = (
+    """
+    CREATE TRIGGER trg_prevent_expired_consumption
+    BEFORE INSERT ON BATCH_CONSUMPTION
+    FOR EACH ROW
+    BEGIN
+        DECLARE exp_date DATE;
+        SELECT expiration_date INTO exp_date
+        FROM INGREDIENT_BATCH
+        WHERE lot_number = NEW.ingredient_batch_lot;
+        IF exp_date < CURRENT_DATE() THEN
+            SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Cannot consume expired ingredient lot.';
+        END IF;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_decrement_on_hand
+    BEFORE INSERT ON BATCH_CONSUMPTION
+    FOR EACH ROW
+    BEGIN
+        DECLARE current_qty DECIMAL(10,3);
+        SELECT on_hand_oz INTO current_qty
+        FROM INGREDIENT_BATCH
+        WHERE lot_number = NEW.ingredient_batch_lot;
+        IF current_qty < NEW.quantity_consumed THEN
+            SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Insufficient quantity in ingredient lot.';
+        ELSE
+            UPDATE INGREDIENT_BATCH
+            SET on_hand_oz = on_hand_oz - NEW.quantity_consumed
+            WHERE lot_number = NEW.ingredient_batch_lot;
+        END IF;
+    END
+    """
+)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class BenchmarkTarget:
+    """A named operation to time; func() returns the number of rows produced"""
+    
+    def __init__(self, name, func, setup=None, teardown=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+
+
+class BenchmarkResult:
+    """Latency distribution and counters for one target"""
+    
+    def __init__(self, name, latencies, rows, handlers, peak_kb=None):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.rows = rows
+        self.handlers = handlers
+        self.peak_kb = peak_kb
+        
+    def as_dict(self):
+        total = sum(self.latencies)
+        return {
+            'iterations': len(self.latencies),
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 3),
+            'mean_ms': round(total / len(self.latencies) * 1000, 3) if self.latencies else 0.0,
+            'rows_per_iteration': self.rows,
+            'rows_per_sec': round(self.rows * len(self.latencies) / total, 1) if total else 0.0,
+            'handlers_per_iteration': self.handlers,
+            'peak_kb': self.peak_kb
+        }
+
+
+class Benchmark:
+    """
+    Runs targets on one (non-pooled) connection
+    
+    The result cache is disabled so every iteration reaches the server, and
+    Handler_% session counters are read before and after each target; the
+    cost of reading them is measured once and subtracted.
+    """
+    
+    def __init__(self, db, iterations=50, warmup=5, measure_memory=True):
+        self.db = db
+        self.iterations = iterations
+        self.warmup = warmup
+        self.measure_memory = measure_memory
+        self.db.cache.max_entries = 0
+        self._status_overhead = None
+        
+    def handler_counters(self):
+        rows = self.db.fetch_all("SHOW SESSION STATUS LIKE 'Handler%%'", row_factory='tuple')
+        return {name: int(value) for name, value in rows}
+        
+    def _delta(self, before, after):
+        return {k: after[k] - before.get(k, 0) for k in after}
+        
+    def status_overhead(self):
+        if self._status_overhead is None:
+            first = self.handler_counters()
+            self._status_overhead = self._delta(first, self.handler_counters())
+        return self._status_overhead
+        
+    def run(self, target):
+        """Time one target; returns a BenchmarkResult"""
+        overhead = self.status_overhead()
+        try:
+            # Inside the try: a failed setup may already have changed the
+            # database (e.g. swapped triggers), so teardown still runs
+            if target.setup:
+                target.setup()
+            for _ in range(self.warmup):
+                target.func()
+            
+            latencies = []
+            rows = 0
+            before = self.handler_counters()
+            for _ in range(self.iterations):
+                started = time.perf_counter()
+                rows = target.func()
+                latencies.append(time.perf_counter() - started)
+            delta = self._delta(before, self.handler_counters())
+            handlers = {
+                k: round(max(0, v - overhead.get(k, 0)) / self.iterations, 1)
+                for k, v in delta.items() if v - overhead.get(k, 0) > 0
+            }
+            
+            peak_kb = None
+            if self.measure_memory:
+                tracemalloc.start()
+                target.func()
+                peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                tracemalloc.stop()
+        finally:
+            if target.teardown:
+                target.teardown()
+        
+        return BenchmarkResult(target.name, latencies, rows, handlers, peak_kb)
+
+
+def discover_inputs(db):
+    """Benchmark parameters taken from whatever data is loaded"""
+    batch = db.fetch_one(BENCH_INPUTS_SQL)
+    if not batch:
+        raise RuntimeError("No product batches found; load data with data_generator.py first")
+    supplier = db.fetch_one(BUSIEST_SUPPLIER_SQL)
+    return {
+        'manufacturer_id': batch['manufacturer_id'],
+        'product_id': batch['product_id'],
+        'product_lot': batch['lot_number'],
+        'supplier_id': supplier['supplier_id'] if supplier else None
+    }
+
+
+def record_batch_target(db, procedure, manufacturer_id):
+    """
+    Target that calls a batch-recording procedure and rolls it back
+    
+    Rolling back keeps on-hand quantities unchanged, so one FEFO allocation
+    stays valid for every iteration.
+    """
+    allocator = LotAllocator(db, manufacturer_id)
+    call = {}
+    
+    def setup():
+        for product in db.fetch_all(ACTIVE_PRODUCTS_SQL, (manufacturer_id,)):
+            allocation = allocator.allocate(product['plan_id'], product['standard_batch_size'])
+            if allocation.ok:
+                call['args'] = [product['product_id'], product['plan_id'], manufacturer_id,
+                                'BENCH', product['standard_batch_size'],
+                                json.dumps(allocation.procedure_payload())]
+                return
+        raise RuntimeError(f"No product of {manufacturer_id} can be covered by on-hand lots")
+        
+    def func():
+        connection = db.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.callproc(procedure, call['args'])
+            for result in cursor.stored_results():
+                result.fetchall()
+        finally:
+            cursor.close()
+            connection.rollback()
+        return len(json.loads(call['args'][5]))
+    
+    return BenchmarkTarget(f"procedure.{procedure}", func, setup=setup)
+
+
+def install_consumption_triggers(db, variant):
+    """
+    Swap the BATCH_CONSUMPTION validation triggers
+    
+    Args:
+        variant (str): 'legacy' (two triggers, unlocked reads) or 'merged'
+            (trg_consume_ingredient_lot as defined in schema.sql)
+    """
+    if variant == 'legacy':
+        statements = LEGACY_CONSUMPTION_TRIGGERS
+    else:
+        with open(SCHEMA_PATH, encoding='utf-8') as handle:
+            statements = [
+                statement for statement in split_sql_script(handle.read())
+                if statement.startswith('CREATE TRIGGER trg_consume_ingredient_lot')
+            ]
+    
+    with db.checkout() as connection:
+        cursor = connection.cursor()
+        try:
+            for name in CONSUMPTION_TRIGGER_NAMES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def consumption_trigger_target(db, variant, manufacturer_id):
+    """
+    RecordProductionBatch (one trigger-validated insert per lot) under either
+    consumption trigger variant; rows/s is consumption rows per second
+    
+    The merged trigger is always reinstalled afterwards.
+    """
+    target = record_batch_target(db, 'RecordProductionBatch', manufacturer_id)
+    
+    def setup():
+        install_consumption_triggers(db, variant)
+        target.setup()
+        
+    def teardown():
+        install_consumption_triggers(db, 'merged')
+    
+    return BenchmarkTarget(f"trigger.consumption.{variant}", target.func, setup, teardown)
+
+
+def build_targets(db, inputs, only=None):
+    """Every benchmark target, optionally filtered by name prefix"""
+    executor = QueryExecutor(db)
+    menu = ManufacturerMenu(db, {'manufacturer_id': inputs['manufacturer_id'], 'name': 'benchmark'})
+    viewer = ViewerMenu(db)
+    
+    query_params = {
+        1: {},
+        2: {'product_id': inputs['product_id'], 'manufacturer_id': inputs['manufacturer_id']},
+        3: {'manufacturer_id': inputs['manufacturer_id']},
+        4: {'supplier_id': inputs['supplier_id']},
+        5: {'lot_number': inputs['product_lot']}
+    }
+    
+    targets = [
+        BenchmarkTarget(f"query.{n}", lambda n=n: len(executor.run_query(n, **query_params[n])))
+        for n in sorted(query_params)
+    ]
+    targets += [
+        BenchmarkTarget(f"query.{n}.grouped",
+                        lambda n=n: sum(len(rows) for rows in executor.run_grouped(n).values()))
+        for n in (3, 4)
+    ]
+    targets += [
+        BenchmarkTarget('report.on_hand', lambda: len(menu.fetch_on_hand())),
+        BenchmarkTarget('report.nearly_out_of_stock', lambda: len(menu.fetch_nearly_out_of_stock())),
+        BenchmarkTarget('report.almost_expired', lambda: len(menu.fetch_almost_expired())),
+        BenchmarkTarget('report.batch_cost',
+                        lambda: int(menu.fetch_batch_cost(inputs['product_lot']) is not None)),
+        BenchmarkTarget('report.on_hand.streamed',
+                        lambda: sum(len(chunk) for chunk in menu.stream_on_hand())),
+        BenchmarkTarget('viewer.ingredient_list',
+                        lambda: len(viewer.fetch_ingredient_list(inputs['product_lot'])))
+    ]
+    targets += [record_batch_target(db, p, inputs['manufacturer_id']) for p in RECORD_PROCEDURES]
+    targets += [
+        consumption_trigger_target(db, variant, inputs['manufacturer_id'])
+        for variant in ('legacy', 'merged')
+    ]
+    
+    if only:
+        targets = [t for t in targets if any(t.name.startswith(prefix) for prefix in only)]
+    return targets
+
+
+def compare(current, baseline, tolerance):
+    """
+    Compare p50/p95 latency against a baseline
+    
+    Returns:
+        list: (target, metric, baseline value, current value) for each regression
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((name, metric, previous[metric], result[metric]))
+    return regressions
+
+
+def reset_database(scale, seed):
+    """Drop and recreate the configured database, then load a generated dataset"""
+    config = connection_config()
+    database = config.pop('database')
+    connection = mysql.connector.connect(**config, allow_local_infile=True)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+        cursor.execute(f"CREATE DATABASE `{database}`")
+        cursor.execute(f"USE `{database}`")
+        cursor.close()
+        run_script(connection, SCHEMA_PATH)
+        
+        writer = TableWriter(os.path.join('generated', scale))
+        try:
+            DataGenerator(seed, scale).generate(writer)
+        finally:
+            writer.close()
+        load_tables(connection, writer)
+    finally:
+        connection.close()
+
+
+def print_table(results):
+    print(f"\n{'Target':<34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows/s':>12} {'peak KB':>9}")
+    print("-" * 88)
+    for name, r in results.items():
+        peak = '' if r['peak_kb'] is None else f"{r['peak_kb']:.0f}"
+        print(f"{name:<34} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['rows_per_sec']:>12,.0f} {peak:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark queries, reports and batch recording")
+    parser.add_argument('--scale', default='unknown', help="Label for the loaded dataset (e.g. small)")
+    parser.add_argument('--reset', action='store_true',
+                        help="DROP and recreate the configured database with a generated --scale dataset")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='+', metavar='PREFIX', help="Run targets starting with these names")
+    parser.add_argument('--row-factory', choices=['dict', 'row', 'both'], default='dict',
+                        help="Row shape to benchmark; 'both' runs every target once per factory")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc peak measurement")
+    parser.add_argument('--save', metavar='PATH', help="Write results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Fail if slower than this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed slowdown before a comparison fails (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    
+    if args.reset:
+        if args.scale == 'unknown':
+            parser.error("--reset needs --scale")
+        reset_database(args.scale, args.seed)
+    
+    factories = ['dict', 'row'] if args.row_factory == 'both' else [args.row_factory]
+    results = {}
+    
+    for factory in factories:
+        db = DatabaseConnection(pool_size=0, verbose=False, row_factory=factory)
+        try:
+            bench = Benchmark(db, args.iterations, args.warmup, not args.no_memory)
+            for target in build_targets(db, discover_inputs(db), args.only):
+                name = target.name if len(factories) == 1 else f"{target.name}[{factory}]"
+                results[name] = bench.run(target).as_dict()
+                print(f"  {name}: p95 {results[name]['p95_ms']:.2f} ms", file=sys.stderr)
+        finally:
+            db.close()
+    
+    report = {
+        'scale': args.scale,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'results': results
+    }
+    print_table(results)
+    
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nBaseline written to {args.save}")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for name, metric, before, after in regressions:
+                print(f"   {name} {metric}: {before:.2f} -> {after:.2f} ms")
+            return 1
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+BOM Module
+Recursive bill-of-materials explosion for compound ingredients
+
+All formulation versions and their materials are loaded in one query and
+expanded in memory. A compound ingredient is expanded through the
+formulation effective on the as-of date; FORMULATION_MATERIAL quantities
+are per pack, so each material contributes quantity_required / pack_size
+oz per oz of the compound. Expansions are memoized per (ingredient, as-of
+date), so flattening every product's recipe touches each compound once.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from formulation_resolver import Formulation, FormulationResolver
+
+
+# Every formulation version with its materials (compounds have materials,
+# atomic ingredients appear once with NULL material columns)
+FORMULATIONS_SQL = """
+    SELECT
+        f.formulation_id,
+        f.ingredient_id,
+        f.pack_size,
+        f.unit_price,
+        f.effective_start_date,
+        f.effective_end_date,
+        fm.material_ingredient_id,
+        fm.quantity_required
+    FROM FORMULATION f
+    LEFT JOIN FORMULATION_MATERIAL fm ON f.formulation_id = fm.formulation_id
+    ORDER BY f.ingredient_id, f.effective_start_date, fm.material_ingredient_id
+"""
+
+INGREDIENTS_SQL = """
+    SELECT i.ingredient_id, i.name, i.type, s.name AS supplier_name
+    FROM INGREDIENT i
+    JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
+"""
+
+# Active recipe lines for every product (see vw_flattened_product_bom)
+RECIPE_LINES_SQL = """
+    SELECT product_id, product_name, manufacturer_name, plan_id, version_number,
+           ingredient_id, quantity_required
+    FROM vw_flattened_product_bom
+"""
+
+
+class BomCycleError(ValueError):
+    """Raised when a compound ingredient (indirectly) contains itself"""
+    
+    def __init__(self, path):
+        self.path = path
+        super().__init__(f"Formulation cycle: {' -> '.join(str(i) for i in path)}")
+
+
+class BillOfMaterials:
+    """
+    In-memory formulation graph with memoized explosion
+    
+    Build with BillOfMaterials.load(db) (three queries), or directly from
+    rows for offline use. Results are snapshots of what was loaded.
+    """
+    
+    def __init__(self, ingredients, formulation_rows, recipe_lines=()):
+        self.ingredients = {row['ingredient_id']: row for row in ingredients}
+        self.recipe_lines = list(recipe_lines)
+        self._memo = {}
+        
+        by_id = {}
+        for row in formulation_rows:
+            formulation = by_id.get(row['formulation_id'])
+            if formulation is None:
+                formulation = by_id[row['formulation_id']] = Formulation.from_row(row)
+            if row['material_ingredient_id'] is not None:
+                formulation.materials.append(
+                    (row['material_ingredient_id'], Decimal(str(row['quantity_required'])))
+                )
+        self.resolver = FormulationResolver(by_id.values())
+    
+    @classmethod
+    def load(cls, db_connection, with_recipes=True):
+        """Load ingredients, formulations and (optionally) active recipe lines"""
+        recipe_lines = db_connection.fetch_all(RECIPE_LINES_SQL, row_factory='dict') if with_recipes else ()
+        return cls(
+            db_connection.fetch_all(INGREDIENTS_SQL, row_factory='dict'),
+            db_connection.fetch_all(FORMULATIONS_SQL, row_factory='dict'),
+            recipe_lines
+        )
+        
+    def formulation_for(self, ingredient_id, as_of=None):
+        """Formulation version effective on as_of (today by default), or None"""
+        return self.resolver.resolve(ingredient_id, as_of or date.today())
+        
+    def _explode(self, ingredient_id, as_of, path):
+        key = (ingredient_id, as_of)
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        
+        if ingredient_id in path:
+            raise BomCycleError(path[path.index(ingredient_id):] + [ingredient_id])
+        
+        info = self.ingredients.get(ingredient_id)
+        formulation = None
+        if info is not None and info['type'] == 'COMPOUND':
+            formulation = self.formulation_for(ingredient_id, as_of)
+        
+        # Atomic ingredients, and compounds with no formulation in effect
+        # (bought as-is), are leaves
+        if formulation is None or not formulation.materials:
+            result = {ingredient_id: Decimal(1)}
+        else:
+            path.append(ingredient_id)
+            result = {}
+            for material_id, quantity in formulation.materials:
+                ratio = quantity / formulation.pack_size
+                for atomic_id, per_oz in self._explode(material_id, as_of, path).items():
+                    result[atomic_id] = result.get(atomic_id, 0) + ratio * per_oz
+            path.pop()
+        
+        self._memo[key] = result
+        return result
+        
+    def explode(self, ingredient_id, quantity=1, as_of=None):
+        """
+        Atomic materials in a quantity of an ingredient
+        
+        Args:
+            ingredient_id (int): Ingredient to expand
+            quantity (Decimal): Ounces of the ingredient
+            as_of (date): Formulation date (today by default)
+        
+        Returns:
+            dict: atomic ingredient_id -> ounces
+        """
+        quantity = Decimal(str(quantity))
+        per_oz = self._explode(ingredient_id, as_of or date.today(), [])
+        return {atomic_id: amount * quantity for atomic_id, amount in per_oz.items()}
+        
+    def explode_lines(self, lines, as_of=None):
+        """
+        Roll up atomic materials for (ingredient_id, quantity) pairs
+        
+        Returns:
+            dict: atomic ingredient_id -> total ounces
+        """
+        as_of = as_of or date.today()
+        totals = {}
+        for ingredient_id, quantity in lines:
+            quantity = Decimal(str(quantity))
+            for atomic_id, per_oz in self._explode(ingredient_id, as_of, []).items():
+                totals[atomic_id] = totals.get(atomic_id, 0) + per_oz * quantity
+        return totals
+        
+    def flattened_product_bom(self, as_of=None, product_ids=None):
+        """
+        Atomic materials per unit of every product's active recipe
+        
+        Like vw_flattened_product_bom, but compound ingredients are expanded
+        recursively and quantities rolled up per atomic material.
+        
+        Args:
+            as_of (date): Formulation date (today by default)
+            product_ids (list): Limit to these products (optional)
+        
+        Returns:
+            list: Rows ordered by product, quantity (largest first), material name
+        """
+        wanted = set(product_ids) if product_ids else None
+        plans = {}
+        for line in self.recipe_lines:
+            if wanted is not None and line['product_id'] not in wanted:
+                continue
+            plan = plans.setdefault(line['product_id'], {'header': line, 'lines': []})
+            plan['lines'].append((line['ingredient_id'], line['quantity_required']))
+        
+        rows = []
+        for product_id in sorted(plans):
+            header = plans[product_id]['header']
+            totals = self.explode_lines(plans[product_id]['lines'], as_of)
+            product_rows = []
+            for atomic_id, quantity in totals.items():
+                info = self.ingredients.get(atomic_id, {})
+                product_rows.append({
+                    'product_id': product_id,
+                    'product_name': header['product_name'],
+                    'manufacturer_name': header['manufacturer_name'],
+                    'plan_id': header['plan_id'],
+                    'version_number': header['version_number'],
+                    'ingredient_id': atomic_id,
+                    'ingredient_name': info.get('name'),
+                    'supplier_name': info.get('supplier_name'),
+                    'ingredient_type': info.get('type'),
+                    'quantity_required': quantity.quantize(Decimal('0.001'))
+                })
+            product_rows.sort(key=lambda r: (-r['quantity_required'], r['ingredient_name'] or ''))
+            rows.extend(product_rows)
+        return rows
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Capacity Module
+Maximum producible units per product from unexpired on-hand stock
+
+One aggregated query returns every active recipe line next to the
+manufacturer's unexpired on-hand total for that ingredient; the per-product
+minimum over ingredients is taken in memory. A product can be built as many
+times as its scarcest ingredient allows, rounded down to whole standard
+batches.
+"""
+
+from decimal import Decimal
+
+
+# Active recipe lines with the owning manufacturer's unexpired on-hand stock
+# per ingredient (the same lots the FEFO allocator would consider). The
+# manufacturer filter is repeated inside the stock subquery so a single
+# manufacturer's report only aggregates its own lots.
+CAPACITY_SQL = """
+    SELECT
+        p.product_id,
+        p.name AS product_name,
+        p.manufacturer_id,
+        p.standard_batch_size,
+        rp.plan_id,
+        rp.version_number,
+        ri.ingredient_id,
+        i.name AS ingredient_name,
+        ri.quantity_required,
+        COALESCE(stock.on_hand_oz, 0) AS on_hand_oz
+    FROM RECIPE_PLAN rp
+    JOIN PRODUCT p ON rp.product_id = p.product_id
+    JOIN RECIPE_INGREDIENT ri ON rp.plan_id = ri.plan_id
+    JOIN INGREDIENT i ON ri.ingredient_id = i.ingredient_id
+    LEFT JOIN (
+        SELECT manufacturer_id, ingredient_id, SUM(on_hand_oz) AS on_hand_oz
+        FROM INGREDIENT_BATCH
+        WHERE manufacturer_id IS NOT NULL
+          AND on_hand_oz > 0
+          AND expiration_date > CURRENT_DATE{stock_filter}
+        GROUP BY manufacturer_id, ingredient_id
+    ) stock ON stock.manufacturer_id = p.manufacturer_id
+           AND stock.ingredient_id = ri.ingredient_id
+    WHERE rp.is_active = TRUE{manufacturer_filter}
+    ORDER BY p.product_id, rp.plan_id, ri.ingredient_id
+"""
+
+
+def compute_capacity(rows):
+    """
+    Maximum producible units per active plan
+    
+    Args:
+        rows (list): Rows from CAPACITY_SQL
+    
+    Returns:
+        list: One dictionary per plan with max_units, max_batches and the
+        limiting ingredient (the one allowing the fewest units)
+    """
+    plans = {}
+    for row in rows:
+        plan = plans.get(row['plan_id'])
+        if plan is None:
+            plan = plans[row['plan_id']] = {
+                'product_id': row['product_id'],
+                'product_name': row['product_name'],
+                'manufacturer_id': row['manufacturer_id'],
+                'plan_id': row['plan_id'],
+                'version_number': row['version_number'],
+                'standard_batch_size': row['standard_batch_size'],
+                'max_units': None,
+                'max_batches': 0,
+                'limiting_ingredient_id': None,
+                'limiting_ingredient_name': None,
+                'limiting_on_hand_oz': None,
+                'limiting_oz_per_unit': None
+            }
+        
+        on_hand = Decimal(row['on_hand_oz'])
+        per_unit = Decimal(row['quantity_required'])
+        units = int(on_hand // per_unit)
+        if plan['max_units'] is None or units < plan['max_units']:
+            plan.update({
+                'max_units': units,
+                'limiting_ingredient_id': row['ingredient_id'],
+                'limiting_ingredient_name': row['ingredient_name'],
+                'limiting_on_hand_oz': on_hand,
+                'limiting_oz_per_unit': per_unit
+            })
+    
+    results = []
+    for plan in plans.values():
+        batch_size = plan['standard_batch_size']
+        plan['max_batches'] = plan['max_units'] // batch_size
+        plan['max_units'] = plan['max_batches'] * batch_size
+        results.append(plan)
+    return results
+
+
+class CapacityService:
+    """Producibility for every product with an active recipe plan"""
+    
+    def __init__(self, db_connection):
+        self.db = db_connection
+        
+    def fetch(self, manufacturer_id=None):
+        """
+        Capacity of every active plan, or only one manufacturer's
+        
+        Args:
+            manufacturer_id (str): Limit to this manufacturer (optional)
+        
+        Returns:
+            list: Rows from compute_capacity, ordered by product
+        """
+        if manufacturer_id is None:
+            rows = self.db.fetch_all(
+                CAPACITY_SQL.format(stock_filter='', manufacturer_filter=''), row_factory='dict'
+            )
+        else:
+            rows = self.db.fetch_all(
+                CAPACITY_SQL.format(
+                    stock_filter='\n          AND manufacturer_id = %s',
+                    manufacturer_filter='\n      AND p.manufacturer_id = %s'
+                ),
+                (manufacturer_id, manufacturer_id), row_factory='dict'
+            )
+        return compute_capacity(rows)
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+Costing Module
+Vectorized what-if production costing across recipe versions and lot strategies
+
+RecordProductionBatch only prices a batch after it has been made. This
+module projects the cost of every recipe version of every product, at
+several batch counts and under several lot-allocation strategies, from one
+load of RECIPE_INGREDIENT and the candidate INGREDIENT_BATCH lots.
+
+Each (manufacturer, ingredient) pool of lots, ordered by a strategy, has a
+piecewise-linear cumulative cost curve. All pools are laid end to end in one
+array, so the cost of drawing x oz from a pool is a single np.interp over
+the whole grid of recipe lines and batch counts, and plan totals are one
+np.add.reduceat. Every plan is priced against the full on-hand stock
+independently (scenarios do not draw each other down). Any quantity the
+lots cannot cover is priced at the ingredient's current formulation price
+per oz, and the shortfall is reported.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from formulation_resolver import FormulationResolver
+
+
+# Every recipe version (active or not) with its lines
+RECIPE_LINES_SQL = """
+    SELECT
+        rp.plan_id,
+        rp.product_id,
+        p.name AS product_name,
+        p.manufacturer_id,
+        p.standard_batch_size,
+        rp.version_number,
+        rp.is_active,
+        ri.ingredient_id,
+        ri.quantity_required
+    FROM RECIPE_PLAN rp
+    JOIN PRODUCT p ON rp.product_id = p.product_id
+    JOIN RECIPE_INGREDIENT ri ON rp.plan_id = ri.plan_id
+    ORDER BY rp.plan_id, ri.ingredient_id
+"""
+
+# Lots a manufacturer could draw from on the as-of date (same rules as the FEFO allocator)
+CANDIDATE_LOTS_SQL = """
+    SELECT lot_number, manufacturer_id, ingredient_id, on_hand_oz, cost_per_unit, expiration_date
+    FROM INGREDIENT_BATCH
+    WHERE manufacturer_id IS NOT NULL
+      AND on_hand_oz > 0
+      AND expiration_date > %s
+    ORDER BY manufacturer_id, ingredient_id, lot_number
+"""
+
+# Lot orderings: FEFO matches lot_allocator; cheapest-first breaks ties by expiry
+FEFO = 'fefo'
+CHEAPEST = 'cheapest'
+# Everything at the current formulation price, ignoring stock on hand
+LIST_PRICE = 'list'
+STRATEGIES = (FEFO, CHEAPEST, LIST_PRICE)
+
+
+class CostProjection:
+    """
+    Projected costs for every plan x strategy x batch count
+    
+    Arrays are indexed [strategy, plan, batch count]; plans are in plan_id order.
+    """
+    
+    def __init__(self, plans, strategies, batches, produced_units, total_cost, shortfall_oz):
+        self.plans = plans
+        self.strategies = list(strategies)
+        self.batches = batches
+        self.produced_units = produced_units
+        self.total_cost = total_cost
+        self.per_unit_cost = total_cost / produced_units
+        self.shortfall_oz = shortfall_oz
+        self.feasible = shortfall_oz <= 1e-9
+        
+    def best_versions(self, strategy=FEFO, batches=None):
+        """
+        Cheapest recipe version per product under one strategy
+        
+        Args:
+            strategy (str): Allocation strategy
+            batches (int): Batch count to compare at (default: the first one projected)
+        
+        Returns:
+            dict: product_id -> plan_id
+        """
+        s = self.strategies.index(strategy)
+        b = 0 if batches is None else list(self.batches).index(batches)
+        costs = self.per_unit_cost[s, :, b]
+        best = {}
+        for i, plan in enumerate(self.plans):
+            current = best.get(plan['product_id'])
+            # NaN (unpriceable) never wins over a real cost
+            if current is None or costs[i] < costs[current] or np.isnan(costs[current]):
+                best[plan['product_id']] = i
+        return {product_id: self.plans[i]['plan_id'] for product_id, i in best.items()}
+        
+    def rows(self, product_ids=None):
+        """One dictionary per plan, strategy and batch count, for display or export"""
+        wanted = set(product_ids) if product_ids else None
+        rows = []
+        for p, plan in enumerate(self.plans):
+            if wanted is not None and plan['product_id'] not in wanted:
+                continue
+            for s, strategy in enumerate(self.strategies):
+                for b, batches in enumerate(self.batches):
+                    total = self.total_cost[s, p, b]
+                    unit = self.per_unit_cost[s, p, b]
+                    rows.append({
+                        **plan,
+                        'strategy': strategy,
+                        'batches': int(batches),
+                        'produced_units': int(self.produced_units[p, b]),
+                        'total_cost': None if np.isnan(total) else round(float(total), 2),
+                        'per_unit_cost': None if np.isnan(unit) else round(float(unit), 4),
+                        'shortfall_oz': round(float(self.shortfall_oz[s, p, b]), 3),
+                        'feasible': bool(self.feasible[s, p, b])
+                    })
+        return rows
+
+
+class CostModel:
+    """
+    Recipe lines and lot pools as NumPy arrays
+    
+    Build with CostModel.load(db) (three queries), or directly from rows for
+    offline use. Results are snapshots of what was loaded.
+    """
+    
+    def __init__(self, recipe_rows, lot_rows, resolver=None, as_of=None):
+        self.as_of = as_of or date.today()
+        self.resolver = resolver or FormulationResolver(())
+        
+        self.plans = []
+        plan_index = {}
+        line_plan = []
+        line_ingredient = []
+        line_qty = []
+        for row in recipe_rows:
+            if row['plan_id'] not in plan_index:
+                plan_index[row['plan_id']] = len(self.plans)
+                self.plans.append({
+                    'product_id': row['product_id'],
+                    'product_name': row['product_name'],
+                    'manufacturer_id': row['manufacturer_id'],
+                    'plan_id': row['plan_id'],
+                    'version_number': row['version_number'],
+                    'is_active': bool(row['is_active']),
+                    'standard_batch_size': row['standard_batch_size']
+                })
+            line_plan.append(plan_index[row['plan_id']])
+            line_ingredient.append(row['ingredient_id'])
+            line_qty.append(float(row['quantity_required']))
+        
+        # Rows arrive in plan order, so each plan's lines are contiguous
+        self.line_plan = np.array(line_plan, dtype=np.intp)
+        self.line_qty = np.array(line_qty, dtype=np.float64)
+        self.plan_starts = np.searchsorted(self.line_plan, np.arange(len(self.plans)))
+        self.batch_size = np.array([p['standard_batch_size'] for p in self.plans], dtype=np.float64)
+        
+        # Current formulation price per oz for shortfalls and the list-price strategy
+        prices = self.resolver.prices((i, self.as_of) for i in line_ingredient)
+        self.line_list_price = np.array(
+            [np.nan if price is None else float(price) for price in prices], dtype=np.float64
+        )
+        
+        self._build_pools(lot_rows, [
+            (self.plans[p]['manufacturer_id'], i) for p, i in zip(line_plan, line_ingredient)
+        ])
+        
+    @classmethod
+    def load(cls, db_connection, as_of=None):
+        """Load every recipe version, the candidate lots and formulation prices"""
+        as_of = as_of or date.today()
+        return cls(
+            db_connection.fetch_all(RECIPE_LINES_SQL, row_factory='dict'),
+            db_connection.fetch_all(CANDIDATE_LOTS_SQL, (as_of,), row_factory='dict'),
+            FormulationResolver.load(db_connection),
+            as_of
+        )
+        
+    def _build_pools(self, lot_rows, line_keys):
+        """Lot arrays grouped by (manufacturer, ingredient) pool, plus each line's pool"""
+        pools = {}
+        lot_pool = []
+        quantity = []
+        cost = []
+        expiry = []
+        for row in lot_rows:
+            key = (row['manufacturer_id'], row['ingredient_id'])
+            lot_pool.append(pools.setdefault(key, len(pools)))
+            quantity.append(float(row['on_hand_oz']))
+            cost.append(float(row['cost_per_unit']))
+            expiry.append(row['expiration_date'].toordinal())
+        
+        self.lot_pool = np.array(lot_pool, dtype=np.intp)
+        self.lot_qty = np.array(quantity, dtype=np.float64)
+        self.lot_cost = np.array(cost, dtype=np.float64)
+        self.lot_expiry = np.array(expiry, dtype=np.int64)
+        # Input order (lot_number within a pool) is the final tie-breaker
+        self.lot_seq = np.arange(len(lot_pool))
+        
+        # Lines with no candidate lots point at an empty pool past the end
+        empty = len(pools)
+        self.line_pool = np.array([pools.get(key, empty) for key in line_keys], dtype=np.intp)
+        self.pool_count = empty
+        
+    def _curve(self, strategy):
+        """
+        Cumulative quantity/cost curve with every pool laid end to end
+        
+        Returns:
+            tuple: (xp, fp, pool_start, pool_end) where xp/fp are the curve
+            points and pool_start/pool_end the xp indices bounding each pool
+        """
+        if strategy == FEFO:
+            order = np.lexsort((self.lot_seq, self.lot_expiry, self.lot_pool))
+        elif strategy == CHEAPEST:
+            order = np.lexsort((self.lot_seq, self.lot_expiry, self.lot_cost, self.lot_pool))
+        else:
+            raise ValueError(f"Unknown allocation strategy: {strategy}")
+        
+        qty = self.lot_qty[order]
+        xp = np.concatenate(([0.0], np.cumsum(qty)))
+        fp = np.concatenate(([0.0], np.cumsum(qty * self.lot_cost[order])))
+        
+        counts = np.bincount(self.lot_pool, minlength=self.pool_count + 1)
+        pool_end = np.cumsum(counts)
+        pool_start = pool_end - counts
+        return xp, fp, pool_start, pool_end
+        
+    def project(self, batches=(1,), strategies=STRATEGIES):
+        """
+        Project total and per-unit cost for every plan
+        
+        Args:
+            batches (list): Batch counts (multiples of each product's standard batch size)
+            strategies (list): Any of 'fefo', 'cheapest', 'list'
+        
+        Returns:
+            CostProjection: Costs indexed [strategy, plan, batch count]
+        """
+        batches = np.asarray(batches, dtype=np.float64)
+        if batches.ndim != 1 or not batches.size or (batches <= 0).any():
+            raise ValueError("batches must be one or more positive counts")
+        
+        produced_units = np.outer(self.batch_size, batches)
+        # Ounces of each line needed at each batch count
+        needed = self.line_qty[:, None] * produced_units[self.line_plan]
+        list_cost = needed * self.line_list_price[:, None]
+        
+        shape = (len(strategies), len(self.plans), len(batches))
+        total_cost = np.zeros(shape)
+        shortfall_oz = np.zeros(shape)
+        if not self.plans:
+            return CostProjection(self.plans, strategies, batches, produced_units, total_cost, shortfall_oz)
+        
+        for s, strategy in enumerate(strategies):
+            if strategy == LIST_PRICE:
+                line_cost = list_cost
+                line_short = np.zeros_like(needed)
+            else:
+                xp, fp, pool_start, pool_end = self._curve(strategy)
+                start = xp[pool_start[self.line_pool]][:, None]
+                end = xp[pool_end[self.line_pool]][:, None]
+                drawn = np.minimum(start + needed, end)
+                line_short = needed - (drawn - start)
+                line_cost = np.interp(drawn, xp, fp) - np.interp(start, xp, fp)
+                # Only uncovered ounces need a list price (NaN when there is none)
+                line_cost += np.where(line_short > 1e-9, line_short * self.line_list_price[:, None], 0.0)
+            
+            total_cost[s] = np.add.reduceat(line_cost, self.plan_starts, axis=0)
+            shortfall_oz[s] = np.add.reduceat(np.maximum(line_short, 0), self.plan_starts, axis=0)
+        
+        return CostProjection(self.plans, strategies, batches, produced_units, total_cost, shortfall_oz)
\ No newline at end of file
@@ -0,0 +1,561 @@
+"""
+Data Generator Module
+Seeded, deterministic synthetic datasets at production scale
+
+Writes one tab-separated file per table and (optionally) bulk-loads them
+into a database created from schema.sql, using LOAD DATA LOCAL INFILE or
+multi-row INSERTs. Generated IDs start at ID_BASE so the sample rows from
+data.sql can live alongside them.
+
+Usage:
+    python data_generator.py --scale small --out generated/
+    python data_generator.py --scale large --out generated/ --load --create-schema
+"""
+
+import argparse
+from datetime import date, timedelta
+import os
+import random
+import re
+import sys
+import time
+
+import mysql.connector
+
+from database_connection import connection_config
+
+
+ID_BASE = 1000
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Validates and decrements every BATCH_CONSUMPTION row; dropped while loading
+# (the generator already validated every draw) and recreated from schema.sql
+CONSUMPTION_TRIGGER = 'trg_consume_ingredient_lot'
+
+# Roughly 25k / 400k / 4M / 20M BATCH_CONSUMPTION rows
+SCALES = {
+    'small': {
+        'manufacturers': 4, 'suppliers': 4, 'ingredients_per_supplier': 15,
+        'products_per_manufacturer': 10, 'recipe_versions': 2, 'lines_per_recipe': 6,
+        'lots_per_ingredient': 8, 'batches_per_product': 100, 'viewers': 2, 'days': 365
+    },
+    'medium': {
+        'manufacturers': 10, 'suppliers': 10, 'ingredients_per_supplier': 30,
+        'products_per_manufacturer': 25, 'recipe_versions': 3, 'lines_per_recipe': 8,
+        'lots_per_ingredient': 20, 'batches_per_product': 200, 'viewers': 5, 'days': 730
+    },
+    'large': {
+        'manufacturers': 25, 'suppliers': 20, 'ingredients_per_supplier': 50,
+        'products_per_manufacturer': 40, 'recipe_versions': 3, 'lines_per_recipe': 8,
+        'lots_per_ingredient': 60, 'batches_per_product': 500, 'viewers': 10, 'days': 1095
+    },
+    'xlarge': {
+        'manufacturers': 50, 'suppliers': 40, 'ingredients_per_supplier': 60,
+        'products_per_manufacturer': 50, 'recipe_versions': 4, 'lines_per_recipe': 10,
+        'lots_per_ingredient': 120, 'batches_per_product': 800, 'viewers': 20, 'days': 1460
+    }
+}
+
+# Load order respects the foreign keys; columns are listed explicitly
+TABLE_COLUMNS = {
+    'USER': ('user_id', 'username', 'password_hash', 'role', 'created_date'),
+    'MANUFACTURER': ('manufacturer_id', 'user_id', 'name'),
+    'SUPPLIER': ('supplier_id', 'user_id', 'name'),
+    'PRODUCT': ('product_id', 'name', 'category_id', 'manufacturer_id', 'standard_batch_size'),
+    'INGREDIENT': ('ingredient_id', 'supplier_id', 'name', 'type'),
+    'FORMULATION': ('formulation_id', 'ingredient_id', 'pack_size', 'unit_price',
+                    'effective_start_date', 'effective_end_date'),
+    'FORMULATION_MATERIAL': ('formulation_id', 'material_ingredient_id', 'quantity_required'),
+    'RECIPE_PLAN': ('plan_id', 'product_id', 'version_number', 'created_date', 'is_active'),
+    'RECIPE_INGREDIENT': ('plan_id', 'ingredient_id', 'quantity_required'),
+    'INGREDIENT_BATCH': ('lot_number', 'ingredient_id', 'supplier_id', 'manufacturer_id', 'batch_id',
+                         'quantity', 'cost_per_unit', 'expiration_date', 'received_date'),
+    'PRODUCT_BATCH': ('lot_number', 'product_id', 'manufacturer_id', 'plan_id', 'batch_id',
+                      'quantity_produced', 'total_cost', 'per_unit_cost', 'production_date'),
+    'BATCH_CONSUMPTION': ('product_batch_lot', 'ingredient_batch_lot', 'quantity_consumed')
+}
+
+# Placeholder bcrypt hash shared by every generated account (as in data.sql)
+PASSWORD_HASH = '$2a$10$N9qo8uLOickgx2ZMRZoMyeIjZAgcfl7p92ldGxad68LJZdL17lhWy'
+
+DISHES = ('Steak Dinner', 'Mac & Cheese', 'Chicken Pot Pie', 'Lasagna', 'Beef Stew',
+          'Veggie Curry', 'Fish Tacos', 'Shepherd Pie', 'Apple Crumble', 'Rice Pilaf')
+ATOMICS = ('Salt', 'Pepper', 'Beef', 'Chicken', 'Pasta', 'Rice', 'Flour', 'Butter',
+           'Cheddar', 'Onion', 'Garlic', 'Tomato', 'Carrot', 'Potato', 'Sugar', 'Apple')
+COMPOUNDS = ('Seasoning Blend', 'Sauce Base', 'Spice Rub', 'Gravy Mix', 'Dough Mix')
+
+NULL = '\\N'
+
+
+def milli(value):
+    """Thousandths (exact integer quantities) as a DECIMAL(?,3) literal"""
+    return f"{value // 1000}.{value % 1000:03d}"
+
+
+def cents(value):
+    """Hundredths as a DECIMAL(?,2) literal"""
+    return f"{value // 100}.{value % 100:02d}"
+
+
+class TableWriter:
+    """Buffered TSV writers, one per table, in LOAD DATA's default format"""
+    
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.counts = {table: 0 for table in TABLE_COLUMNS}
+        self._files = {}
+        os.makedirs(out_dir, exist_ok=True)
+        
+    def path(self, table):
+        return os.path.join(self.out_dir, f"{table}.tsv")
+        
+    def write(self, table, *values):
+        handle = self._files.get(table)
+        if handle is None:
+            handle = open(self.path(table), 'w', encoding='utf-8', newline='\n', buffering=1 << 20)
+            self._files[table] = handle
+        handle.write('\t'.join(NULL if v is None else str(v) for v in values))
+        handle.write('\n')
+        self.counts[table] += 1
+        
+    def close(self):
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+
+
+class DataGenerator:
+    """
+    Builds one consistent dataset from a seed and a scale
+    
+    Every manufacturer's product batches are simulated in production-date
+    order and draw their ingredient lots first-expired-first-out, so lot
+    on-hand quantities, consumption rows and batch costs agree with each
+    other the way RecordProductionBatch would have left them. Quantities are
+    tracked in integer thousandths to stay exact.
+    """
+    
+    def __init__(self, seed=42, scale='small', overrides=None, end_date=None):
+        self.seed = seed
+        self.params = dict(SCALES[scale], **(overrides or {}))
+        self.rng = random.Random(seed)
+        self.end_date = end_date or date.today() - timedelta(days=1)
+        self.start_date = self.end_date - timedelta(days=self.params['days'])
+        
+        self.next_user_id = ID_BASE
+        self.suppliers = []
+        self.ingredients = {}       # ingredient_id -> (supplier_id, type, base cost in cents)
+        self.manufacturers = []
+        
+    def _user(self, out, username, role):
+        user_id = self.next_user_id
+        self.next_user_id += 1
+        out.write('USER', user_id, username, PASSWORD_HASH, role, self.start_date)
+        return user_id
+        
+    def generate_parties(self, out):
+        """Users, manufacturers and suppliers"""
+        p = self.params
+        for n in range(p['manufacturers']):
+            manufacturer_id = f"GM{n + 1:05d}"
+            user_id = self._user(out, f"gen_mfg_{n + 1}", 'MANUFACTURER')
+            out.write('MANUFACTURER', manufacturer_id, user_id, f"Generated Manufacturer {n + 1}")
+            self.manufacturers.append(manufacturer_id)
+        
+        for n in range(p['suppliers']):
+            supplier_id = ID_BASE + n
+            user_id = self._user(out, f"gen_sup_{n + 1}", 'SUPPLIER')
+            out.write('SUPPLIER', supplier_id, user_id, f"Generated Supplier {n + 1}")
+            self.suppliers.append(supplier_id)
+        
+        for n in range(p['viewers']):
+            self._user(out, f"gen_view_{n + 1}", 'VIEWER')
+    
+    def generate_ingredients(self, out):
+        """
+        Ingredients and their formulation versions
+        
+        About a fifth of each supplier's ingredients are compound. A compound's
+        materials are drawn from lower-numbered ingredients, which may be
+        compounds themselves, so the bill of materials is nested but acyclic.
+        """
+        rng = self.rng
+        ingredient_id = ID_BASE
+        formulation_id = ID_BASE
+        
+        for supplier_id in self.suppliers:
+            for k in range(self.params['ingredients_per_supplier']):
+                compound = k % 5 == 4 and len(self.ingredients) >= 4
+                kind = 'COMPOUND' if compound else 'ATOMIC'
+                names = COMPOUNDS if compound else ATOMICS
+                name = f"{names[ingredient_id % len(names)]} {ingredient_id}"
+                base_cost = rng.randint(20, 2500)
+                out.write('INGREDIENT', ingredient_id, supplier_id, name, kind)
+                
+                # Consecutive, non-overlapping versions; the newest is open-ended
+                versions = rng.randint(1, 3)
+                start = self.start_date - timedelta(days=30)
+                materials = []
+                if compound:
+                    materials = rng.sample(sorted(self.ingredients), rng.randint(2, 4))
+                
+                for v in range(versions):
+                    end = None if v == versions - 1 else start + timedelta(days=rng.randint(90, 240))
+                    out.write('FORMULATION', formulation_id, ingredient_id,
+                              milli(rng.randint(1, 40) * 1000),
+                              cents(base_cost * rng.randint(8, 12)),
+                              start, end)
+                    for material_id in materials:
+                        out.write('FORMULATION_MATERIAL', formulation_id, material_id,
+                                  milli(rng.randint(50, 3000)))
+                    formulation_id += 1
+                    if end is not None:
+                        start = end + timedelta(days=1)
+                
+                self.ingredients[ingredient_id] = (supplier_id, kind, base_cost)
+                ingredient_id += 1
+    
+    def generate_products(self, out):
+        """
+        Products and versioned recipe plans
+        
+        Returns:
+            dict: manufacturer_id -> [(product_id, batch_size, [(plan_id, {ingredient: milli-oz})])]
+        """
+        rng = self.rng
+        p = self.params
+        product_id = ID_BASE
+        plan_id = ID_BASE
+        catalog = {}
+        all_ingredients = sorted(self.ingredients)
+        lines = min(p['lines_per_recipe'], len(all_ingredients))
+        
+        for manufacturer_id in self.manufacturers:
+            products = []
+            for k in range(p['products_per_manufacturer']):
+                batch_size = rng.choice((25, 50, 100, 200, 300))
+                out.write('PRODUCT', product_id, f"{DISHES[k % len(DISHES)]} {product_id}",
+                          rng.randint(1, 3), manufacturer_id, batch_size)
+                
+                plans = []
+                for version in range(1, p['recipe_versions'] + 1):
+                    created = self.start_date + timedelta(
+                        days=(version - 1) * p['days'] // p['recipe_versions']
+                    )
+                    active = 1 if version == p['recipe_versions'] else 0
+                    out.write('RECIPE_PLAN', plan_id, product_id, version, created, active)
+                    
+                    recipe = {}
+                    for ingredient_id in rng.sample(all_ingredients, lines):
+                        recipe[ingredient_id] = rng.randint(50, 8000)
+                        out.write('RECIPE_INGREDIENT', plan_id, ingredient_id, milli(recipe[ingredient_id]))
+                    plans.append((plan_id, recipe))
+                    plan_id += 1
+                
+                products.append((product_id, batch_size, plans))
+                product_id += 1
+            catalog[manufacturer_id] = products
+        
+        return catalog
+        
+    def _lots_for(self, m_index, ingredient_id, demand):
+        """Initial lots for one ingredient at one manufacturer, soonest expiry first"""
+        p = self.params
+        supplier_id, _, base_cost = self.ingredients[ingredient_id]
+        count = p['lots_per_ingredient']
+        # 25% headroom over expected demand, within DECIMAL(10,3)
+        size = max(50000, min(9999999999, demand * 5 // 4 // count))
+        
+        lots = []
+        for k in range(count):
+            received = self.start_date + timedelta(days=k * p['days'] // count - 30)
+            lots.append(self._lot(m_index, ingredient_id, supplier_id, base_cost, k, size, received))
+        lots.sort(key=lambda lot: (lot['expiration'], lot['lot_number']))
+        return lots
+        
+    def _lot(self, m_index, ingredient_id, supplier_id, base_cost, k, size, received):
+        rng = self.rng
+        batch_id = f"M{m_index}-{k:05d}"
+        return {
+            'lot_number': f"{ingredient_id}-{supplier_id}-{batch_id}",
+            'ingredient_id': ingredient_id,
+            'supplier_id': supplier_id,
+            'batch_id': batch_id,
+            'quantity': size,
+            'remaining': size,
+            'cost': max(1, base_cost * rng.randint(85, 115) // 100),
+            'received': received,
+            'expiration': received + timedelta(days=rng.randint(270, 540))
+        }
+        
+    def generate_batches(self, out, catalog):
+        """Ingredient lots, product batches and consumption, one manufacturer at a time"""
+        rng = self.rng
+        p = self.params
+        
+        for m_index, manufacturer_id in enumerate(self.manufacturers, start=1):
+            products = catalog[manufacturer_id]
+            
+            # Schedule every batch, then run them in production-date order
+            schedule = []
+            demand = {}
+            for product_id, batch_size, plans in products:
+                for j in range(p['batches_per_product']):
+                    produced = self.start_date + timedelta(
+                        days=j * p['days'] // p['batches_per_product'] + rng.randint(0, 3)
+                    )
+                    produced = min(produced, self.end_date)
+                    plan_id, recipe = plans[j * len(plans) // p['batches_per_product']]
+                    units = batch_size * rng.randint(1, 4)
+                    schedule.append((produced, product_id, j, plan_id, recipe, units))
+                    for ingredient_id, per_unit in recipe.items():
+                        demand[ingredient_id] = demand.get(ingredient_id, 0) + per_unit * units
+            schedule.sort(key=lambda s: (s[0], s[1], s[2]))
+            
+            lots = {i: self._lots_for(m_index, i, d) for i, d in sorted(demand.items())}
+            positions = {i: 0 for i in lots}
+            top_ups = {i: 0 for i in lots}
+            first_use = {}
+            
+            for produced, product_id, j, plan_id, recipe, units in schedule:
+                batch_id = f"B{j + 1:06d}"
+                product_lot = f"{product_id}-{manufacturer_id}-{batch_id}"
+                total_cost = 0      # thousandths of an oz x cents
+                consumption = []
+                
+                for ingredient_id, per_unit in recipe.items():
+                    needed = per_unit * units
+                    queue = lots[ingredient_id]
+                    while needed > 0:
+                        pos = positions[ingredient_id]
+                        # Expired leftovers stay on hand, as they would in practice
+                        while pos < len(queue) and (queue[pos]['remaining'] == 0
+                                                    or queue[pos]['expiration'] <= produced):
+                            pos += 1
+                        if pos == len(queue):
+                            supplier_id, _, base_cost = self.ingredients[ingredient_id]
+                            top_ups[ingredient_id] += 1
+                            queue.append(self._lot(
+                                m_index, ingredient_id, supplier_id, base_cost,
+                                p['lots_per_ingredient'] + top_ups[ingredient_id],
+                                max(needed, queue[-1]['quantity'] if queue else needed),
+                                produced - timedelta(days=7)
+                            ))
+                        positions[ingredient_id] = pos
+                        
+                        lot = queue[pos]
+                        take = min(lot['remaining'], needed)
+                        lot['remaining'] -= take
+                        needed -= take
+                        total_cost += take * lot['cost']
+                        first_use.setdefault(lot['lot_number'], produced)
+                        consumption.append((lot['lot_number'], take))
+                
+                total_cents = (total_cost + 500) // 1000
+                per_unit = f"{total_cents / 100 / units:.4f}"
+                out.write('PRODUCT_BATCH', product_lot, product_id, manufacturer_id, plan_id,
+                          batch_id, units, cents(total_cents), per_unit, produced)
+                
+                for lot_number, take in consumption:
+                    out.write('BATCH_CONSUMPTION', product_lot, lot_number, milli(take))
+            
+            for queue in lots.values():
+                for lot in queue:
+                    received = min(lot['received'], first_use.get(lot['lot_number'], lot['received']))
+                    out.write('INGREDIENT_BATCH', lot['lot_number'], lot['ingredient_id'],
+                              lot['supplier_id'], manufacturer_id, lot['batch_id'],
+                              milli(lot['quantity']), cents(lot['cost']),
+                              lot['expiration'], received)
+    
+    def generate(self, out):
+        """Write every table; returns the per-table row counts"""
+        self.generate_parties(out)
+        self.generate_ingredients(out)
+        catalog = self.generate_products(out)
+        self.generate_batches(out, catalog)
+        return dict(out.counts)
+
+
+def split_sql_script(text):
+    """
+    Split a .sql script into statements, honouring DELIMITER lines
+    
+    Returns:
+        list: Statements without their trailing delimiter
+    """
+    statements = []
+    delimiter = ';'
+    buffer = []
+    
+    for line in text.splitlines():
+        stripped = re.sub(r'\s+--\s.*$', '', line.strip())
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith('--')):
+            continue
+        
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buffer).rstrip()
+            statements.append(statement[:-len(delimiter)].strip())
+            buffer = []
+    
+    if buffer and '\n'.join(buffer).strip():
+        statements.append('\n'.join(buffer).strip())
+    return statements
+
+
+def run_script(connection, path):
+    """Execute a .sql script such as schema.sql statement by statement"""
+    with open(path, encoding='utf-8') as handle:
+        statements = split_sql_script(handle.read())
+    cursor = connection.cursor()
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+            if cursor.with_rows:
+                cursor.fetchall()
+        connection.commit()
+    finally:
+        cursor.close()
+    return len(statements)
+
+
+def schema_statements(prefix, path=SCHEMA_PATH):
+    """Statements of a .sql script that start with prefix"""
+    with open(path, encoding='utf-8') as handle:
+        return [statement for statement in split_sql_script(handle.read()) if statement.startswith(prefix)]
+
+
+def load_tables(connection, writer, method='infile', chunk_size=5000):
+    """
+    Bulk-load the generated files
+    
+    Foreign key and unique checks are relaxed for the session, and the
+    consumption validation trigger is dropped for the load (the generator
+    already validated every draw) and recreated afterwards, so nothing else
+    should write BATCH_CONSUMPTION meanwhile. INGREDIENT_BATCH's own triggers
+    still run, so on-hand is corrected from the consumption totals afterwards.
+    """
+    cursor = connection.cursor()
+    timings = {}
+    try:
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.execute(f"DROP TRIGGER IF EXISTS {CONSUMPTION_TRIGGER}")
+        
+        for table, columns in TABLE_COLUMNS.items():
+            if not writer.counts[table]:
+                continue
+            started = time.perf_counter()
+            column_list = ', '.join(columns)
+            
+            if method == 'infile':
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                    f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({column_list})",
+                    (os.path.abspath(writer.path(table)),)
+                )
+            else:
+                sql = (f"INSERT INTO {table} ({column_list}) "
+                       f"VALUES ({', '.join(['%s'] * len(columns))})")
+                with open(writer.path(table), encoding='utf-8') as handle:
+                    chunk = []
+                    for line in handle:
+                        chunk.append(tuple(None if v == NULL else v
+                                           for v in line.rstrip('\n').split('\t')))
+                        if len(chunk) >= chunk_size:
+                            cursor.executemany(sql, chunk)
+                            chunk = []
+                    if chunk:
+                        cursor.executemany(sql, chunk)
+            
+            connection.commit()
+            timings[table] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        cursor.execute("""
+            UPDATE INGREDIENT_BATCH ib
+            JOIN (
+                SELECT bc.ingredient_batch_lot, SUM(bc.quantity_consumed) AS used
+                FROM BATCH_CONSUMPTION bc
+                JOIN INGREDIENT_BATCH lot ON lot.lot_number = bc.ingredient_batch_lot
+                WHERE lot.ingredient_id >= %s
+                GROUP BY bc.ingredient_batch_lot
+            ) u ON u.ingredient_batch_lot = ib.lot_number
+            SET ib.on_hand_oz = ib.quantity - u.used
+        """, (ID_BASE,))
+        connection.commit()
+        timings['on_hand_fixup'] = time.perf_counter() - started
+        
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {CONSUMPTION_TRIGGER}")
+        for statement in schema_statements(f"CREATE TRIGGER {CONSUMPTION_TRIGGER}"):
+            cursor.execute(statement)
+        cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+        cursor.close()
+    
+    return timings
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition('=')
+        if name not in SCALES['small']:
+            raise ValueError(f"Unknown scale parameter: {name}")
+        overrides[name] = int(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic inventory dataset")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--set', action='append', default=[], metavar='PARAM=N',
+                        help="Override one scale parameter, e.g. batches_per_product=2000")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='generated', help="Directory for the .tsv files")
+    parser.add_argument('--load', action='store_true', help="Bulk-load the files into the database")
+    parser.add_argument('--method', choices=['infile', 'insert'], default='infile',
+                        help="LOAD DATA LOCAL INFILE (default) or multi-row INSERT")
+    parser.add_argument('--create-schema', action='store_true',
+                        help="Run schema.sql before loading (the database must be empty)")
+    args = parser.parse_args(argv)
+    
+    generator = DataGenerator(args.seed, args.scale, parse_overrides(args.set))
+    writer = TableWriter(args.out)
+    started = time.perf_counter()
+    try:
+        counts = generator.generate(writer)
+    finally:
+        writer.close()
+    
+    print(f"Generated {args.scale} dataset (seed {args.seed}) in {time.perf_counter() - started:.1f}s:")
+    for table, count in counts.items():
+        print(f"  {table:<22} {count:>12,}")
+    
+    if not args.load:
+        return 0
+    
+    connection = mysql.connector.connect(**connection_config(), allow_local_infile=True)
+    try:
+        if args.create_schema:
+            print(f"Ran {run_script(connection, SCHEMA_PATH)} statements from schema.sql")
+        
+        timings = load_tables(connection, writer, args.method)
+        for table, seconds in timings.items():
+            rows = writer.counts.get(table)
+            rate = f" ({rows / seconds:,.0f} rows/s)" if rows and seconds else ""
+            print(f"  loaded {table:<22} {seconds:>8.1f}s{rate}")
+    finally:
+        connection.close()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
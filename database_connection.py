@@ -5,61 +5,349 @@ Handles MySQL database connections using mysql-connector-python
 
 import mysql.connector
 from mysql.connector import Error
+from contextlib import contextmanager
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from instrumentation import Instrumentation, InstrumentedConnection
+from prepared_statements import PreparedStatementRegistry
+from result_cache import ResultCache, tables_read, tables_written, with_trigger_writes
+from retry_policy import RetryPolicy
+from row_factory import check_factory, converter, cursor_options
 
 load_dotenv()
 
+# Tables each stored procedure modifies, for result-cache invalidation.
+# Procedures not listed here clear the whole cache.
+PROCEDURE_WRITES = {
+    'RecordProductionBatch': ('PRODUCT_BATCH', 'BATCH_CONSUMPTION', 'INGREDIENT_BATCH',
+                              'INGREDIENT_STOCK_SUMMARY', 'FINISHED_GOODS_SUMMARY',
+                              'INVENTORY_LEDGER'),
+    'RecordProductionBatchSet': ('PRODUCT_BATCH', 'BATCH_CONSUMPTION', 'INGREDIENT_BATCH',
+                                 'INGREDIENT_STOCK_SUMMARY', 'FINISHED_GOODS_SUMMARY',
+                                 'INVENTORY_LEDGER')
+}
+
+
+def connection_config():
+    """Connection settings shared by every connection the application opens"""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '3306')),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'inventory_db'),
+        'autocommit': False
+    }
+
+
+class PoolExhaustedError(Error):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+
+class PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs to recycle it"""
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+    
+    def age(self):
+        """Seconds since the underlying connection was opened"""
+        return time.monotonic() - self.created_at
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of MySQL connections
+    
+    Connections are opened lazily up to pool_size. On checkout a connection
+    that has outlived max_lifetime is closed and replaced, and an idle
+    connection is pinged before it is handed out. On checkin any open
+    transaction is rolled back so the next borrower starts clean.
+    """
+    
+    def __init__(self, pool_size, max_lifetime=3600, checkout_timeout=30,
+                 health_check_idle=5, **config):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.pool_size = pool_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_idle = health_check_idle
+        self.config = config
+        self._idle = []
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Condition()
+    
+    def _open(self):
+        """Open a new raw connection"""
+        return PooledConnection(mysql.connector.connect(**self.config))
+    
+    def _discard(self, pooled):
+        """Close a connection that is leaving the pool for good"""
+        try:
+            pooled.connection.close()
+        except Error:
+            pass
+    
+    def _is_healthy(self, pooled):
+        """Check a connection that has been idle long enough to have gone stale"""
+        if time.monotonic() - pooled.last_used < self.health_check_idle:
+            return True
+        try:
+            pooled.connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+    
+    def acquire(self):
+        """
+        Take a connection out of the pool, opening or recycling one if needed
+        
+        Returns:
+            PooledConnection: Connection reserved for the caller
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise Error(msg="Connection pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._opened < self.pool_size:
+                    self._opened += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        msg=f"No pooled connection available after {self.checkout_timeout}s"
+                    )
+                self._lock.wait(remaining)
+        
+        # Connect/ping outside the lock so one slow server round trip
+        # does not stall every other checkout
+        try:
+            if pooled is not None:
+                if pooled.age() > self.max_lifetime or not self._is_healthy(pooled):
+                    self._discard(pooled)
+                    pooled = None
+            if pooled is None:
+                pooled = self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+                self._lock.notify()
+            raise
+        
+        return pooled
+    
+    def release(self, pooled):
+        """Return a connection to the pool"""
+        try:
+            if pooled.connection.in_transaction:
+                pooled.connection.rollback()
+            healthy = pooled.connection.is_connected()
+        except Error:
+            healthy = False
+        
+        with self._lock:
+            if healthy and not self._closed and pooled.age() <= self.max_lifetime:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            else:
+                self._opened -= 1
+                self._discard(pooled)
+            self._lock.notify()
+    
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._lock.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
 
 class DatabaseConnection:
-    """Manages database connection for the application"""
+    """
+    Manages database connections for the application
+    
+    By default a single connection is shared by every caller. When pool_size
+    (or the DB_POOL_SIZE environment variable) is greater than zero, a
+    ConnectionPool is used instead: checkout() borrows a connection for the
+    duration of a with-block, and get_connection() pins one pooled connection
+    to the calling thread so existing menu code keeps its transaction
+    semantics.
+    
+    Pass verbose=False to suppress status and error messages on stdout;
+    errors are still raised to the caller.
+    
+    row_factory (or DB_ROW_FACTORY) sets the row shape returned by
+    fetch_all, fetch_cached, stream and execute_named: 'dict' (default) or
+    'row' (tuples readable by column name, see row_factory.py). Code that
+    reads by position can pass row_factory='tuple' per call.
     
-    def __init__(self):
+    When instrumentation is enabled (DB_INSTRUMENT=1, see instrumentation.py)
+    every connection handed out wraps its cursors to time each statement;
+    otherwise raw connections are returned untouched.
+    """
+    
+    def __init__(self, pool_size=None, max_lifetime=None, verbose=True, row_factory=None):
+        if pool_size is None:
+            pool_size = int(os.getenv('DB_POOL_SIZE', '0'))
+        if max_lifetime is None:
+            max_lifetime = int(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+        
         self.connection = None
-        self.connect()
+        self.pool = None
+        self.verbose = verbose
+        self.row_factory = check_factory(row_factory or os.getenv('DB_ROW_FACTORY', 'dict'))
+        if self.row_factory == 'tuple':
+            raise ValueError("The application reads rows by column name; use 'dict' or 'row'")
+        self._local = threading.local()
+        self.statements = PreparedStatementRegistry(
+            capacity=int(os.getenv('DB_STATEMENT_CACHE_SIZE', '32'))
+        )
+        self.cache = ResultCache(
+            max_entries=int(os.getenv('DB_RESULT_CACHE_SIZE', '256')),
+            ttl=float(os.getenv('DB_RESULT_CACHE_TTL', '30'))
+        )
+        self.stream_chunk_size = int(os.getenv('DB_STREAM_CHUNK_SIZE', '1000'))
+        self.instrumentation = Instrumentation()
+        self.retry_policy = RetryPolicy()
+        self.metrics_file = os.getenv('DB_METRICS_FILE')
+        
+        if pool_size > 0:
+            self.pool = ConnectionPool(
+                pool_size,
+                max_lifetime=max_lifetime,
+                checkout_timeout=int(os.getenv('DB_POOL_TIMEOUT', '30')),
+                **connection_config()
+            )
+            self._log(f"Connection pool ready (size {pool_size}, max lifetime {max_lifetime}s)")
+        else:
+            self.connect()
+    
+    def _log(self, message):
+        """Print a status/error message unless running quietly (e.g. batch CLI)"""
+        if self.verbose:
+            print(message)
+    
+    def _instrument(self, connection):
+        """Wrap a raw connection when instrumentation is on"""
+        if not self.instrumentation.enabled:
+            return connection
+        # One wrapper per raw connection, so per-connection caches keyed on
+        # the connection object (prepared statements) keep hitting
+        wrapper = getattr(connection, '_instrumented', None)
+        if wrapper is None:
+            wrapper = InstrumentedConnection(connection, self.instrumentation)
+            connection._instrumented = wrapper
+        return wrapper
     
     def connect(self):
         """Establish connection to MySQL database"""
         try:
             # Database configuration
-            self.connection = mysql.connector.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=int(os.getenv('DB_PORT', '3306')),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', ''),
-                database=os.getenv('DB_NAME', 'inventory_db'),
-                autocommit=False
-            )
+            self.connection = mysql.connector.connect(**connection_config())
             
             if self.connection.is_connected():
                 db_info = self.connection.get_server_info()
-                print(f"Successfully connected to MySQL Server version {db_info}")
-                
+                self._log(f"Successfully connected to MySQL Server version {db_info}")
+        
         except Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            self._log(f"Error connecting to MySQL: {e}")
             raise
     
+    @contextmanager
+    def checkout(self):
+        """
+        Borrow a connection for the duration of a with-block
+        
+        In single-connection mode this yields the shared connection. In
+        pooled mode it yields the connection pinned to the current thread if
+        there is one, otherwise a fresh pooled connection that is returned
+        to the pool when the block exits.
+        """
+        if self.pool is None:
+            yield self.get_connection()
+            return
+        
+        pinned = getattr(self._local, 'pooled', None)
+        if pinned is not None:
+            yield self._instrument(pinned.connection)
+            return
+        
+        pooled = self.pool.acquire()
+        try:
+            yield self._instrument(pooled.connection)
+        finally:
+            self.pool.release(pooled)
+    
     def get_connection(self):
         """Return the active connection"""
+        if self.pool is not None:
+            pooled = getattr(self._local, 'pooled', None)
+            if pooled is None or not pooled.connection.is_connected():
+                if pooled is not None:
+                    self.pool.release(pooled)
+                pooled = self.pool.acquire()
+                self._local.pooled = pooled
+            return self._instrument(pooled.connection)
+        
         if not self.connection or not self.connection.is_connected():
             self.connect()
+        return self._instrument(self.connection)
+    
+    def release_connection(self):
+        """Return the connection pinned to this thread (pooled mode only)"""
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is not None:
+            self._local.pooled = None
+            self.pool.release(pooled)
+    
+    def _active_connection(self):
+        """Connection the calling thread is currently working on, if any"""
+        if self.pool is not None:
+            pooled = getattr(self._local, 'pooled', None)
+            return pooled.connection if pooled else None
         return self.connection
     
     def close(self):
         """Close the database connection"""
+        if self.metrics_file and self.instrumentation.enabled:
+            self.instrumentation.write_snapshot(self.metrics_file)
+        
+        if self.pool is not None:
+            self.release_connection()
+            self.pool.close()
+            self._log("Connection pool closed.")
+            return
+        
         if self.connection and self.connection.is_connected():
             self.connection.close()
-            print("Database connection closed.")
+            self._log("Database connection closed.")
     
     def commit(self):
         """Commit current transaction"""
-        if self.connection:
-            self.connection.commit()
+        connection = self._active_connection()
+        if connection:
+            connection.commit()
     
     def rollback(self):
         """Rollback current transaction"""
-        if self.connection:
-            self.connection.rollback()
+        connection = self._active_connection()
+        if connection:
+            connection.rollback()
     
     def execute_query(self, query, params=None, fetch=True):
         """
@@ -69,29 +357,177 @@ class DatabaseConnection:
             query (str): SQL query to execute
             params (tuple): Query parameters
             fetch (bool): Whether to fetch results
-            
+        
         Returns:
             list: Query results if fetch=True, None otherwise
         """
-        cursor = None
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                return cursor.fetchall()
-            else:
-                self.connection.commit()
-                return cursor.lastrowid
+        with self.checkout() as connection:
+            cursor = None
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(query, params or ())
                 
-        except Error as e:
-            self.connection.rollback()
-            print(f"Query execution error: {e}")
-            raise
-        finally:
-            if cursor:
+                if fetch:
+                    return cursor.fetchall()
+                else:
+                    connection.commit()
+                    self.invalidate(tables_written(query))
+                    return cursor.lastrowid
+            
+            except Error as e:
+                connection.rollback()
+                self._log(f"Query execution error: {e}")
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
+    
+    def fetch_all(self, query, params=None, row_factory=None):
+        """
+        Run a read-only query and return every row
+        
+        Unlike execute_query, errors are left to the caller to report and
+        the current transaction is not touched.
+        
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Query parameters
+            row_factory (str): 'dict', 'row' or 'tuple' (defaults to the connection's)
+            
+        Returns:
+            list: Query results
+        """
+        row_factory = row_factory or self.row_factory
+        with self.checkout() as connection:
+            cursor = connection.cursor(**cursor_options(row_factory))
+            try:
+                cursor.execute(query, params or ())
+                rows = cursor.fetchall()
+                convert = converter(row_factory, cursor)
+                return convert(rows) if convert else rows
+            finally:
                 cursor.close()
     
+    def fetch_one(self, query, params=None, row_factory=None):
+        """Run a read-only query and return its first row (or None)"""
+        rows = self.fetch_all(query, params, row_factory)
+        return rows[0] if rows else None
+    
+    def stream(self, query, params=None, chunk_size=None, row_factory=None):
+        """
+        Run a read-only query on an unbuffered cursor and yield rows in chunks
+        
+        Rows are pulled from the server chunk_size at a time, so memory use
+        does not grow with the size of the result. The connection is busy
+        until the generator is exhausted or closed; do not issue other
+        queries on it from inside the loop.
+        
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Query parameters
+            chunk_size (int): Rows per chunk (defaults to DB_STREAM_CHUNK_SIZE)
+            row_factory (str): 'dict', 'row' or 'tuple' (defaults to the connection's)
+        
+        Yields:
+            list: Up to chunk_size rows
+        """
+        chunk_size = chunk_size or self.stream_chunk_size
+        row_factory = row_factory or self.row_factory
+        
+        with self.checkout() as connection:
+            cursor = connection.cursor(buffered=False, **cursor_options(row_factory))
+            try:
+                cursor.execute(query, params or ())
+                convert = converter(row_factory, cursor)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield convert(rows) if convert else rows
+            finally:
+                # A stream abandoned part way must drain the rest of the
+                # result before the connection can run anything else
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+    
+    def fetch_cached(self, query, params=None, ttl=None):
+        """
+        fetch_all through the result cache
+        
+        The result is tagged with the tables named in the query's FROM/JOIN
+        clauses and dropped when any of them is written through this
+        connection object. Callers must not modify the returned rows.
+        
+        Args:
+            query (str): SQL query to execute
+            params (tuple): Query parameters
+            ttl (float): Seconds to keep the result (defaults to DB_RESULT_CACHE_TTL)
+        
+        Returns:
+            list: Query results
+        """
+        key = (query, tuple(params or ()), self.row_factory)
+        hit, rows = self.cache.get(key)
+        if hit:
+            return rows
+        
+        tables = tables_read(query)
+        generation = self.cache.generation(tables)
+        rows = self.fetch_all(query, params)
+        self.cache.put(key, rows, tables, generation, ttl)
+        return rows
+    
+    def invalidate(self, tables=None):
+        """
+        Drop cached results that read any of the given tables
+        
+        Call after committing writes made on a raw cursor, naming the tables
+        written; tables their triggers write (the summary tables and the
+        ledger) are added here. With no tables the whole cache is cleared.
+        """
+        if tables is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(with_trigger_writes(tables))
+    
+    def register_statement(self, name, sql):
+        """
+        Register a named statement to be prepared once per connection
+        
+        Args:
+            name (str): Name used with execute_named()
+            sql (str): SQL text with %s placeholders
+        """
+        self.statements.register(name, sql)
+    
+    def execute_named(self, name, params=None, fetch=True):
+        """
+        Execute a registered statement through a server-side prepared cursor
+        
+        Args:
+            name (str): Registered statement name
+            params (tuple): Statement parameters
+            fetch (bool): Whether to fetch results
+            
+        Returns:
+            list: Query results if fetch=True, affected row count otherwise
+        """
+        with self.checkout() as connection:
+            try:
+                result = self.statements.execute(
+                    connection, name, params, fetch, self.row_factory
+                )
+                if not fetch:
+                    connection.commit()
+                    self.invalidate(tables_written(self.statements.sql(name)))
+                return result
+                
+            except Error as e:
+                connection.rollback()
+                self._log(f"Query execution error: {e}")
+                raise
+    
     def call_procedure(self, procedure_name, params):
         """
         Call a stored procedure
@@ -99,27 +535,29 @@ class DatabaseConnection:
         Args:
             procedure_name (str): Name of the stored procedure
             params (tuple): Procedure parameters
-            
+        
         Returns:
             list: Procedure results
         """
-        cursor = None
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.callproc(procedure_name, params)
-            
-            # Fetch results from all result sets
-            results = []
-            for result in cursor.stored_results():
-                results.extend(result.fetchall())
-            
-            self.connection.commit()
-            return results
+        with self.checkout() as connection:
+            cursor = None
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.callproc(procedure_name, params)
+                
+                # Fetch results from all result sets
+                results = []
+                for result in cursor.stored_results():
+                    results.extend(result.fetchall())
+                
+                connection.commit()
+                self.invalidate(PROCEDURE_WRITES.get(procedure_name))
+                return results
             
-        except Error as e:
-            self.connection.rollback()
-            print(f"Procedure execution error: {e}")
-            raise
-        finally:
-            if cursor:
-                cursor.close()
\ No newline at end of file
+            except Error as e:
+                connection.rollback()
+                self._log(f"Procedure execution error: {e}")
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
\ No newline at end of file
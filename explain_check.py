@@ -0,0 +1,476 @@
+"""
+Explain Check Module
+EXPLAIN plan regression check for the application's queries
+
+Runs EXPLAIN FORMAT=JSON (MySQL 8.0 format) for every registered query
+against the database configured in .env and fails when a plan reads one of
+the large tables with a full table or full index scan, or filesorts rows
+driven by one, unless that query allows it with a reason. Sorting grouped
+output is not counted: it orders one row per group, not the table's rows.
+Queries that can also read the production-history archive are checked a
+second time with the archive tables swapped in (<name>.archive).
+
+Load a representative dataset first (data_generator.py); on a handful of
+rows the optimizer may pick scans it would never use on a real table.
+
+On a database created before schema.sql had the composite batch-table
+indexes, add them (and drop the single-column indexes they replace) with
+--create-indexes.
+
+Usage:
+    python explain_check.py --create-indexes
+    python explain_check.py
+    python explain_check.py --only query. report.
+    python explain_check.py --show report.almost-expired
+    python explain_check.py --save plans/
+"""
+
+import argparse
+from datetime import date
+import json
+import os
+import re
+import sys
+
+import archive
+from benchmark import discover_inputs
+import bom
+import capacity
+import costing
+from database_connection import DatabaseConnection
+from formulation_resolver import FORMULATIONS_SQL
+import ledger
+import lot_allocator
+from main import MANUFACTURER_LOOKUP_SQL
+import manufacturer_menu
+from query_executor import QUERIES
+import summary
+import traceability
+import viewer_menu
+
+
+# Tables that grow with production history; scans and sorts of these fail the check
+LARGE_TABLES = (
+    'INGREDIENT_BATCH', 'PRODUCT_BATCH', 'BATCH_CONSUMPTION',
+    'INVENTORY_LEDGER', 'INVENTORY_SNAPSHOT',
+    'PRODUCT_BATCH_ARCHIVE', 'BATCH_CONSUMPTION_ARCHIVE'
+)
+
+# Composite indexes the checked plans rely on (see schema.sql), for
+# databases created before they were added
+PLAN_INDEXES = {
+    'idx_ingredient_batch_mfg_ingredient_expiry': (
+        'INGREDIENT_BATCH',
+        "CREATE INDEX idx_ingredient_batch_mfg_ingredient_expiry "
+        "ON INGREDIENT_BATCH(manufacturer_id, ingredient_id, expiration_date, on_hand_oz)"
+    ),
+    'idx_ingredient_batch_mfg_expiry': (
+        'INGREDIENT_BATCH',
+        "CREATE INDEX idx_ingredient_batch_mfg_expiry "
+        "ON INGREDIENT_BATCH(manufacturer_id, expiration_date, on_hand_oz, ingredient_id)"
+    ),
+    'idx_product_batch_mfg_product_date': (
+        'PRODUCT_BATCH',
+        "CREATE INDEX idx_product_batch_mfg_product_date "
+        "ON PRODUCT_BATCH(manufacturer_id, product_id, production_date)"
+    )
+}
+
+# Single-column indexes the composites replace; dropped only after the
+# composites exist, since the manufacturer_id foreign keys need one of them
+RETIRED_INDEXES = {
+    'idx_ingredient_batch_manufacturer': 'INGREDIENT_BATCH',
+    'idx_product_batch_manufacturer': 'PRODUCT_BATCH'
+}
+
+EXISTING_INDEXES_SQL = """
+    SELECT DISTINCT index_name
+    FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE() AND table_name IN ('INGREDIENT_BATCH', 'PRODUCT_BATCH')
+"""
+
+SCAN_ACCESS = {'ALL': 'full table scan', 'index': 'full index scan'}
+
+# A consumed ingredient lot of the benchmark batch and its product's active plan
+EXPLAIN_INPUTS_SQL = """
+    SELECT
+        (SELECT bc.ingredient_batch_lot
+         FROM BATCH_CONSUMPTION bc
+         WHERE bc.product_batch_lot = %s
+         ORDER BY bc.ingredient_batch_lot
+         LIMIT 1) AS ingredient_lot,
+        (SELECT rp.plan_id
+         FROM RECIPE_PLAN rp
+         WHERE rp.product_id = %s AND rp.is_active = TRUE
+         LIMIT 1) AS plan_id
+"""
+
+# Plans that are scans or sorts by design: full loads and maintenance
+BULK_LOAD = "reads every row once to build an in-memory model"
+MAINTENANCE = "recomputes a summary from the whole base table"
+SMALL_SORT = "sorts one entity's rows after an index lookup"
+
+QUERY_ALLOW = {
+    'query.2': {'filesort:PRODUCT_BATCH': SMALL_SORT, 'filesort:BATCH_CONSUMPTION': SMALL_SORT},
+    # The grouped latest-batch query ranks each product's batches with a window
+    'query.2.grouped': {'filesort:PRODUCT_BATCH': "ranks one manufacturer's batches per product"}
+}
+
+# Checks that also run against the archive tables when the watermark says
+# the requested lots or range can be there (Queries with history are added
+# from QueryExecutor's definitions)
+ARCHIVE_ROUTED = (
+    'report.batch-cost', 'viewer.ingredient-list', 'viewer.production-date', 'trace.forward',
+    'trace.supplier', 'trace.backward', 'trace.index.product-lots', 'trace.index.edges'
+)
+
+# Statement aliases (pb, ib, ...) -> table; aliases in this code base are lower case
+ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+([A-Z][A-Z_]*)(?:\s+(?:AS\s+)?([a-z_]\w*))?')
+
+# Subtrees that are not part of a block's row source
+SUBQUERY_KEYS = ('attached_subqueries', 'optimized_away_subqueries', 'select_list_subqueries')
+
+
+class PlanCheck:
+    """One query to EXPLAIN, with its parameters and allowed violations"""
+    
+    def __init__(self, name, sql, params=(), allow=None):
+        self.name = name
+        self.sql = sql
+        self.params = tuple(params)
+        # "scan:TABLE" / "filesort:TABLE" -> reason
+        self.allow = allow or {}
+
+
+class Violation:
+    """A full scan or filesort of a large table in one plan"""
+    
+    def __init__(self, kind, table, alias, detail):
+        self.kind = kind
+        self.table = table
+        self.alias = alias
+        self.detail = detail
+        
+    @property
+    def key(self):
+        return f"{self.kind}:{self.table}"
+        
+    def __str__(self):
+        alias = f" ({self.alias})" if self.alias != self.table else ""
+        return f"{self.detail} of {self.table}{alias}"
+
+
+def ensure_indexes(db_connection):
+    """
+    Create any missing plan index, then drop the indexes they replace
+    
+    Safe to run repeatedly; a database built from schema.sql needs nothing.
+    
+    Returns:
+        tuple: (names created, names dropped)
+    """
+    existing = {row[0] for row in db_connection.fetch_all(EXISTING_INDEXES_SQL, row_factory='tuple')}
+    created = []
+    for name, (_, ddl) in PLAN_INDEXES.items():
+        if name not in existing:
+            db_connection.execute_query(ddl, fetch=False)
+            created.append(name)
+    
+    dropped = []
+    for name, table in RETIRED_INDEXES.items():
+        if name in existing:
+            db_connection.execute_query(f"DROP INDEX {name} ON {table}", fetch=False)
+            dropped.append(name)
+    return created, dropped
+
+
+def table_aliases(sql):
+    """Alias (or bare table name) -> table for every FROM/JOIN in a statement"""
+    aliases = {}
+    for table, alias in ALIAS_PATTERN.findall(sql):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def first_table(node):
+    """The driving table of a plan subtree: the first table node in plan order"""
+    if isinstance(node, list):
+        for item in node:
+            found = first_table(item)
+            if found:
+                return found
+        return None
+    if not isinstance(node, dict):
+        return None
+    if 'table_name' in node:
+        return node
+    for key, value in node.items():
+        if key in SUBQUERY_KEYS:
+            continue
+        found = first_table(value)
+        if found:
+            return found
+    return None
+
+
+def plan_violations(plan, aliases):
+    """
+    Scans and filesorts of large tables in an EXPLAIN FORMAT=JSON plan
+    
+    Args:
+        plan (dict): Parsed EXPLAIN output
+        aliases (dict): From table_aliases() for the explained statement
+    
+    Returns:
+        list: Violation per offending table access or sort
+    """
+    found = []
+    
+    def large(node):
+        name = node.get('table_name')
+        table = aliases.get(name, name)
+        return (table, name) if table in LARGE_TABLES else (None, name)
+        
+    def sorted_by(node, detail):
+        driving = first_table(node)
+        if driving:
+            table, name = large(driving)
+            if table:
+                found.append(Violation('filesort', table, name, detail))
+    
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+        
+        if 'table_name' in node and node.get('access_type') in SCAN_ACCESS:
+            table, name = large(node)
+            if table:
+                found.append(Violation('scan', table, name, SCAN_ACCESS[node['access_type']]))
+        
+        # Ordering the output of a GROUP BY sorts one row per group
+        if node.get('using_filesort') is True and 'grouping_operation' not in node:
+            sorted_by(node, 'filesort')
+        if any(window.get('using_filesort') for window in node.get('windows', ())):
+            sorted_by(node, 'window filesort')
+        
+        for value in node.values():
+            walk(value)
+    
+    walk(plan)
+    return found
+
+
+def archive_check(check):
+    """The same check with its batch tables swapped for the archive tables"""
+    return PlanCheck(
+        f"{check.name}.archive", archive.archive_sql(check.sql), check.params,
+        {archive.archive_sql(key): reason for key, reason in check.allow.items()}
+    )
+
+
+def discover(db):
+    """Parameters for every check, taken from whatever data is loaded"""
+    inputs = discover_inputs(db)
+    row = db.fetch_one(EXPLAIN_INPUTS_SQL, (inputs['product_lot'], inputs['product_id']), row_factory='dict')
+    inputs.update(row)
+    inputs['today'] = date.today()
+    return inputs
+
+
+def build_checks(db, inputs):
+    """Every application query that reads the database, bound to sample parameters"""
+    manufacturer_id = inputs['manufacturer_id']
+    today = inputs['today']
+    checks = []
+    routed = list(ARCHIVE_ROUTED)
+    
+    values = {
+        'product_id': inputs['product_id'],
+        'manufacturer_id': manufacturer_id,
+        'supplier_id': inputs['supplier_id'],
+        'lot_number': inputs['product_lot']
+    }
+    for number, query in sorted(QUERIES.items()):
+        name = f"query.{number}"
+        checks.append(PlanCheck(
+            name, query.sql, query.bind(**{p: values[p] for p in query.params}), QUERY_ALLOW.get(name)
+        ))
+        if query.history:
+            routed.append(name)
+        if query.grouped_sql:
+            # The key filter applies to the first group_by column
+            checks.append(PlanCheck(
+                f"{name}.grouped", query.grouped_sql.format(key_filter="IN (%s)"),
+                (values[query.group_by[0]],), QUERY_ALLOW.get(f"{name}.grouped")
+            ))
+            if query.history:
+                routed.append(f"{name}.grouped")
+    
+    checks += [
+        PlanCheck('login.manufacturer', MANUFACTURER_LOOKUP_SQL, (manufacturer_id,)),
+        PlanCheck('report.active-plan', manufacturer_menu.ACTIVE_PLAN_SQL,
+                  (inputs['product_id'], manufacturer_id)),
+        PlanCheck('report.on-hand', manufacturer_menu.ON_HAND_SQL, (manufacturer_id,)),
+        PlanCheck('report.on-hand-lots', manufacturer_menu.ON_HAND_LOTS_SQL, (manufacturer_id,),
+                  {'filesort:INGREDIENT_BATCH': "orders one manufacturer's open lots by ingredient name"}),
+        PlanCheck('report.nearly-out', manufacturer_menu.NEARLY_OUT_OF_STOCK_SQL, (manufacturer_id,)),
+        PlanCheck('report.almost-expired', manufacturer_menu.ALMOST_EXPIRED_SQL, (manufacturer_id,)),
+        PlanCheck('report.batch-cost', manufacturer_menu.BATCH_COST_SQL,
+                  (inputs['product_lot'], manufacturer_id)),
+        PlanCheck('viewer.browse-products', viewer_menu.BROWSE_PRODUCTS_SQL),
+        PlanCheck('viewer.ingredient-list', viewer_menu.INGREDIENT_LIST_SQL, (inputs['product_lot'],),
+                  {'filesort:BATCH_CONSUMPTION': SMALL_SORT}),
+        PlanCheck('viewer.production-date', viewer_menu.PRODUCTION_DATE_SQL, (inputs['product_lot'],)),
+        PlanCheck('allocator.candidates',
+                  lot_allocator.CANDIDATE_LOTS_SQL.format(plan_filter='= %s'),
+                  (manufacturer_id, inputs['plan_id'])),
+        PlanCheck('allocator.candidates.many',
+                  lot_allocator.CANDIDATE_LOTS_SQL.format(plan_filter='IN (%s, %s)'),
+                  (manufacturer_id, inputs['plan_id'], inputs['plan_id'])),
+        PlanCheck('capacity.manufacturer',
+                  capacity.CAPACITY_SQL.format(
+                      stock_filter='\n          AND manufacturer_id = %s',
+                      manufacturer_filter='\n      AND p.manufacturer_id = %s'
+                  ),
+                  (manufacturer_id, manufacturer_id)),
+        PlanCheck('capacity.all', capacity.CAPACITY_SQL.format(stock_filter='', manufacturer_filter=''),
+                  allow={'scan:INGREDIENT_BATCH': "totals every manufacturer's stock from the covering index"}),
+        PlanCheck('costing.recipe-lines', costing.RECIPE_LINES_SQL),
+        PlanCheck('costing.candidate-lots', costing.CANDIDATE_LOTS_SQL, (today,),
+                  {'scan:INGREDIENT_BATCH': BULK_LOAD, 'filesort:INGREDIENT_BATCH': BULK_LOAD}),
+        PlanCheck('formulations', FORMULATIONS_SQL),
+        PlanCheck('bom.formulations', bom.FORMULATIONS_SQL),
+        PlanCheck('bom.ingredients', bom.INGREDIENTS_SQL),
+        PlanCheck('bom.recipe-lines', bom.RECIPE_LINES_SQL),
+        PlanCheck('trace.forward',
+                  traceability.TRACE_FORWARD_SQL.format(
+                      columns=traceability.FORWARD_COLUMNS, placeholders='%s'
+                  ),
+                  (inputs['ingredient_lot'],),
+                  {'filesort:BATCH_CONSUMPTION': "orders the product lots of the recalled ingredient lots"}),
+        PlanCheck('trace.supplier',
+                  traceability.TRACE_SUPPLIER_SQL.format(columns=traceability.FORWARD_COLUMNS),
+                  (inputs['supplier_id'], traceability.MIN_DATE, today, None, None),
+                  {'filesort:INGREDIENT_BATCH': "orders the product lots of one supplier's deliveries"}),
+        PlanCheck('trace.backward', traceability.TRACE_BACKWARD_SQL.format(placeholders='%s'),
+                  (inputs['product_lot'],)),
+        PlanCheck('trace.archive-candidates',
+                  traceability.ARCHIVE_CANDIDATE_LOTS_SQL.format(placeholders='%s'),
+                  (today, inputs['ingredient_lot'])),
+        PlanCheck('trace.index.ingredient-lots', traceability.INDEX_INGREDIENT_LOTS_SQL,
+                  allow={'scan:INGREDIENT_BATCH': BULK_LOAD, 'filesort:INGREDIENT_BATCH': BULK_LOAD}),
+        PlanCheck('trace.index.product-lots', traceability.INDEX_PRODUCT_LOTS_SQL,
+                  allow={'scan:PRODUCT_BATCH': BULK_LOAD}),
+        PlanCheck('trace.index.edges', traceability.INDEX_EDGES_SQL,
+                  allow={'scan:BATCH_CONSUMPTION': BULK_LOAD})
+    ]
+    
+    checks += [archive_check(check) for check in checks if check.name in routed]
+    
+    for table, (_, _, source_sql) in summary.SUMMARY_TABLES.items():
+        if table == 'INGREDIENT_STOCK_SUMMARY':
+            bases = ('INGREDIENT_BATCH',)
+        else:
+            bases = ('PRODUCT_BATCH', 'PRODUCT_BATCH_ARCHIVE')
+        allow = {}
+        for base in bases:
+            allow.update({f'scan:{base}': MAINTENANCE, f'filesort:{base}': MAINTENANCE})
+        checks.append(PlanCheck(f"summary.{table.lower()}", source_sql, allow=allow))
+    
+    inventory = ledger.InventoryLedger(db)
+    for scope, manufacturer in (('all', None), ('manufacturer', manufacturer_id)):
+        balances, params = inventory._balances(today, manufacturer)
+        checks += [
+            PlanCheck(f'ledger.on-hand.{scope}', ledger.ON_HAND_AS_OF_SQL.format(balances=balances), params),
+            PlanCheck(f'ledger.valuation.{scope}', ledger.VALUATION_SQL.format(balances=balances), params)
+        ]
+    checks += [
+        PlanCheck('ledger.latest-checkpoint', ledger.LATEST_CHECKPOINT_SQL, (today,)),
+        PlanCheck('ledger.verify', ledger.VERIFY_SQL, allow={
+            'scan:INGREDIENT_BATCH': MAINTENANCE, 'scan:INVENTORY_LEDGER': MAINTENANCE,
+            'filesort:INGREDIENT_BATCH': MAINTENANCE, 'filesort:INVENTORY_LEDGER': MAINTENANCE
+        })
+    ]
+    
+    checks += [
+        PlanCheck('archive.next-chunk', archive.NEXT_CHUNK_SQL, (today, archive.DEFAULT_CHUNK_SIZE)),
+        PlanCheck('archive.verify', archive.VERIFY_SQL, (today, today), allow={
+            f'{kind}:{table}': "checks every row against the watermark"
+            for kind in ('scan', 'filesort')
+            for table in ('PRODUCT_BATCH', 'PRODUCT_BATCH_ARCHIVE', 'BATCH_CONSUMPTION_ARCHIVE')
+        })
+    ]
+    return checks
+
+
+def explain(db, check):
+    """Parsed EXPLAIN FORMAT=JSON plan of one check"""
+    row = db.fetch_one("EXPLAIN FORMAT=JSON " + check.sql, check.params or None, row_factory='tuple')
+    return json.loads(row[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when a query plan scans or filesorts a large table")
+    parser.add_argument('--only', nargs='+', metavar='PREFIX', help="Check queries starting with these names")
+    parser.add_argument('--show', metavar='NAME', help="Print one query's plan and exit")
+    parser.add_argument('--save', metavar='DIR', help="Write every plan to DIR/<name>.json")
+    parser.add_argument('--create-indexes', action='store_true',
+                        help="Add missing plan indexes (and drop the ones they replace) before checking")
+    args = parser.parse_args(argv)
+    
+    db = DatabaseConnection(pool_size=0, verbose=False)
+    try:
+        if args.create_indexes:
+            created, dropped = ensure_indexes(db)
+            if created or dropped:
+                print(f"✓ Created {', '.join(created) or 'nothing'}; dropped {', '.join(dropped) or 'nothing'}")
+            else:
+                print("✓ Indexes already present")
+        
+        checks = build_checks(db, discover(db))
+        if args.show:
+            matches = [check for check in checks if check.name == args.show]
+            if not matches:
+                parser.error(f"Unknown query: {args.show} (known: {', '.join(c.name for c in checks)})")
+            print(json.dumps(explain(db, matches[0]), indent=2))
+            return 0
+        if args.only:
+            checks = [c for c in checks if any(c.name.startswith(prefix) for prefix in args.only)]
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+        
+        failed = 0
+        for check in checks:
+            plan = explain(db, check)
+            if args.save:
+                with open(os.path.join(args.save, f"{check.name}.json"), 'w', encoding='utf-8') as handle:
+                    json.dump(plan, handle, indent=2)
+            
+            violations = plan_violations(plan, table_aliases(check.sql))
+            unexpected = [v for v in violations if v.key not in check.allow]
+            print(f"  {'✗' if unexpected else '✓'} {check.name}")
+            for violation in violations:
+                reason = check.allow.get(violation.key)
+                if reason:
+                    print(f"      allowed: {violation} -- {reason}")
+                else:
+                    print(f"      {violation}")
+            failed += bool(unexpected)
+    finally:
+        db.close()
+    
+    if failed:
+        print(f"\n✗ {failed} of {len(checks)} plan(s) scan or sort a large table")
+        return 1
+    print(f"\n✓ {len(checks)} plan(s) use indexes on the large tables")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
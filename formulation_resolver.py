@@ -0,0 +1,152 @@
+"""
+Formulation Resolver Module
+Point-in-time formulation and price lookup over effective-date intervals
+
+Each ingredient's formulation versions are flattened once into sorted,
+non-overlapping segments, so "which formulation (and price) applied to
+ingredient X on date D" is one bisect in memory. Where versions overlap,
+the one with the latest effective_start_date wins.
+"""
+
+from array import array
+from bisect import bisect_right
+from decimal import Decimal
+
+
+FORMULATIONS_SQL = """
+    SELECT formulation_id, ingredient_id, pack_size, unit_price,
+           effective_start_date, effective_end_date
+    FROM FORMULATION
+    ORDER BY ingredient_id, effective_start_date
+"""
+
+
+class Formulation:
+    """One formulation version of an ingredient"""
+    
+    def __init__(self, formulation_id, ingredient_id, pack_size, unit_price, start, end):
+        self.formulation_id = formulation_id
+        self.ingredient_id = ingredient_id
+        self.pack_size = pack_size
+        self.unit_price = unit_price
+        self.start = start
+        self.end = end
+        self.materials = []
+        
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            row['formulation_id'], row['ingredient_id'], Decimal(str(row['pack_size'])),
+            Decimal(str(row['unit_price'])), row['effective_start_date'], row['effective_end_date']
+        )
+        
+    @property
+    def price_per_oz(self):
+        return self.unit_price / self.pack_size
+        
+    def effective_on(self, as_of):
+        return self.start <= as_of and (self.end is None or as_of <= self.end)
+
+
+def build_segments(versions):
+    """
+    Flatten possibly overlapping versions into disjoint segments
+    
+    Coverage only changes where a version starts or the day after one
+    ends, so the winner is evaluated once at each of those boundaries and
+    adjacent segments with the same winner are merged.
+    
+    Returns:
+        tuple: (array of segment start ordinals, winning Formulation or None per segment)
+    """
+    bounds = []
+    for v in versions:
+        bounds.append((v.start.toordinal(), None if v.end is None else v.end.toordinal(), v))
+    
+    points = sorted({start for start, _, _ in bounds} |
+                    {end + 1 for _, end, _ in bounds if end is not None})
+    starts = array('i')
+    winners = []
+    for point in points:
+        covering = [v for start, end, v in bounds
+                    if start <= point and (end is None or point <= end)]
+        winner = max(covering, key=lambda v: (v.start, v.formulation_id)) if covering else None
+        if winners and winners[-1] is winner:
+            continue
+        starts.append(point)
+        winners.append(winner)
+    return starts, winners
+
+
+class FormulationResolver:
+    """
+    Per-ingredient interval index over formulation versions
+    
+    Build with FormulationResolver.load(db) (one query) or from Formulation
+    objects already in memory (bom.BillOfMaterials does this).
+    """
+    
+    def __init__(self, formulations):
+        versions = {}
+        for formulation in formulations:
+            versions.setdefault(formulation.ingredient_id, []).append(formulation)
+        self.segments = {
+            ingredient_id: build_segments(sorted(group, key=lambda v: v.start))
+            for ingredient_id, group in versions.items()
+        }
+        
+    @classmethod
+    def load(cls, db_connection):
+        rows = db_connection.fetch_all(FORMULATIONS_SQL, row_factory='dict')
+        return cls(Formulation.from_row(row) for row in rows)
+        
+    def resolve(self, ingredient_id, as_of):
+        """
+        Formulation in effect for an ingredient on a date
+        
+        Args:
+            ingredient_id (int): Ingredient ID
+            as_of (date): Date to resolve
+        
+        Returns:
+            Formulation: The effective version, or None
+        """
+        segments = self.segments.get(ingredient_id)
+        if segments is None:
+            return None
+        starts, winners = segments
+        i = bisect_right(starts, as_of.toordinal()) - 1
+        return winners[i] if i >= 0 else None
+        
+    def resolve_many(self, pairs):
+        """
+        Resolve many (ingredient_id, as_of) pairs
+        
+        Returns:
+            list: Formulation or None per pair, in the same order
+        """
+        segments = self.segments
+        results = []
+        append = results.append
+        for ingredient_id, as_of in pairs:
+            entry = segments.get(ingredient_id)
+            if entry is None:
+                append(None)
+                continue
+            i = bisect_right(entry[0], as_of.toordinal()) - 1
+            append(entry[1][i] if i >= 0 else None)
+        return results
+        
+    def price(self, ingredient_id, as_of):
+        """Price per oz on a date, or None (single form of prices())"""
+        formulation = self.resolve(ingredient_id, as_of)
+        return formulation.price_per_oz if formulation else None
+        
+    def pack_price(self, ingredient_id, as_of):
+        """Unit price of one pack (pack_size oz) on a date, or None"""
+        formulation = self.resolve(ingredient_id, as_of)
+        return formulation.unit_price if formulation else None
+        
+    def prices(self, pairs):
+        """Price per oz for many (ingredient_id, as_of) pairs (None where unresolved)"""
+        return [f.price_per_oz if f else None for f in self.resolve_many(pairs)]
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""
+Instrumentation Module
+Per-statement timing, slow-query logging and Prometheus-style metrics
+"""
+
+from functools import lru_cache
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger('inventory.sql')
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Frames in these modules are plumbing, not the menu action that issued the statement
+_INFRASTRUCTURE = ('instrumentation', 'database_connection', 'prepared_statements',
+                   'result_cache', 'row_factory', 'report_output', 'contextlib')
+
+_COMMENTS = re.compile(r'/\*.*?\*/|--[^\n]*', re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normalize a statement so calls that differ only in literals group together
+    
+    Comments are dropped, literals and placeholders become ?, IN lists
+    collapse to IN (...), and whitespace is squeezed.
+    """
+    text = _COMMENTS.sub(' ', sql)
+    text = _STRINGS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _IN_LISTS.sub('IN (...)', text.replace('%s', '?'))
+    return _SPACE.sub(' ', text).strip()
+
+
+@lru_cache(maxsize=512)
+def _is_infrastructure(filename):
+    module = os.path.splitext(os.path.basename(filename))[0]
+    return module in _INFRASTRUCTURE or f"{os.sep}mysql{os.sep}" in filename
+
+
+def calling_action(depth=2):
+    """module.function of the nearest caller outside the database plumbing"""
+    frame = sys._getframe(depth)
+    while frame is not None:
+        code = frame.f_code
+        if not _is_infrastructure(code.co_filename):
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram (Prometheus layout)"""
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        self.count += 1
+        
+    def cumulative(self):
+        """(upper bound label, cumulative count) pairs ending with +Inf"""
+        running = 0
+        pairs = []
+        for bound, n in zip(BUCKETS + ('+Inf',), self.counts):
+            running += n
+            pairs.append((bound, running))
+        return pairs
+
+
+class StatementStats:
+    """Counters for one statement fingerprint"""
+    
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.histogram = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+        self.max_seconds = 0.0
+        self.callers = {}
+        
+    def as_dict(self):
+        h = self.histogram
+        return {
+            'fingerprint': self.fingerprint,
+            'calls': h.count,
+            'total_ms': round(h.total * 1000, 3),
+            'mean_ms': round(h.total / h.count * 1000, 3) if h.count else 0.0,
+            'max_ms': round(self.max_seconds * 1000, 3),
+            'rows': self.rows,
+            'errors': self.errors,
+            'slow': self.slow,
+            'callers': dict(self.callers)
+        }
+
+
+def _label(value):
+    text = str(value)[:200]
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class Instrumentation:
+    """
+    In-process statement metrics
+    
+    Disabled by default (DB_INSTRUMENT=1 turns it on); when disabled the
+    connection hands out raw connections and cursors, so the only cost is
+    one attribute check per checkout.
+    """
+    
+    def __init__(self, enabled=None, slow_threshold_ms=None):
+        if enabled is None:
+            enabled = os.getenv('DB_INSTRUMENT', '0').lower() in ('1', 'true', 'yes')
+        if slow_threshold_ms is None:
+            slow_threshold_ms = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold_ms / 1000
+        self._stats = {}
+        self._lock = threading.Lock()
+        
+    def record(self, sql, seconds, rows=0, caller=None, error=False):
+        """Record one completed statement"""
+        fp = fingerprint(sql)
+        with self._lock:
+            stats = self._stats.get(fp)
+            if stats is None:
+                stats = self._stats[fp] = StatementStats(fp)
+            stats.histogram.observe(seconds)
+            stats.rows += rows
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if error:
+                stats.errors += 1
+            if caller:
+                stats.callers[caller] = stats.callers.get(caller, 0) + 1
+            slow = seconds >= self.slow_threshold
+            if slow:
+                stats.slow += 1
+        
+        if slow:
+            logger.warning("slow statement %.1f ms rows=%d caller=%s: %s",
+                           seconds * 1000, rows, caller or 'unknown', fp)
+    
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+    
+    def snapshot(self):
+        """Per-fingerprint stats, most total time first"""
+        with self._lock:
+            rows = [s.as_dict() for s in self._stats.values()]
+        return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+        
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            stats = list(self._stats.values())
+        
+        lines = [
+            "# HELP inventory_sql_statement_seconds Statement latency by fingerprint",
+            "# TYPE inventory_sql_statement_seconds histogram"
+        ]
+        for s in stats:
+            fp = _label(s.fingerprint)
+            for bound, count in s.histogram.cumulative():
+                lines.append(f'inventory_sql_statement_seconds_bucket{{fingerprint="{fp}",le="{bound}"}} {count}')
+            lines.append(f'inventory_sql_statement_seconds_sum{{fingerprint="{fp}"}} {s.histogram.total:.6f}')
+            lines.append(f'inventory_sql_statement_seconds_count{{fingerprint="{fp}"}} {s.histogram.count}')
+        
+        for name, help_text, attr in (
+            ('inventory_sql_rows_total', "Rows returned by fingerprint", 'rows'),
+            ('inventory_sql_errors_total', "Failed statements by fingerprint", 'errors'),
+            ('inventory_sql_slow_total', "Statements over the slow threshold", 'slow')
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for s in stats:
+                lines.append(f'{name}{{fingerprint="{_label(s.fingerprint)}"}} {getattr(s, attr)}')
+        
+        lines.append("# HELP inventory_sql_caller_statements_total Statements issued per menu action")
+        lines.append("# TYPE inventory_sql_caller_statements_total counter")
+        callers = {}
+        for s in stats:
+            for caller, n in s.callers.items():
+                callers[caller] = callers.get(caller, 0) + n
+        for caller, n in sorted(callers.items()):
+            lines.append(f'inventory_sql_caller_statements_total{{caller="{_label(caller)}"}} {n}')
+        
+        return '\n'.join(lines) + '\n'
+        
+    def write_snapshot(self, path):
+        """Write prometheus_text() atomically (for a node-exporter textfile collector)"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as handle:
+            handle.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper that times each statement through to its last fetch
+    
+    A statement is recorded when its result is fully fetched, when the next
+    statement starts, or when the cursor is closed, so the latency includes
+    reading rows from an unbuffered cursor.
+    """
+    
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._pending = None
+        
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+        
+    def __iter__(self):
+        return iter(self.fetchall())
+        
+    def _begin(self, sql):
+        self._finish()
+        self._pending = [sql, 0.0, 0, calling_action(3)]
+        
+    def _finish(self, error=False):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            self._instrumentation.record(pending[0], pending[1], pending[2], pending[3], error)
+    
+    def _timed(self, sql, method, *args, **kwargs):
+        self._begin(sql)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            self._pending[1] += time.perf_counter() - started
+            self._finish(error=True)
+            raise
+        finally:
+            if self._pending is not None:
+                self._pending[1] += time.perf_counter() - started
+                if not getattr(self._cursor, 'with_rows', False):
+                    self._pending[2] = max(self._cursor.rowcount, 0)
+                    self._finish()
+    
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(operation, self._cursor.execute, operation, params, *args, **kwargs)
+        
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(operation, self._cursor.executemany, operation, seq_params, *args, **kwargs)
+        
+    def callproc(self, procname, args=()):
+        self._begin(f"CALL {procname}")
+        started = time.perf_counter()
+        try:
+            return self._cursor.callproc(procname, args)
+        except Exception:
+            self._pending[1] += time.perf_counter() - started
+            self._finish(error=True)
+            raise
+        finally:
+            if self._pending is not None:
+                self._pending[1] += time.perf_counter() - started
+                self._finish()
+    
+    def _fetched(self, started, rows, complete):
+        if self._pending is not None:
+            self._pending[1] += time.perf_counter() - started
+            self._pending[2] += rows
+            if complete:
+                self._finish()
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1, row is None)
+        return row
+        
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(started, len(rows), not rows)
+        return rows
+        
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+        
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+
+class InstrumentedConnection:
+    """Connection wrapper whose cursors are InstrumentedCursors"""
+    
+    def __init__(self, connection, instrumentation):
+        self._connection = connection
+        self._instrumentation = instrumentation
+        
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+        
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._instrumentation)
\ No newline at end of file
@@ -0,0 +1,307 @@
+"""
+Ledger Module
+Point-in-time on-hand and inventory valuation from the append-only movement ledger
+
+INVENTORY_LEDGER holds every receipt, consumption and transfer of a
+manufacturer's stock as a signed quantity per lot (written by triggers).
+A checkpoint stores each lot's balance at the end of a past date, built
+from the previous checkpoint plus the movements since, so on-hand as of
+date D is the nearest checkpoint on or before D plus the movements between
+the two -- a bounded delta rather than all of history.
+"""
+
+from datetime import date, timedelta
+
+
+# Lower bound when no checkpoint precedes the as-of date (MySQL's minimum DATE)
+MIN_DATE = date(1000, 1, 1)
+
+LATEST_CHECKPOINT_SQL = """
+    SELECT MAX(snapshot_date) AS snapshot_date
+    FROM INVENTORY_CHECKPOINT
+    WHERE snapshot_date <= %s
+"""
+
+# Balance per (manufacturer, lot) = checkpoint rows + movements after it up to as-of
+BALANCES_SQL = """
+    SELECT m.manufacturer_id, m.lot_number, m.ingredient_id, SUM(m.quantity_oz) AS on_hand_oz
+    FROM (
+        SELECT manufacturer_id, lot_number, ingredient_id, on_hand_oz AS quantity_oz
+        FROM INVENTORY_SNAPSHOT
+        WHERE snapshot_date = %s{manufacturer_filter}
+        UNION ALL
+        SELECT manufacturer_id, lot_number, ingredient_id, quantity_oz
+        FROM INVENTORY_LEDGER
+        WHERE movement_date > %s AND movement_date <= %s{manufacturer_filter}
+    ) m
+    GROUP BY m.manufacturer_id, m.lot_number, m.ingredient_id
+    HAVING SUM(m.quantity_oz) <> 0
+"""
+
+ON_HAND_AS_OF_SQL = """
+    SELECT b.manufacturer_id, b.lot_number, i.name AS ingredient_name,
+           b.on_hand_oz, ib.cost_per_unit, ib.expiration_date
+    FROM ({balances}) b
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = b.lot_number
+    JOIN INGREDIENT i ON b.ingredient_id = i.ingredient_id
+    ORDER BY b.manufacturer_id, i.name, ib.expiration_date, b.lot_number
+"""
+
+VALUATION_SQL = """
+    SELECT b.manufacturer_id, b.ingredient_id, i.name AS ingredient_name,
+           COUNT(*) AS lots,
+           SUM(b.on_hand_oz) AS on_hand_oz,
+           SUM(b.on_hand_oz * ib.cost_per_unit) AS inventory_value
+    FROM ({balances}) b
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = b.lot_number
+    JOIN INGREDIENT i ON b.ingredient_id = i.ingredient_id
+    GROUP BY b.manufacturer_id, b.ingredient_id, i.name
+    ORDER BY b.manufacturer_id, i.name
+"""
+
+INSERT_CHECKPOINT_SQL = """
+    INSERT INTO INVENTORY_CHECKPOINT (snapshot_date, lot_count, on_hand_oz)
+    VALUES (%s, 0, 0)
+"""
+
+INSERT_SNAPSHOT_SQL = """
+    INSERT INTO INVENTORY_SNAPSHOT (snapshot_date, manufacturer_id, lot_number, ingredient_id, on_hand_oz)
+    SELECT %s, b.manufacturer_id, b.lot_number, b.ingredient_id, b.on_hand_oz
+    FROM ({balances}) b
+"""
+
+FINISH_CHECKPOINT_SQL = """
+    UPDATE INVENTORY_CHECKPOINT c
+    JOIN (
+        SELECT COUNT(*) AS lot_count, COALESCE(SUM(on_hand_oz), 0) AS on_hand_oz
+        FROM INVENTORY_SNAPSHOT
+        WHERE snapshot_date = %s
+    ) s
+    SET c.lot_count = s.lot_count, c.on_hand_oz = s.on_hand_oz
+    WHERE c.snapshot_date = %s
+"""
+
+# Lots whose ledger balance disagrees with INGREDIENT_BATCH.on_hand_oz
+VERIFY_SQL = """
+    SELECT ib.lot_number, ib.manufacturer_id, ib.on_hand_oz, COALESCE(l.balance, 0) AS ledger_oz
+    FROM INGREDIENT_BATCH ib
+    LEFT JOIN (
+        SELECT lot_number, manufacturer_id, SUM(quantity_oz) AS balance
+        FROM INVENTORY_LEDGER
+        GROUP BY lot_number, manufacturer_id
+    ) l ON l.lot_number = ib.lot_number AND l.manufacturer_id = ib.manufacturer_id
+    WHERE ib.manufacturer_id IS NOT NULL
+      AND COALESCE(l.balance, 0) <> COALESCE(ib.on_hand_oz, 0)
+    ORDER BY ib.lot_number
+"""
+
+# Rebuilding replays history from the base tables (archived consumption
+# included), dated by received_date and production_date; any remainder
+# (edits made outside the procedures) is booked today as an adjustment so
+# balances match on_hand_oz.
+REBUILD_CLEAR = (
+    "DELETE FROM INVENTORY_CHECKPOINT",
+    "DELETE FROM INVENTORY_LEDGER"
+)
+
+REBUILD_STATEMENTS = (
+    """
+    INSERT INTO INVENTORY_LEDGER (lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz, movement_date)
+    SELECT lot_number, manufacturer_id, ingredient_id, 'RECEIPT', quantity, received_date
+    FROM INGREDIENT_BATCH
+    WHERE manufacturer_id IS NOT NULL AND quantity > 0
+    ORDER BY received_date, lot_number
+    """,
+    """
+    INSERT INTO INVENTORY_LEDGER (
+        lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz, product_batch_lot, movement_date
+    )
+    SELECT ib.lot_number, ib.manufacturer_id, ib.ingredient_id, 'CONSUMPTION',
+           -bca.quantity_consumed, bca.product_batch_lot, bca.production_date
+    FROM BATCH_CONSUMPTION_ARCHIVE bca
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = bca.ingredient_batch_lot
+    WHERE ib.manufacturer_id IS NOT NULL
+    ORDER BY bca.production_date, bca.product_batch_lot, bca.ingredient_batch_lot
+    """,
+    """
+    INSERT INTO INVENTORY_LEDGER (
+        lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz, product_batch_lot, movement_date
+    )
+    SELECT ib.lot_number, ib.manufacturer_id, ib.ingredient_id, 'CONSUMPTION',
+           -bc.quantity_consumed, bc.product_batch_lot, pb.production_date
+    FROM BATCH_CONSUMPTION bc
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = bc.ingredient_batch_lot
+    JOIN PRODUCT_BATCH pb ON pb.lot_number = bc.product_batch_lot
+    WHERE ib.manufacturer_id IS NOT NULL
+    ORDER BY pb.production_date, bc.product_batch_lot, bc.ingredient_batch_lot
+    """,
+    """
+    INSERT INTO INVENTORY_LEDGER (lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz)
+    SELECT ib.lot_number, ib.manufacturer_id, ib.ingredient_id, 'ADJUSTMENT',
+           COALESCE(ib.on_hand_oz, 0) - l.balance
+    FROM INGREDIENT_BATCH ib
+    JOIN (
+        SELECT lot_number, SUM(quantity_oz) AS balance
+        FROM INVENTORY_LEDGER
+        GROUP BY lot_number
+    ) l ON l.lot_number = ib.lot_number
+    WHERE ib.manufacturer_id IS NOT NULL
+      AND COALESCE(ib.on_hand_oz, 0) <> l.balance
+    """
+)
+
+
+def month_ends(start, end):
+    """Last day of every month from start's month through end (inclusive)"""
+    ends = []
+    first = start.replace(day=1)
+    while True:
+        following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        last = following - timedelta(days=1)
+        if last > end:
+            return ends
+        ends.append(last)
+        first = following
+
+
+class InventoryLedger:
+    """As-of on-hand, valuation and checkpoint maintenance over INVENTORY_LEDGER"""
+    
+    def __init__(self, db_connection):
+        self.db = db_connection
+        
+    def _balances(self, as_of, manufacturer_id=None):
+        """BALANCES_SQL for an as-of date and its parameters"""
+        row = self.db.fetch_one(LATEST_CHECKPOINT_SQL, (as_of,), row_factory='dict')
+        base = row['snapshot_date'] if row and row['snapshot_date'] else MIN_DATE
+        if manufacturer_id is None:
+            return BALANCES_SQL.format(manufacturer_filter=''), (base, base, as_of)
+        sql = BALANCES_SQL.format(manufacturer_filter=' AND manufacturer_id = %s')
+        return sql, (base, manufacturer_id, base, as_of, manufacturer_id)
+        
+    def on_hand_as_of(self, as_of, manufacturer_id=None):
+        """
+        Lot balances at the end of a date
+        
+        Args:
+            as_of (date): Date to report
+            manufacturer_id (str): Limit to one manufacturer (optional)
+        
+        Returns:
+            list: One row per lot with stock on hand
+        """
+        balances, params = self._balances(as_of, manufacturer_id)
+        return self.db.fetch_all(ON_HAND_AS_OF_SQL.format(balances=balances), params)
+        
+    def valuation(self, as_of, manufacturer_id=None):
+        """
+        Inventory value per manufacturer and ingredient at the end of a date
+        
+        Lots are valued at their own cost_per_unit.
+        
+        Returns:
+            list: Rows with lots, on_hand_oz and inventory_value
+        """
+        balances, params = self._balances(as_of, manufacturer_id)
+        return self.db.fetch_all(VALUATION_SQL.format(balances=balances), params)
+        
+    def checkpoint(self, as_of=None):
+        """
+        Store every lot's balance at the end of a past date
+        
+        Built from the previous checkpoint plus the movements since, so
+        taking checkpoints in date order touches each movement once.
+        
+        Args:
+            as_of (date): Date to checkpoint (default: yesterday); must be before today
+        
+        Returns:
+            dict: snapshot_date, lot_count and on_hand_oz
+        """
+        as_of = as_of or date.today() - timedelta(days=1)
+        if as_of >= date.today():
+            raise ValueError("Checkpoints can only be taken for dates before today")
+        
+        balances, params = self._balances(as_of)
+        with self.db.checkout() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(INSERT_CHECKPOINT_SQL, (as_of,))
+                cursor.execute(INSERT_SNAPSHOT_SQL.format(balances=balances), (as_of, *params))
+                cursor.execute(FINISH_CHECKPOINT_SQL, (as_of, as_of))
+                cursor.execute(
+                    "SELECT snapshot_date, lot_count, on_hand_oz FROM INVENTORY_CHECKPOINT "
+                    "WHERE snapshot_date = %s", (as_of,)
+                )
+                result = cursor.fetchone()
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        self.db.invalidate(('INVENTORY_CHECKPOINT', 'INVENTORY_SNAPSHOT'))
+        return result
+        
+    def checkpoint_month_ends(self, since=None):
+        """
+        Take any missing month-end checkpoints up to last month
+        
+        Args:
+            since (date): First month to consider (default: the earliest movement)
+        
+        Returns:
+            list: Results of checkpoint() for each one taken
+        """
+        if since is None:
+            row = self.db.fetch_one(
+                "SELECT MIN(movement_date) AS first_date FROM INVENTORY_LEDGER", row_factory='dict'
+            )
+            if not row or not row['first_date']:
+                return []
+            since = row['first_date']
+        
+        existing = {
+            row['snapshot_date'] for row in self.db.fetch_all(
+                "SELECT snapshot_date FROM INVENTORY_CHECKPOINT", row_factory='dict'
+            )
+        }
+        yesterday = date.today() - timedelta(days=1)
+        return [
+            self.checkpoint(month_end)
+            for month_end in month_ends(since, yesterday)
+            if month_end not in existing
+        ]
+        
+    def verify(self):
+        """Lots whose ledger balance does not match INGREDIENT_BATCH.on_hand_oz"""
+        return self.db.fetch_all(VERIFY_SQL)
+        
+    def rebuild(self):
+        """
+        Replace the ledger with one replayed from receipts and consumption
+        
+        Use after loading data.sql or a generated data set, whose movements
+        the triggers booked on the load date. Checkpoints are dropped; take
+        new ones with checkpoint_month_ends().
+        
+        Returns:
+            int: Movements written
+        """
+        with self.db.checkout() as connection:
+            cursor = connection.cursor()
+            try:
+                for statement in REBUILD_CLEAR:
+                    cursor.execute(statement)
+                written = 0
+                for statement in REBUILD_STATEMENTS:
+                    cursor.execute(statement)
+                    written += cursor.rowcount
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        self.db.invalidate(('INVENTORY_LEDGER', 'INVENTORY_CHECKPOINT', 'INVENTORY_SNAPSHOT'))
+        return written
\ No newline at end of file
@@ -0,0 +1,412 @@
+"""
+Load Test Module
+Concurrent operator sessions against a local database
+
+Each worker (thread or process) opens its own connection and runs a
+weighted mix of ingredient receipts, production batches, reports and
+queries for one manufacturer. Workers share the busiest manufacturers, so
+production batches compete for the same hot INGREDIENT_BATCH rows.
+Throughput, latency percentiles and deadlock / lock-wait-timeout counts
+are reported per operation.
+
+Receipts and production batches are committed: run against a scratch
+database (see data_generator.py or benchmark.py --reset).
+
+Usage:
+    python load_test.py --workers 16 --duration 60
+    python load_test.py --workers 32 --mode process --mix production=6,report=2 --manufacturers 1
+    python load_test.py --workers 8 --procedure RecordProductionBatch --save results/legacy.json
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+import os
+import random
+import sys
+import time
+
+from mysql.connector import Error
+
+from batch_import import INSERT_BATCH_SQL, compute_lot_number
+from benchmark import ACTIVE_PRODUCTS_SQL, discover_inputs, percentile
+from database_connection import DatabaseConnection
+from lot_allocator import InsufficientStockError, LotAllocator
+from manufacturer_menu import ManufacturerMenu
+from query_executor import QueryExecutor
+from retry_policy import ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT, RetryPolicy
+
+
+# Manufacturers with the most production history; workers are spread across them
+BUSIEST_MANUFACTURERS_SQL = """
+    SELECT manufacturer_id
+    FROM PRODUCT_BATCH
+    GROUP BY manufacturer_id
+    ORDER BY COUNT(*) DESC, manufacturer_id
+    LIMIT %s
+"""
+
+# Ingredients a manufacturer's active recipes use, with the supplier that defines them
+RECEIPT_CANDIDATES_SQL = """
+    SELECT DISTINCT ri.ingredient_id, i.supplier_id
+    FROM PRODUCT p
+    JOIN RECIPE_PLAN rp ON p.product_id = rp.product_id AND rp.is_active = TRUE
+    JOIN RECIPE_INGREDIENT ri ON rp.plan_id = ri.plan_id
+    JOIN INGREDIENT i ON ri.ingredient_id = i.ingredient_id
+    WHERE p.manufacturer_id = %s
+    ORDER BY ri.ingredient_id
+"""
+
+DEFAULT_MIX = {'receipt': 2, 'production': 3, 'report': 3, 'query': 2}
+
+# SIGNAL raised by a trigger or stored procedure
+ER_SIGNAL_EXCEPTION = 1644
+OUTCOMES = ('ok', 'deadlock', 'lock_wait_timeout', 'rejected', 'no_stock', 'error')
+
+
+def classify(error):
+    """
+    Outcome name for an exception raised by an operation
+    
+    'rejected' is a SIGNAL from a trigger or procedure (e.g. a lot drained
+    by another session between allocation and the call); 'no_stock' is an
+    allocation that found too little stock before calling the server.
+    """
+    if isinstance(error, InsufficientStockError):
+        return 'no_stock'
+    errno = getattr(error, 'errno', None)
+    if errno == ER_LOCK_DEADLOCK:
+        return 'deadlock'
+    if errno == ER_LOCK_WAIT_TIMEOUT:
+        return 'lock_wait_timeout'
+    if errno == ER_SIGNAL_EXCEPTION:
+        return 'rejected'
+    return 'error'
+
+
+class OperationStats:
+    """Latencies of successful calls and outcome counts for one operation"""
+    
+    def __init__(self):
+        self.latencies = []
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        
+    def record(self, outcome, seconds):
+        self.outcomes[outcome] += 1
+        if outcome == 'ok':
+            self.latencies.append(seconds)
+    
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        for outcome, n in other.outcomes.items():
+            self.outcomes[outcome] += n
+    
+    def as_dict(self, elapsed):
+        latencies = sorted(self.latencies)
+        attempts = sum(self.outcomes.values())
+        return {
+            'attempts': attempts,
+            **self.outcomes,
+            'ops_per_sec': round(self.outcomes['ok'] / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+        }
+
+
+class Workload:
+    """The operations one simulated operator session performs"""
+    
+    def __init__(self, db, context, worker_id, run_tag, rng, procedure):
+        self.db = db
+        self.context = context
+        self.rng = rng
+        self.procedure = procedure
+        self.manufacturer_id = context['manufacturer_id']
+        self.menu = ManufacturerMenu(db, {'manufacturer_id': self.manufacturer_id, 'name': 'load test'})
+        self.executor = QueryExecutor(db)
+        self.allocator = LotAllocator(db, self.manufacturer_id)
+        self.tag = f"{run_tag}{worker_id:02d}"
+        self.sequence = 0
+        
+    def operations(self):
+        return {
+            'receipt': self.receipt,
+            'production': self.production,
+            'report': self.report,
+            'query': self.query
+        }
+        
+    def _batch_id(self, prefix):
+        self.sequence += 1
+        return f"{prefix}{self.tag}{self.sequence:05d}"
+        
+    def receipt(self):
+        """Manufacturer receives a fresh lot of an ingredient its recipes use"""
+        candidate = self.rng.choice(self.context['receipts'])
+        batch_id = self._batch_id('LR')
+        params = (
+            compute_lot_number(candidate['ingredient_id'], candidate['supplier_id'], batch_id),
+            candidate['ingredient_id'],
+            candidate['supplier_id'],
+            self.manufacturer_id,
+            batch_id,
+            Decimal(self.rng.randint(200, 2000)),
+            Decimal(self.rng.randint(100, 1000)) / 100,
+            date.today() + timedelta(days=self.rng.randint(120, 365))
+        )
+        
+        connection = self.db.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(INSERT_BATCH_SQL, params)
+            connection.commit()
+            self.db.invalidate(['INGREDIENT_BATCH'])
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    
+    def production(self):
+        """
+        FEFO-allocate and record one standard batch of a random product,
+        retried on lock conflicts like ManufacturerMenu.record_product_batch
+        """
+        product = self.rng.choice(self.context['products'])
+        units = product['standard_batch_size']
+        batch_id = self._batch_id('LP')
+        
+        def attempt():
+            allocation = self.allocator.allocate(product['plan_id'], units)
+            if not allocation.ok:
+                raise InsufficientStockError(allocation.shortfalls)
+            self.db.call_procedure(self.procedure, [
+                product['product_id'],
+                product['plan_id'],
+                self.manufacturer_id,
+                batch_id,
+                units,
+                json.dumps(allocation.procedure_payload())
+            ])
+        
+        self.db.retry_policy.run(attempt)
+        
+    def report(self):
+        fetch = self.rng.choice((
+            self.menu.fetch_on_hand,
+            self.menu.fetch_nearly_out_of_stock,
+            self.menu.fetch_almost_expired
+        ))
+        fetch()
+        
+    def query(self):
+        number = self.rng.randint(1, 5)
+        params = {
+            1: {},
+            2: {'product_id': self.rng.choice(self.context['products'])['product_id'],
+                'manufacturer_id': self.manufacturer_id},
+            3: {'manufacturer_id': self.manufacturer_id},
+            4: {'supplier_id': self.rng.choice(self.context['receipts'])['supplier_id']},
+            5: {'lot_number': self.context['product_lot']}
+        }[number]
+        self.executor.run_query(number, **params)
+
+
+def run_worker(worker_id, plan):
+    """
+    One operator session; runs in a thread or a child process
+    
+    Args:
+        worker_id (int): Worker number (also picks the manufacturer)
+        plan (dict): Shared settings built by main()
+    
+    Returns:
+        tuple: (OperationStats per operation name, lock-conflict retries)
+    """
+    rng = random.Random(plan['seed'] * 1000 + worker_id)
+    context = plan['contexts'][worker_id % len(plan['contexts'])]
+    names = list(plan['mix'])
+    weights = [plan['mix'][name] for name in names]
+    stats = {name: OperationStats() for name in names}
+    
+    db = DatabaseConnection(pool_size=0, verbose=False)
+    db.cache.max_entries = 0
+    if not plan['retry']:
+        db.retry_policy = RetryPolicy(max_attempts=1)
+    try:
+        if plan['lock_wait_timeout']:
+            db.execute_query("SET SESSION innodb_lock_wait_timeout = %s",
+                             (plan['lock_wait_timeout'],), fetch=False)
+        operations = Workload(db, context, worker_id, plan['run_tag'], rng,
+                              plan['procedure']).operations()
+        
+        time.sleep(max(0.0, plan['start_at'] - time.time()))
+        deadline = plan['start_at'] + plan['duration']
+        done = 0
+        while time.time() < deadline and (not plan['operations'] or done < plan['operations']):
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                operations[name]()
+                outcome = 'ok'
+            except Exception as e:
+                outcome = classify(e)
+                db.rollback()
+            stats[name].record(outcome, time.perf_counter() - started)
+            done += 1
+            if plan['think_ms']:
+                time.sleep(rng.expovariate(1000 / plan['think_ms']))
+    finally:
+        db.close()
+    
+    return stats, db.retry_policy.retries
+
+
+def discover_contexts(db, manufacturers):
+    """Per-manufacturer products and receipt candidates for the busiest manufacturers"""
+    inputs = discover_inputs(db)
+    contexts = []
+    for row in db.fetch_all(BUSIEST_MANUFACTURERS_SQL, (manufacturers,)):
+        manufacturer_id = row['manufacturer_id']
+        products = [dict(p) for p in db.fetch_all(ACTIVE_PRODUCTS_SQL, (manufacturer_id,))]
+        receipts = [dict(r) for r in db.fetch_all(RECEIPT_CANDIDATES_SQL, (manufacturer_id,))]
+        if products and receipts:
+            contexts.append({
+                'manufacturer_id': manufacturer_id,
+                'products': products,
+                'receipts': receipts,
+                'product_lot': inputs['product_lot']
+            })
+    if not contexts:
+        raise RuntimeError("No manufacturer with active recipes found; load data first")
+    return contexts
+
+
+def parse_mix(text):
+    """'receipt=2,production=3' -> weights; operations not named get weight 0"""
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in text.split(','):
+        name, sep, weight = item.partition('=')
+        name = name.strip()
+        if not sep or name not in DEFAULT_MIX:
+            raise ValueError(f"Expected OPERATION=WEIGHT with OPERATION in {', '.join(DEFAULT_MIX)}, got {item!r}")
+        mix[name] = float(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def print_summary(report):
+    print(f"\n{'Operation':<12} {'ok':>8} {'deadlock':>9} {'lockwait':>9} {'rejected':>9} "
+          f"{'no stock':>9} {'error':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 112)
+    for name, r in report['operations'].items():
+        print(f"{name:<12} {r['ok']:>8} {r['deadlock']:>9} {r['lock_wait_timeout']:>9} "
+              f"{r['rejected']:>9} {r['no_stock']:>9} {r['error']:>7} {r['ops_per_sec']:>9.1f} "
+              f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+    totals = report['totals']
+    print(f"\nThroughput: {totals['ops_per_sec']:.1f} ok ops/s over {report['elapsed_s']:.1f}s "
+          f"with {report['workers']} {report['mode']} workers")
+    print(f"Deadlocks: {totals['deadlock']}   Lock wait timeouts: {totals['lock_wait_timeout']}   "
+          f"Retries: {report['retries']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test of operator sessions")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent sessions (default 8)")
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread',
+                        help="Run sessions as threads or separate processes")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run (default 30)")
+    parser.add_argument('--operations', type=int, default=0,
+                        help="Stop each worker after this many operations (0 = run for --duration)")
+    parser.add_argument('--mix', help="Operation weights, e.g. receipt=2,production=3,report=3,query=2")
+    parser.add_argument('--manufacturers', type=int, default=2,
+                        help="Spread workers across this many of the busiest manufacturers (default 2)")
+    parser.add_argument('--procedure', default='RecordProductionBatchSet',
+                        choices=['RecordProductionBatch', 'RecordProductionBatchSet'],
+                        help="Procedure used for production batches")
+    parser.add_argument('--no-retry', action='store_true',
+                        help="Fail production batches on the first deadlock/lock wait timeout")
+    parser.add_argument('--think-ms', type=float, default=0,
+                        help="Mean pause between a worker's operations (exponential)")
+    parser.add_argument('--lock-wait-timeout', type=int,
+                        help="Session innodb_lock_wait_timeout in seconds for every worker")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', metavar='PATH', help="Write the results as JSON")
+    args = parser.parse_args(argv)
+    
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    db = DatabaseConnection(pool_size=0, verbose=False)
+    try:
+        contexts = discover_contexts(db, args.manufacturers)
+    finally:
+        db.close()
+    
+    plan = {
+        'mix': mix,
+        'contexts': contexts,
+        'procedure': args.procedure,
+        'retry': not args.no_retry,
+        'duration': args.duration if not args.operations else float('inf'),
+        'operations': args.operations,
+        'think_ms': args.think_ms,
+        'lock_wait_timeout': args.lock_wait_timeout,
+        'seed': args.seed,
+        # Keeps generated batch IDs unique across runs
+        'run_tag': format(int(time.time()) & 0xFFFFFF, '06x'),
+        # Workers wait for this moment so connection setup is not measured
+        'start_at': time.time() + 2 + args.workers * 0.05
+    }
+    
+    pool_class = ThreadPoolExecutor if args.mode == 'thread' else ProcessPoolExecutor
+    print(f"Running {args.workers} {args.mode} workers on "
+          f"{', '.join(c['manufacturer_id'] for c in contexts)}...", file=sys.stderr)
+    with pool_class(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, worker_id, plan) for worker_id in range(args.workers)]
+        worker_results = [future.result() for future in futures]
+    elapsed = time.time() - plan['start_at']
+    
+    merged = {name: OperationStats() for name in mix}
+    for stats, _ in worker_results:
+        for name, op in stats.items():
+            merged[name].merge(op)
+    totals = OperationStats()
+    for op in merged.values():
+        totals.merge(op)
+    
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'workers': args.workers,
+        'mode': args.mode,
+        'procedure': args.procedure,
+        'retry': plan['retry'],
+        'mix': mix,
+        'manufacturers': [c['manufacturer_id'] for c in contexts],
+        'elapsed_s': round(elapsed, 2),
+        'operations': {name: op.as_dict(elapsed) for name, op in merged.items()},
+        'totals': totals.as_dict(elapsed),
+        'retries': sum(retries for _, retries in worker_results)
+    }
+    print_summary(report)
+    
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nResults written to {args.save}")
+    
+    return 1 if totals.outcomes['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
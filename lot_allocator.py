@@ -0,0 +1,239 @@
+"""
+Lot Allocator Module
+First-expired-first-out (FEFO) allocation of ingredient lots to production batches
+"""
+
+from decimal import Decimal
+
+
+# Every recipe line of a plan with its candidate lots, soonest expiry first.
+# The LEFT JOIN keeps ingredients with no usable lots so they show up as shortfalls.
+CANDIDATE_LOTS_SQL = """
+    SELECT
+        ri.plan_id,
+        ri.ingredient_id,
+        i.name AS ingredient_name,
+        ri.quantity_required,
+        ib.lot_number,
+        ib.on_hand_oz,
+        ib.expiration_date
+    FROM RECIPE_INGREDIENT ri
+    JOIN INGREDIENT i ON ri.ingredient_id = i.ingredient_id
+    LEFT JOIN INGREDIENT_BATCH ib
+        ON ib.ingredient_id = ri.ingredient_id
+       AND ib.manufacturer_id = %s
+       AND ib.on_hand_oz > 0
+       AND ib.expiration_date > CURRENT_DATE
+    WHERE ri.plan_id {plan_filter}
+    ORDER BY ri.plan_id, ri.ingredient_id, ib.expiration_date, ib.lot_number
+"""
+
+
+class Shortfall:
+    """An ingredient that cannot be fully covered by available lots"""
+    
+    def __init__(self, ingredient_id, ingredient_name, required, available):
+        self.ingredient_id = ingredient_id
+        self.ingredient_name = ingredient_name
+        self.required = required
+        self.available = available
+    
+    @property
+    def short(self):
+        return self.required - self.available
+    
+    def as_dict(self):
+        return {
+            'ingredient_id': self.ingredient_id,
+            'ingredient_name': self.ingredient_name,
+            'required_oz': float(self.required),
+            'available_oz': float(self.available),
+            'short_oz': float(self.short)
+        }
+
+
+class InsufficientStockError(Exception):
+    """Raised when a batch cannot be covered by available lots"""
+    
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls
+        names = ', '.join(s.ingredient_name for s in shortfalls)
+        super().__init__(f"Not enough unexpired stock for: {names}")
+
+
+class AllocationResult:
+    """Outcome of allocating lots for one production batch"""
+    
+    def __init__(self, plan_id, produced_units, ingredient_list, shortfalls):
+        self.plan_id = plan_id
+        self.produced_units = produced_units
+        self.ingredient_list = ingredient_list
+        self.shortfalls = shortfalls
+    
+    @property
+    def ok(self):
+        return not self.shortfalls
+    
+    def procedure_payload(self):
+        """Ingredient list in the shape RecordProductionBatch expects, in lock order"""
+        return in_lock_order(
+            {'lot': line['lot'], 'qty': float(line['qty'])} for line in self.ingredient_list
+        )
+
+
+def in_lock_order(ingredient_list):
+    """
+    Ingredient list sorted by lot number
+    
+    RecordProductionBatch decrements lots (and so takes their row locks) in
+    list order. Sorting every list the same way means two batches sharing
+    lots lock them in the same order and wait for each other instead of
+    deadlocking.
+    """
+    return sorted(ingredient_list, key=lambda line: line['lot'])
+
+
+def group_candidates(rows):
+    """
+    Split candidate-lot rows into recipe requirements and FEFO lot queues
+    
+    Args:
+        rows (list): Rows from CANDIDATE_LOTS_SQL
+    
+    Returns:
+        tuple: ({plan_id: [requirement, ...]}, {ingredient_id: [[lot, on_hand, expiration], ...]})
+    """
+    requirements = {}
+    lots = {}
+    seen_lines = set()
+    seen_lots = set()
+    
+    for row in rows:
+        line_key = (row['plan_id'], row['ingredient_id'])
+        if line_key not in seen_lines:
+            seen_lines.add(line_key)
+            requirements.setdefault(row['plan_id'], []).append({
+                'ingredient_id': row['ingredient_id'],
+                'ingredient_name': row['ingredient_name'],
+                'quantity_required': Decimal(row['quantity_required'])
+            })
+        
+        queue = lots.setdefault(row['ingredient_id'], [])
+        lot_number = row['lot_number']
+        # Two plans sharing an ingredient return the same lots twice
+        if lot_number is not None and lot_number not in seen_lots:
+            seen_lots.add(lot_number)
+            queue.append([lot_number, Decimal(row['on_hand_oz']), row['expiration_date']])
+    
+    return requirements, lots
+
+
+def allocate_fefo(requirements, lots, produced_units, plan_id=None):
+    """
+    Allocate lots first-expired-first-out for one batch
+    
+    Lots may be split across several lots per ingredient. The lot queues are
+    only drawn down when every ingredient can be covered, so a failed
+    allocation leaves them untouched for the next batch.
+    
+    Args:
+        requirements (list): Recipe lines with ingredient_id, ingredient_name, quantity_required
+        lots (dict): ingredient_id -> [[lot_number, remaining_oz, expiration_date], ...] in FEFO order
+        produced_units (int): Units to produce
+        plan_id (int): Recipe plan the requirements belong to
+    
+    Returns:
+        AllocationResult: Ingredient list for the procedure, or the shortfalls
+    """
+    ingredient_list = []
+    shortfalls = []
+    draws = []
+    
+    for req in requirements:
+        needed = req['quantity_required'] * produced_units
+        remaining = needed
+        
+        for entry in lots.get(req['ingredient_id'], []):
+            if remaining <= 0:
+                break
+            take = min(entry[1], remaining)
+            if take <= 0:
+                continue
+            ingredient_list.append({'lot': entry[0], 'qty': take})
+            draws.append((entry, take))
+            remaining -= take
+        
+        if remaining > 0:
+            shortfalls.append(Shortfall(
+                req['ingredient_id'], req['ingredient_name'], needed, needed - remaining
+            ))
+    
+    if shortfalls:
+        return AllocationResult(plan_id, produced_units, [], shortfalls)
+    
+    for entry, take in draws:
+        entry[1] -= take
+    
+    return AllocationResult(plan_id, produced_units, ingredient_list, [])
+
+
+class LotAllocator:
+    """Fetches candidate lots for a manufacturer and allocates them FEFO"""
+    
+    def __init__(self, db_connection, manufacturer_id):
+        self.db = db_connection
+        self.manufacturer_id = manufacturer_id
+        self.db.register_statement(
+            'fefo_candidate_lots', CANDIDATE_LOTS_SQL.format(plan_filter='= %s')
+        )
+    
+    def fetch_candidates(self, plan_ids):
+        """
+        Load recipe lines and candidate lots for one or more plans in one query
+        
+        Args:
+            plan_ids (list): Recipe plan IDs
+        
+        Returns:
+            tuple: (requirements by plan, FEFO lot queues by ingredient)
+        """
+        plan_ids = list(dict.fromkeys(plan_ids))
+        if not plan_ids:
+            return {}, {}
+        
+        if len(plan_ids) == 1:
+            rows = self.db.execute_named(
+                'fefo_candidate_lots', (self.manufacturer_id, plan_ids[0])
+            )
+        else:
+            placeholders = ', '.join(['%s'] * len(plan_ids))
+            rows = self.db.execute_query(
+                CANDIDATE_LOTS_SQL.format(plan_filter=f"IN ({placeholders})"),
+                (self.manufacturer_id, *plan_ids)
+            )
+        
+        return group_candidates(rows)
+    
+    def allocate(self, plan_id, produced_units):
+        """Allocate lots for a single batch"""
+        requirements, lots = self.fetch_candidates([plan_id])
+        return allocate_fefo(requirements.get(plan_id, []), lots, produced_units, plan_id)
+    
+    def allocate_many(self, batches):
+        """
+        Allocate lots for many batches against one snapshot of on-hand stock
+        
+        Batches are served in the order given; each successful allocation
+        reduces what is left for the batches after it.
+        
+        Args:
+            batches (list): (plan_id, produced_units) pairs
+        
+        Returns:
+            list: AllocationResult per batch, in the same order
+        """
+        requirements, lots = self.fetch_candidates([plan_id for plan_id, _ in batches])
+        return [
+            allocate_fefo(requirements.get(plan_id, []), lots, units, plan_id)
+            for plan_id, units in batches
+        ]
\ No newline at end of file
@@ -7,19 +7,77 @@ Team Members:
 - Claire Jeffries (cmjeffri)
 """
 
+import argparse
+import csv
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import os
 import sys
 from database_connection import DatabaseConnection
+from archive import DEFAULT_CHUNK_SIZE, DEFAULT_RETENTION_DAYS, Archiver
+from batch_import import IngredientBatchImporter
+from bom import BillOfMaterials
+from capacity import CapacityService
+from costing import STRATEGIES, CostModel
+from ledger import InventoryLedger
+from lot_allocator import InsufficientStockError
 from manufacturer_menu import ManufacturerMenu
+from query_executor import QueryExecutor
+from row_factory import Row, as_dict
+import summary
 from supplier_menu import SupplierMenu
+from traceability import Traceability
 from viewer_menu import ViewerMenu
 
 
+# Role lookups run on every login, so they are prepared once per connection
+ROLE_LOOKUP_STATEMENTS = {
+    'login_manufacturer': """
+        SELECT u.user_id, u.username, u.role, m.manufacturer_id, m.name
+        FROM USER u
+        JOIN MANUFACTURER m ON u.user_id = m.user_id
+        WHERE u.username = %s AND u.role = 'MANUFACTURER'
+    """,
+    'login_supplier': """
+        SELECT u.user_id, u.username, u.role, s.supplier_id, s.name
+        FROM USER u
+        JOIN SUPPLIER s ON u.user_id = s.user_id
+        WHERE u.username = %s AND u.role = 'SUPPLIER'
+    """,
+    'login_viewer': """
+        SELECT user_id, username, role
+        FROM USER
+        WHERE username = %s AND role = 'VIEWER'
+    """
+}
+
+# Report name -> ManufacturerMenu fetch method (used by the command-line interface)
+REPORTS = {
+    'on-hand': 'fetch_on_hand',
+    'on-hand-lots': 'fetch_on_hand_lots',
+    'nearly-out-of-stock': 'fetch_nearly_out_of_stock',
+    'almost-expired': 'fetch_almost_expired',
+    'batch-cost': 'fetch_batch_cost',
+    'capacity': 'fetch_capacity'
+}
+
+MANUFACTURER_LOOKUP_SQL = """
+    SELECT manufacturer_id, name
+    FROM MANUFACTURER
+    WHERE manufacturer_id = %s
+"""
+
+
 class InventoryManagementSystem:
-    def __init__(self):
-        self.db_connection = DatabaseConnection()
+    def __init__(self, verbose=True):
+        self.db_connection = DatabaseConnection(verbose=verbose)
         self.current_user = None
         self.current_role = None
         
+        for name, sql in ROLE_LOOKUP_STATEMENTS.items():
+            self.db_connection.register_statement(name, sql)
+        
     def display_welcome(self):
         """Display welcome banner"""
         print("\n" + "="*50)
@@ -56,19 +114,10 @@ class InventoryManagementSystem:
         username = input("Username: ").strip()
         # In production, you'd verify password. For this project, simplified authentication
         
-        connection = self.db_connection.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
             # Verify user exists and has MANUFACTURER role
-            cursor.execute("""
-                SELECT u.user_id, u.username, u.role, m.manufacturer_id, m.name
-                FROM USER u
-                JOIN MANUFACTURER m ON u.user_id = m.user_id
-                WHERE u.username = %s AND u.role = 'MANUFACTURER'
-            """, (username,))
-            
-            user = cursor.fetchone()
+            rows = self.db_connection.execute_named('login_manufacturer', (username,))
+            user = rows[0] if rows else None
             
             if user:
                 self.current_user = user
@@ -82,26 +131,15 @@ class InventoryManagementSystem:
         except Exception as e:
             print(f"\nLogin error: {e}")
             return False
-        finally:
-            cursor.close()
     
     def supplier_login(self):
         """Handle supplier login"""
         print("\n=== SUPPLIER LOGIN ===")
         username = input("Username: ").strip()
         
-        connection = self.db_connection.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT u.user_id, u.username, u.role, s.supplier_id, s.name
-                FROM USER u
-                JOIN SUPPLIER s ON u.user_id = s.user_id
-                WHERE u.username = %s AND u.role = 'SUPPLIER'
-            """, (username,))
-            
-            user = cursor.fetchone()
+            rows = self.db_connection.execute_named('login_supplier', (username,))
+            user = rows[0] if rows else None
             
             if user:
                 self.current_user = user
@@ -115,25 +153,15 @@ class InventoryManagementSystem:
         except Exception as e:
             print(f"\nLogin error: {e}")
             return False
-        finally:
-            cursor.close()
     
     def viewer_login(self):
         """Handle viewer login"""
         print("\n=== VIEWER LOGIN ===")
         username = input("Username: ").strip()
         
-        connection = self.db_connection.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT user_id, username, role
-                FROM USER
-                WHERE username = %s AND role = 'VIEWER'
-            """, (username,))
-            
-            user = cursor.fetchone()
+            rows = self.db_connection.execute_named('login_viewer', (username,))
+            user = rows[0] if rows else None
             
             if user:
                 self.current_user = user
@@ -147,8 +175,6 @@ class InventoryManagementSystem:
         except Exception as e:
             print(f"\nLogin error: {e}")
             return False
-        finally:
-            cursor.close()
     
     def run(self):
         """Main application loop"""
@@ -192,10 +218,341 @@ class InventoryManagementSystem:
             print("\nDatabase connection closed. Goodbye!")
 
 
+def build_parser():
+    """Command-line interface; with no subcommand the interactive menus run"""
+    parser = argparse.ArgumentParser(
+        description="Inventory Management System (run without arguments for the interactive menus)"
+    )
+    parser.add_argument('--format', choices=['json', 'csv'], default='json',
+                        help="Output format for results (default: json)")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="Time every SQL statement and write Prometheus metrics to FILE on exit")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    query = subparsers.add_parser('query', help="Run one of the required queries")
+    query.add_argument('number', type=int, choices=range(1, 6), help="Query number (1-5)")
+    query.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                       help="Override a query parameter, e.g. manufacturer_id=MFG001 (repeatable)")
+    query.add_argument('--grouped', action='store_true',
+                       help="Run queries 2-5 for every manufacturer/supplier/lot in one statement")
+    query.add_argument('--keys', nargs='+', metavar='KEY',
+                       help="With --grouped, limit to these manufacturer/supplier IDs or lot numbers")
+    
+    report = subparsers.add_parser('report', help="Run a manufacturer report")
+    report.add_argument('name', choices=sorted(REPORTS), help="Report to run")
+    report.add_argument('--manufacturer', required=True, help="Manufacturer ID (e.g. MFG001)")
+    report.add_argument('--lot', help="Product batch lot number (batch-cost only)")
+    
+    record = subparsers.add_parser('record-batch', help="Record product batches from a JSON file")
+    record.add_argument('file', help="JSON object or list of objects with product_id, batch_id, "
+                                     "produced_units and optional ingredients")
+    record.add_argument('--manufacturer', required=True, help="Manufacturer ID (e.g. MFG001)")
+    
+    ingredients = subparsers.add_parser('ingredient-list', help="Ingredient list for a product batch")
+    ingredients.add_argument('lot', help="Product batch lot number")
+    
+    intake = subparsers.add_parser('import-batches', help="Import ingredient batches from CSV/JSONL")
+    intake.add_argument('file', help="CSV or JSONL file")
+    owner = intake.add_mutually_exclusive_group(required=True)
+    owner.add_argument('--supplier', type=int, help="Supplier ID creating the batches")
+    owner.add_argument('--manufacturer', help="Manufacturer ID receiving the batches")
+    
+    bom = subparsers.add_parser('bom', help="Active recipes flattened to atomic materials")
+    bom.add_argument('--product', type=int, nargs='+', metavar='ID', help="Limit to these products")
+    bom.add_argument('--as-of', type=date.fromisoformat, help="Formulation date (default: today)")
+    
+    capacity = subparsers.add_parser('capacity', help="Max units buildable from on-hand stock")
+    capacity.add_argument('--manufacturer', help="Limit to one manufacturer (default: all)")
+    
+    cost = subparsers.add_parser('cost', help="Projected cost of every recipe version (what-if)")
+    cost.add_argument('--batches', type=int, nargs='+', default=[1], metavar='N',
+                      help="Batch counts to price, in standard batch sizes (default: 1)")
+    cost.add_argument('--strategy', choices=STRATEGIES, nargs='+', default=list(STRATEGIES),
+                      help="Lot allocation strategies to compare (default: all)")
+    cost.add_argument('--product', type=int, nargs='+', metavar='ID', help="Limit to these products")
+    cost.add_argument('--as-of', type=date.fromisoformat, help="Stock and price date (default: today)")
+    
+    ledger = subparsers.add_parser('ledger', help="Point-in-time inventory from the movement ledger")
+    ledger.add_argument('action', choices=['on-hand', 'valuation', 'checkpoint', 'verify', 'rebuild'],
+                        help="on-hand/valuation: lot balances or value as of a date; checkpoint: snapshot "
+                             "a past date; verify: lots whose ledger disagrees with on_hand_oz; "
+                             "rebuild: replay the ledger from receipts and consumption")
+    ledger.add_argument('--as-of', type=date.fromisoformat,
+                        help="Date to report or checkpoint (default: today / yesterday)")
+    ledger.add_argument('--manufacturer', help="Limit on-hand/valuation to one manufacturer")
+    ledger.add_argument('--month-ends', action='store_true',
+                        help="With checkpoint, take every missing month-end checkpoint instead")
+    
+    archive = subparsers.add_parser('archive', help="Move old production history to the archive tables")
+    archive.add_argument('action', choices=['status', 'run', 'verify'],
+                         help="status: watermark and rows per table/partition; run: archive old batches; "
+                              "verify: rows on the wrong side of the watermark or with broken references")
+    archive.add_argument('--through', type=date.fromisoformat,
+                         help="Last production date to archive (default: --retention-days ago)")
+    archive.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS,
+                         help=f"Days of production to keep hot (default: {DEFAULT_RETENTION_DAYS})")
+    archive.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                         help=f"Batches moved per transaction (default: {DEFAULT_CHUNK_SIZE})")
+    
+    summaries = subparsers.add_parser('summaries', help="Check or rebuild the report summary tables")
+    summaries.add_argument('action', choices=['verify', 'rebuild'],
+                           help="verify: list rows that drifted from the base tables; rebuild: recompute them")
+    
+    trace = subparsers.add_parser('trace', help="Lot genealogy for recalls")
+    trace.add_argument('direction', choices=['backward', 'forward', 'supplier'],
+                       help="backward: product lots -> ingredient lots; forward: ingredient lots -> "
+                            "product lots; supplier: a supplier's lots in a date window -> product lots")
+    trace.add_argument('targets', nargs='+',
+                       help="Product lots (backward), ingredient lots (forward) or one supplier ID")
+    trace.add_argument('--from', dest='start', type=date.fromisoformat, help="First received date (supplier)")
+    trace.add_argument('--to', dest='end', type=date.fromisoformat, help="Last received date (supplier)")
+    trace.add_argument('--ingredient', type=int, help="Limit a supplier trace to one ingredient")
+    trace.add_argument('--summary', action='store_true',
+                       help="Print affected lots and manufacturers instead of rows (forward/supplier)")
+    trace.add_argument('--index', action='store_true',
+                       help="Answer from an in-memory adjacency index instead of SQL")
+    
+    return parser
+
+
+def to_jsonable(value):
+    """json.dumps default for DECIMAL and DATE columns"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def csv_value(value):
+    """Flatten one value for a CSV cell (nested lists/dicts become JSON text)"""
+    if isinstance(value, (Decimal, date, datetime)):
+        return to_jsonable(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=to_jsonable)
+    return value
+
+
+def write_output(result, output_format, stream=sys.stdout):
+    """
+    Write a command result to stdout
+    
+    Args:
+        result: List of row dictionaries, a single dictionary, or None
+        output_format (str): 'json' or 'csv'
+        stream: Output stream
+    """
+    # 'row' factory rows are tuples; give them their column names back
+    if isinstance(result, list):
+        result = [as_dict(row) for row in result]
+    elif isinstance(result, Row):
+        result = result.as_dict()
+    
+    if output_format == 'json':
+        json.dump(result, stream, default=to_jsonable, indent=2)
+        stream.write("\n")
+        return
+    
+    rows = result if isinstance(result, list) else ([result] if result else [])
+    if not rows:
+        return
+    
+    writer = csv.DictWriter(stream, fieldnames=list(rows[0].keys()), extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: csv_value(value) for key, value in row.items()})
+
+
+def parse_params(pairs):
+    """NAME=VALUE strings to keyword arguments (all-digit values become ints)"""
+    params = {}
+    for pair in pairs:
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got '{pair}'")
+        params[name.strip()] = int(value) if value.strip().isdigit() else value.strip()
+    return params
+
+
+def load_manufacturer(db_connection, manufacturer_id):
+    """Look up a manufacturer the way manufacturer_login does"""
+    user = db_connection.fetch_one(MANUFACTURER_LOOKUP_SQL, (manufacturer_id,))
+    if not user:
+        raise ValueError(f"Unknown manufacturer: {manufacturer_id}")
+    return user
+
+
+def record_batches(menu, path):
+    """Record every batch in a JSON file, continuing past failures"""
+    with open(path, encoding='utf-8') as handle:
+        requests = json.load(handle)
+    if isinstance(requests, dict):
+        requests = [requests]
+    
+    results = []
+    for request in requests:
+        outcome = {'product_id': request.get('product_id'), 'batch_id': request.get('batch_id')}
+        try:
+            data = menu.record_product_batch(
+                int(request['product_id']),
+                str(request['batch_id']),
+                int(request['produced_units']),
+                request.get('ingredients')
+            )
+            outcome.update(status='ok', **(data or {}))
+        except InsufficientStockError as e:
+            outcome.update(status='error', error=str(e),
+                           shortfalls=[short.as_dict() for short in e.shortfalls])
+        except Exception as e:
+            outcome.update(status='error', error=str(e))
+        results.append(outcome)
+    return results
+
+
+def run_trace(trace, args):
+    """Rows (or a recall summary) for the trace subcommand"""
+    if args.index:
+        trace.build_index()
+    
+    if args.direction == 'backward':
+        return trace.backward(args.targets)
+    
+    if args.direction == 'forward':
+        rows = trace.forward(args.targets)
+    else:
+        if len(args.targets) != 1 or not args.targets[0].isdigit():
+            raise ValueError("supplier trace takes one supplier ID")
+        rows = trace.supplier_window(int(args.targets[0]), args.start, args.end, args.ingredient)
+    return trace.recall(rows).as_dict() if args.summary else rows
+
+
+def run_ledger(ledger, args):
+    """Rows for the ledger subcommand"""
+    if args.action == 'on-hand':
+        return ledger.on_hand_as_of(args.as_of or date.today(), args.manufacturer)
+    if args.action == 'valuation':
+        return ledger.valuation(args.as_of or date.today(), args.manufacturer)
+    if args.action == 'checkpoint':
+        if args.month_ends:
+            return ledger.checkpoint_month_ends()
+        return ledger.checkpoint(args.as_of)
+    if args.action == 'verify':
+        return ledger.verify()
+    return {'movements': ledger.rebuild()}
+
+
+def run_archive(archiver, args):
+    """Rows for the archive subcommand"""
+    if args.action == 'run':
+        result = archiver.archive(args.through, args.retention_days)
+        result['partitions_added'] = ', '.join(result['partitions_added'])
+        return result
+    if args.action == 'verify':
+        return archiver.verify()
+    status = archiver.status()
+    watermark = {key: status[key] for key in ('archived_through', 'received_through')}
+    return [{**watermark, **row} for row in status['tables']]
+
+
+def run_command(args):
+    """
+    Run one subcommand without prompts
+    
+    Returns:
+        int: Process exit status
+    """
+    app = InventoryManagementSystem(verbose=False)
+    db = app.db_connection
+    
+    try:
+        if args.command == 'query':
+            executor = QueryExecutor(db)
+            if args.grouped:
+                groups = executor.run_grouped(args.number, args.keys)
+                result = [row for rows in groups.values() for row in rows]
+            else:
+                result = executor.run_query(args.number, **parse_params(args.param))
+        
+        elif args.command == 'report':
+            menu = ManufacturerMenu(db, load_manufacturer(db, args.manufacturer))
+            fetch = getattr(menu, REPORTS[args.name])
+            if args.name == 'batch-cost':
+                if not args.lot:
+                    raise ValueError("batch-cost requires --lot")
+                result = fetch(args.lot)
+            else:
+                result = fetch()
+        
+        elif args.command == 'record-batch':
+            menu = ManufacturerMenu(db, load_manufacturer(db, args.manufacturer))
+            result = record_batches(menu, args.file)
+        
+        elif args.command == 'ingredient-list':
+            result = ViewerMenu(db).fetch_ingredient_list(args.lot)
+        
+        elif args.command == 'bom':
+            result = BillOfMaterials.load(db).flattened_product_bom(args.as_of, args.product)
+        
+        elif args.command == 'capacity':
+            result = CapacityService(db).fetch(args.manufacturer)
+        
+        elif args.command == 'cost':
+            projection = CostModel.load(db, args.as_of).project(args.batches, args.strategy)
+            result = projection.rows(args.product)
+        
+        elif args.command == 'ledger':
+            result = run_ledger(InventoryLedger(db), args)
+        
+        elif args.command == 'archive':
+            result = run_archive(Archiver(db, args.chunk_size), args)
+        
+        elif args.command == 'summaries':
+            if args.action == 'rebuild':
+                result = [{'table': table, 'rows': rows} for table, rows in summary.rebuild(db).items()]
+            else:
+                result = summary.verify(db)
+        
+        elif args.command == 'trace':
+            result = run_trace(Traceability(db), args)
+        
+        elif args.command == 'import-batches':
+            manufacturer_id = None
+            if args.manufacturer:
+                manufacturer_id = load_manufacturer(db, args.manufacturer)['manufacturer_id']
+            importer = IngredientBatchImporter(
+                db, supplier_id=args.supplier, manufacturer_id=manufacturer_id
+            )
+            result = importer.import_file(args.file).as_dict()
+        
+        write_output(result, args.format)
+        
+        if args.command == 'record-batch' and any(r['status'] == 'error' for r in result):
+            return 1
+        if args.command in ('archive', 'summaries', 'ledger') and args.action == 'verify' and result:
+            return 1
+        return 0
+    
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+
 def main():
     """Application entry point"""
-    app = InventoryManagementSystem()
-    app.run()
+    args = build_parser().parse_args()
+    
+    if args.metrics:
+        os.environ['DB_INSTRUMENT'] = '1'
+        os.environ['DB_METRICS_FILE'] = args.metrics
+    
+    if args.command is None:
+        app = InventoryManagementSystem()
+        app.run()
+        return
+    
+    sys.exit(run_command(args))
 
 
 if __name__ == "__main__":
@@ -6,6 +6,93 @@ Handles all manufacturer-specific operations
 from datetime import datetime, timedelta
 import json
 
+from archive import archive_sql, load_watermark
+from batch_import import IngredientBatchImporter, compute_lot_number
+from capacity import CapacityService
+from lot_allocator import InsufficientStockError, LotAllocator, allocate_fefo, in_lock_order
+from report_output import peek, write_chunks
+
+
+# Set-based variant of RecordProductionBatch (same parameters and result set)
+RECORD_BATCH_PROCEDURE = 'RecordProductionBatchSet'
+
+# Active recipe plan for one of a manufacturer's products
+ACTIVE_PLAN_SQL = """
+    SELECT p.product_id, p.standard_batch_size, rp.plan_id
+    FROM PRODUCT p
+    JOIN RECIPE_PLAN rp ON p.product_id = rp.product_id
+    WHERE p.product_id = %s AND p.manufacturer_id = %s AND rp.is_active = TRUE
+"""
+
+# Report queries (shared by the menus and the command-line interface).
+# On-hand totals and nearly-out-of-stock read the trigger-maintained summary
+# tables, so they cost O(items) rather than O(batch history).
+ON_HAND_SQL = """
+    SELECT
+        s.ingredient_id,
+        i.name AS ingredient_name,
+        s.on_hand_oz,
+        s.open_lots
+    FROM INGREDIENT_STOCK_SUMMARY s
+    JOIN INGREDIENT i ON s.ingredient_id = i.ingredient_id
+    WHERE s.manufacturer_id = %s AND s.on_hand_oz > 0
+    ORDER BY i.name
+"""
+
+ON_HAND_LOTS_SQL = """
+    SELECT 
+        ib.lot_number,
+        i.name AS ingredient_name,
+        ib.on_hand_oz,
+        ib.expiration_date
+    FROM INGREDIENT_BATCH ib
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    WHERE ib.manufacturer_id = %s AND ib.on_hand_oz > 0
+    ORDER BY i.name, ib.expiration_date
+"""
+
+NEARLY_OUT_OF_STOCK_SQL = """
+    SELECT 
+        p.product_id,
+        p.name,
+        p.standard_batch_size,
+        COALESCE(s.units_produced, 0) AS total_on_hand
+    FROM PRODUCT p
+    LEFT JOIN FINISHED_GOODS_SUMMARY s
+        ON s.manufacturer_id = p.manufacturer_id AND s.product_id = p.product_id
+    WHERE p.manufacturer_id = %s
+      AND COALESCE(s.units_produced, 0) < p.standard_batch_size
+    ORDER BY p.name
+"""
+
+ALMOST_EXPIRED_SQL = """
+    SELECT 
+        ib.lot_number,
+        i.name AS ingredient_name,
+        ib.on_hand_oz,
+        ib.expiration_date,
+        DATEDIFF(ib.expiration_date, CURRENT_DATE) AS days_until_expiry
+    FROM INGREDIENT_BATCH ib
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    WHERE ib.manufacturer_id = %s
+      AND ib.expiration_date <= DATE_ADD(CURRENT_DATE, INTERVAL 10 DAY)
+      AND ib.on_hand_oz > 0
+    ORDER BY ib.expiration_date
+"""
+
+BATCH_COST_SQL = """
+    SELECT 
+        pb.lot_number,
+        p.name AS product_name,
+        pb.quantity_produced,
+        pb.total_cost,
+        pb.per_unit_cost,
+        pb.production_date
+    FROM PRODUCT_BATCH pb
+    JOIN PRODUCT p ON pb.product_id = p.product_id
+    WHERE pb.lot_number = %s AND pb.manufacturer_id = %s
+"""
+
 
 class ManufacturerMenu:
     def __init__(self, db_connection, user):
@@ -25,9 +112,10 @@ class ManufacturerMenu:
             print("4. Create Product Batch")
             print("5. Reports")
             print("6. Execute Queries")
-            print("7. Logout")
+            print("7. Import Ingredient Batches (CSV/JSONL)")
+            print("8. Logout")
             
-            choice = input("\nEnter choice (1-7): ").strip()
+            choice = input("\nEnter choice (1-8): ").strip()
             
             if choice == '1':
                 self.create_product()
@@ -42,6 +130,8 @@ class ManufacturerMenu:
             elif choice == '6':
                 self.execute_queries()
             elif choice == '7':
+                self.import_ingredient_batches()
+            elif choice == '8':
                 print("\nLogging out...")
                 break
             else:
@@ -75,6 +165,7 @@ class ManufacturerMenu:
             """, (name, category_id, self.manufacturer_id, standard_batch_size))
             
             connection.commit()
+            self.db.invalidate(['PRODUCT'])
             product_id = cursor.lastrowid
             
             print(f"\n✓ Product created successfully! Product ID: {product_id}")
@@ -181,6 +272,7 @@ class ManufacturerMenu:
                 """, (plan_id,))
             
             connection.commit()
+            self.db.invalidate(['RECIPE_PLAN', 'RECIPE_INGREDIENT'])
             print(f"\n✓ Recipe plan created successfully!")
             
         except Exception as e:
@@ -225,16 +317,10 @@ class ManufacturerMenu:
                   quantity, cost_per_unit, expiration_date))
             
             connection.commit()
+            self.db.invalidate(['INGREDIENT_BATCH'])
             
-            # Get the generated lot number
-            cursor.execute("""
-                SELECT lot_number 
-                FROM INGREDIENT_BATCH 
-                WHERE ingredient_id = %s AND supplier_id = %s AND batch_id = %s
-            """, (ingredient_id, supplier_id, batch_id))
-            
-            result = cursor.fetchone()
-            lot_number = result['lot_number'] if result else 'Unknown'
+            # Same format the lot-number trigger generates
+            lot_number = compute_lot_number(ingredient_id, supplier_id, batch_id)
             
             print(f"\n✓ Ingredient batch received successfully!")
             print(f"   Lot Number: {lot_number}")
@@ -245,6 +331,26 @@ class ManufacturerMenu:
         finally:
             cursor.close()
     
+    def import_ingredient_batches(self):
+        """Receive many ingredient batches from a CSV or JSONL file (90-day rule enforced)"""
+        print("\n=== IMPORT INGREDIENT BATCHES ===")
+        print("Columns: ingredient_id, supplier_id, batch_id, quantity, cost_per_unit, expiration_date")
+        
+        path = input("File path: ").strip()
+        
+        try:
+            importer = IngredientBatchImporter(self.db, manufacturer_id=self.manufacturer_id)
+            report = importer.import_file(path)
+        except Exception as e:
+            print(f"\n✗ Error importing ingredient batches: {e}")
+            return
+        
+        print(f"\n✓ Imported {report.inserted} ingredient batches")
+        if report.errors:
+            print(f"✗ {len(report.errors)} rows rejected:")
+            for err in report.errors:
+                print(f"   line {err['line']}: {err['error']}")
+    
     def create_product_batch(self):
         """Create a product batch using stored procedure"""
         print("\n=== CREATE PRODUCT BATCH ===")
@@ -267,9 +373,18 @@ class ManufacturerMenu:
                 print("\nNo products with active recipes found.")
                 return
             
+            # What current stock can build, from one aggregated query
+            capacity = {row['product_id']: row for row in self.fetch_capacity()}
+            
             print("\nProducts with Active Recipes:")
             for p in products:
-                print(f"{p['product_id']}. {p['name']} (Batch Size: {p['standard_batch_size']})")
+                line = f"{p['product_id']}. {p['name']} (Batch Size: {p['standard_batch_size']})"
+                cap = capacity.get(p['product_id'])
+                if cap:
+                    line += f" - can build {cap['max_units']} units"
+                    if cap['limiting_ingredient_name']:
+                        line += f" (limited by {cap['limiting_ingredient_name']})"
+                print(line)
             
             product_id = int(input("\nSelect Product ID: ").strip())
             
@@ -288,81 +403,190 @@ class ManufacturerMenu:
                 print(f"\n✗ Units must be a multiple of {product['standard_batch_size']}")
                 return
             
-            # Show required ingredients
-            cursor.execute("""
-                SELECT ri.ingredient_id, i.name, ri.quantity_required
-                FROM RECIPE_INGREDIENT ri
-                JOIN INGREDIENT i ON ri.ingredient_id = i.ingredient_id
-                WHERE ri.plan_id = %s
-            """, (plan_id,))
-            
-            recipe_ingredients = cursor.fetchall()
+            # Recipe lines and candidate lots for every ingredient in one query
+            allocator = LotAllocator(self.db, self.manufacturer_id)
+            requirements, lots = allocator.fetch_candidates([plan_id])
+            recipe_ingredients = requirements.get(plan_id, [])
             
             print("\n--- Required Ingredients ---")
-            ingredient_list = []
-            
             for ing in recipe_ingredients:
                 total_needed = ing['quantity_required'] * produced_units
-                print(f"\n{ing['name']}: {total_needed} oz needed")
+                print(f"\n{ing['ingredient_name']}: {total_needed} oz needed")
                 
-                # Show available batches for this ingredient
-                cursor.execute("""
-                    SELECT ib.lot_number, ib.on_hand_oz, ib.expiration_date
-                    FROM INGREDIENT_BATCH ib
-                    WHERE ib.ingredient_id = %s 
-                      AND ib.manufacturer_id = %s
-                      AND ib.on_hand_oz > 0
-                      AND ib.expiration_date > CURRENT_DATE
-                    ORDER BY ib.expiration_date
-                """, (ing['ingredient_id'], self.manufacturer_id))
+                batches = lots.get(ing['ingredient_id'], [])
+                if not batches:
+                    print(f"  ✗ No available batches for {ing['ingredient_name']}")
+                    continue
                 
-                batches = cursor.fetchall()
+                print("  Available batches:")
+                for lot_number, on_hand, expiration in batches:
+                    print(f"    {lot_number}: {on_hand} oz (exp: {expiration})")
+            
+            auto = input("\nAllocate lots automatically (first-expired-first-out)? (y/n): ").strip().lower()
+            
+            if auto == 'y':
+                allocation = allocate_fefo(recipe_ingredients, lots, produced_units, plan_id)
                 
-                if not batches:
-                    print(f"  ✗ No available batches for {ing['name']}")
+                if not allocation.ok:
+                    print("\n✗ Not enough unexpired stock for this batch:")
+                    for short in allocation.shortfalls:
+                        print(f"   {short.ingredient_name}: need {short.required} oz, "
+                              f"have {short.available} oz (short {short.short} oz)")
                     return
                 
-                print("  Available batches:")
-                for b in batches:
-                    print(f"    {b['lot_number']}: {b['on_hand_oz']} oz (exp: {b['expiration_date']})")
+                print("\n--- Allocated Lots ---")
+                for line in allocation.ingredient_list:
+                    print(f"   {line['lot']}: {line['qty']} oz")
                 
-                lot = input(f"  Select lot number: ").strip()
-                qty = float(input(f"  Quantity to use: ").strip())
+                ingredient_list = allocation.procedure_payload()
+            else:
+                ingredient_list = []
                 
-                ingredient_list.append({
-                    'lot': lot,
-                    'qty': qty
-                })
-            
-            # Call stored procedure
-            ingredient_json = json.dumps(ingredient_list)
+                for ing in recipe_ingredients:
+                    if not lots.get(ing['ingredient_id']):
+                        print(f"\n✗ No available batches for {ing['ingredient_name']}")
+                        return
+                    
+                    print(f"\n{ing['ingredient_name']}:")
+                    lot = input(f"  Select lot number: ").strip()
+                    qty = float(input(f"  Quantity to use: ").strip())
+                    
+                    ingredient_list.append({
+                        'lot': lot,
+                        'qty': qty
+                    })
+            
+            # Call stored procedure (retried on deadlock / lock wait timeout).
+            # Every attempt sends exactly the lots shown above; if another
+            # batch has drained one meanwhile, nothing is recorded.
+            try:
+                data = self._call_record_batch(
+                    product_id, plan_id, batch_id, produced_units, lambda: ingredient_list
+                )
+            except Exception as e:
+                if auto == 'y' and 'Insufficient quantity' in str(e):
+                    print("\n✗ A lot in the allocation above no longer has enough stock "
+                          "(another batch used it); nothing was recorded.")
+                    print("   Create the batch again to allocate from current stock.")
+                    return
+                raise
+            if data:
+                print(f"\n✓ Product batch created successfully!")
+                print(f"   Lot Number: {data['product_lot']}")
+                print(f"   Units Produced: {data['produced_units']}")
+                print(f"   Total Cost: ${data['batch_total_cost']:.2f}")
+                print(f"   Per Unit Cost: ${data['unit_cost']:.4f}")
             
-            cursor.callproc('RecordProductionBatch', [
+        except Exception as e:
+            connection.rollback()
+            print(f"\n✗ Error creating product batch: {e}")
+        finally:
+            cursor.close()
+    
+    def record_product_batch(self, product_id, batch_id, produced_units, ingredient_list=None):
+        """
+        Record a product batch without prompting
+        
+        Args:
+            product_id (int): Product with an active recipe plan
+            batch_id (str): Batch ID used to build the lot number
+            produced_units (int): Units to produce (multiple of the standard batch size)
+            ingredient_list (list): [{'lot': ..., 'qty': ...}]; allocated FEFO when omitted
+        
+        Returns:
+            dict: Procedure result (product_lot, batch_total_cost, unit_cost, ...)
+        """
+        product = self.db.fetch_one(ACTIVE_PLAN_SQL, (product_id, self.manufacturer_id))
+        if not product:
+            raise ValueError(f"Product {product_id} has no active recipe plan for {self.manufacturer_id}")
+        
+        if produced_units <= 0 or produced_units % product['standard_batch_size'] != 0:
+            raise ValueError(f"Units must be a multiple of {product['standard_batch_size']}")
+        
+        if ingredient_list:
+            def lines():
+                return ingredient_list
+        else:
+            # Allocate on every attempt: after a lost lock conflict the
+            # winning batch may have drained lots the last allocation used
+            allocator = LotAllocator(self.db, self.manufacturer_id)
+            
+            def lines():
+                allocation = allocator.allocate(product['plan_id'], produced_units)
+                if not allocation.ok:
+                    raise InsufficientStockError(allocation.shortfalls)
+                return allocation.procedure_payload()
+        
+        return self._call_record_batch(
+            product_id, product['plan_id'], batch_id, produced_units, lines
+        )
+    
+    def _call_record_batch(self, product_id, plan_id, batch_id, produced_units, lines):
+        """
+        Run the batch-recording procedure under the connection's retry policy
+        
+        Args:
+            lines (callable): Returns the ingredient list for each attempt
+        
+        Returns:
+            dict: Procedure result row, or None
+        """
+        def attempt():
+            results = self.db.call_procedure(RECORD_BATCH_PROCEDURE, [
                 product_id,
                 plan_id,
                 self.manufacturer_id,
                 batch_id,
                 produced_units,
-                ingredient_json
+                json.dumps(in_lock_order(lines()))
             ])
-            
-            # Fetch results
-            for result in cursor.stored_results():
-                data = result.fetchone()
-                if data:
-                    print(f"\n✓ Product batch created successfully!")
-                    print(f"   Lot Number: {data['product_lot']}")
-                    print(f"   Units Produced: {data['produced_units']}")
-                    print(f"   Total Cost: ${data['batch_total_cost']:.2f}")
-                    print(f"   Per Unit Cost: ${data['unit_cost']:.4f}")
-            
-            connection.commit()
-            
-        except Exception as e:
-            connection.rollback()
-            print(f"\n✗ Error creating product batch: {e}")
-        finally:
-            cursor.close()
+            return results[0] if results else None
+        
+        return self.db.retry_policy.run(attempt)
+    
+    def fetch_on_hand(self):
+        """Rows for the on-hand report"""
+        return self.db.fetch_all(ON_HAND_SQL, (self.manufacturer_id,))
+    
+    def fetch_on_hand_lots(self):
+        """Rows for the on-hand by lot report"""
+        return self.db.fetch_all(ON_HAND_LOTS_SQL, (self.manufacturer_id,))
+    
+    def fetch_nearly_out_of_stock(self):
+        """Rows for the nearly-out-of-stock report"""
+        return self.db.fetch_all(NEARLY_OUT_OF_STOCK_SQL, (self.manufacturer_id,))
+    
+    def fetch_almost_expired(self):
+        """Rows for the almost-expired report"""
+        return self.db.fetch_all(ALMOST_EXPIRED_SQL, (self.manufacturer_id,))
+    
+    def stream_on_hand(self):
+        """On-hand report rows in chunks from an unbuffered cursor"""
+        return self.db.stream(ON_HAND_SQL, (self.manufacturer_id,))
+    
+    def stream_on_hand_lots(self):
+        """On-hand by lot report rows in chunks"""
+        return self.db.stream(ON_HAND_LOTS_SQL, (self.manufacturer_id,))
+    
+    def stream_nearly_out_of_stock(self):
+        """Nearly-out-of-stock report rows in chunks"""
+        return self.db.stream(NEARLY_OUT_OF_STOCK_SQL, (self.manufacturer_id,))
+    
+    def stream_almost_expired(self):
+        """Almost-expired report rows in chunks"""
+        return self.db.stream(ALMOST_EXPIRED_SQL, (self.manufacturer_id,))
+    
+    def fetch_capacity(self):
+        """Maximum producible units for each product with an active recipe"""
+        return CapacityService(self.db).fetch(self.manufacturer_id)
+    
+    def fetch_batch_cost(self, lot_number):
+        """Cost summary row for one of this manufacturer's product batches (hot or archived)"""
+        params = (lot_number, self.manufacturer_id)
+        row = self.db.fetch_one(BATCH_COST_SQL, params)
+        if row is None and not load_watermark(self.db).empty:
+            row = self.db.fetch_one(archive_sql(BATCH_COST_SQL), params)
+        return row
     
     def reports_menu(self):
         """Display reports submenu"""
@@ -374,9 +598,10 @@ class ManufacturerMenu:
             print("2. Nearly-out-of-stock")
             print("3. Almost-expired ingredient lots")
             print("4. Batch Cost Summary")
-            print("5. Back")
+            print("5. Production Capacity")
+            print("6. Back")
             
-            choice = input("\nEnter choice (1-5): ").strip()
+            choice = input("\nEnter choice (1-6): ").strip()
             
             if choice == '1':
                 self.report_on_hand()
@@ -387,128 +612,87 @@ class ManufacturerMenu:
             elif choice == '4':
                 self.report_batch_cost()
             elif choice == '5':
+                self.report_capacity()
+            elif choice == '6':
                 break
             else:
                 print("\nInvalid choice.")
     
     def report_on_hand(self):
-        """Report: On-hand by item/lot"""
+        """Report: On-hand by item/lot (item totals from the summary table, then each lot)"""
         print("\n=== ON-HAND INVENTORY ===")
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    ib.lot_number,
-                    i.name AS ingredient_name,
-                    ib.on_hand_oz,
-                    ib.expiration_date
-                FROM INGREDIENT_BATCH ib
-                JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                WHERE ib.manufacturer_id = %s AND ib.on_hand_oz > 0
-                ORDER BY i.name, ib.expiration_date
-            """, (self.manufacturer_id,))
-            
-            results = cursor.fetchall()
+            results = self.fetch_on_hand()
             
             if not results:
                 print("\nNo inventory on hand.")
                 return
             
+            print(f"\n{'Ingredient ID':<15} {'Ingredient':<30} {'On Hand (oz)':<15} {'Open Lots'}")
+            print("-" * 75)
+            for row in results:
+                print(f"{row['ingredient_id']:<15} {row['ingredient_name']:<30} "
+                      f"{row['on_hand_oz']:<15.2f} {row['open_lots']}")
+            
+            first, chunks = peek(self.stream_on_hand_lots())
+            if first is None:
+                return
+            
             print(f"\n{'Lot Number':<20} {'Ingredient':<30} {'On Hand (oz)':<15} {'Expiration'}")
             print("-" * 90)
             
-            for row in results:
-                print(f"{row['lot_number']:<20} {row['ingredient_name']:<30} "
-                      f"{row['on_hand_oz']:<15.2f} {row['expiration_date']}")
+            write_chunks(chunks, lambda row: (
+                f"{row['lot_number']:<20} {row['ingredient_name']:<30} "
+                f"{row['on_hand_oz']:<15.2f} {row['expiration_date']}"
+            ))
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
     def report_nearly_out_of_stock(self):
         """Report: Nearly-out-of-stock products"""
         print("\n=== NEARLY OUT OF STOCK ===")
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    p.product_id,
-                    p.name,
-                    p.standard_batch_size,
-                    COALESCE(SUM(pb.quantity_produced), 0) AS total_on_hand
-                FROM PRODUCT p
-                LEFT JOIN PRODUCT_BATCH pb ON p.product_id = pb.product_id
-                WHERE p.manufacturer_id = %s
-                GROUP BY p.product_id, p.name, p.standard_batch_size
-                HAVING total_on_hand < p.standard_batch_size
-                ORDER BY p.name
-            """, (self.manufacturer_id,))
+            first, chunks = peek(self.stream_nearly_out_of_stock())
             
-            results = cursor.fetchall()
-            
-            if not results:
+            if first is None:
                 print("\nAll products adequately stocked!")
                 return
             
             print(f"\n{'Product ID':<12} {'Product Name':<30} {'Standard Size':<15} {'On Hand'}")
             print("-" * 80)
             
-            for row in results:
-                print(f"{row['product_id']:<12} {row['name']:<30} "
-                      f"{row['standard_batch_size']:<15} {row['total_on_hand']}")
+            write_chunks(chunks, lambda row: (
+                f"{row['product_id']:<12} {row['name']:<30} "
+                f"{row['standard_batch_size']:<15} {row['total_on_hand']}"
+            ))
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
     def report_almost_expired(self):
         """Report: Almost-expired ingredient lots (within 10 days)"""
         print("\n=== ALMOST-EXPIRED INGREDIENTS ===")
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    ib.lot_number,
-                    i.name AS ingredient_name,
-                    ib.on_hand_oz,
-                    ib.expiration_date,
-                    DATEDIFF(ib.expiration_date, CURRENT_DATE) AS days_until_expiry
-                FROM INGREDIENT_BATCH ib
-                JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                WHERE ib.manufacturer_id = %s
-                  AND ib.expiration_date <= DATE_ADD(CURRENT_DATE, INTERVAL 10 DAY)
-                  AND ib.on_hand_oz > 0
-                ORDER BY ib.expiration_date
-            """, (self.manufacturer_id,))
+            first, chunks = peek(self.stream_almost_expired())
             
-            results = cursor.fetchall()
-            
-            if not results:
+            if first is None:
                 print("\nNo ingredients expiring within 10 days.")
                 return
             
             print(f"\n{'Lot Number':<20} {'Ingredient':<30} {'On Hand':<12} {'Exp Date':<12} {'Days Left'}")
             print("-" * 95)
             
-            for row in results:
-                print(f"{row['lot_number']:<20} {row['ingredient_name']:<30} "
-                      f"{row['on_hand_oz']:<12.2f} {row['expiration_date']!s:<12} {row['days_until_expiry']}")
+            write_chunks(chunks, lambda row: (
+                f"{row['lot_number']:<20} {row['ingredient_name']:<30} "
+                f"{row['on_hand_oz']:<12.2f} {row['expiration_date']!s:<12} {row['days_until_expiry']}"
+            ))
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
     def report_batch_cost(self):
         """Report: Batch cost summary for a specific product batch"""
@@ -516,24 +700,8 @@ class ManufacturerMenu:
         
         lot_number = input("Enter product batch lot number: ").strip()
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    pb.lot_number,
-                    p.name AS product_name,
-                    pb.quantity_produced,
-                    pb.total_cost,
-                    pb.per_unit_cost,
-                    pb.production_date
-                FROM PRODUCT_BATCH pb
-                JOIN PRODUCT p ON pb.product_id = p.product_id
-                WHERE pb.lot_number = %s AND pb.manufacturer_id = %s
-            """, (lot_number, self.manufacturer_id))
-            
-            result = cursor.fetchone()
+            result = self.fetch_batch_cost(lot_number)
             
             if not result:
                 print("\nBatch not found.")
@@ -548,8 +716,29 @@ class ManufacturerMenu:
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
+    
+    def report_capacity(self):
+        """Report: Maximum units buildable from unexpired on-hand stock"""
+        print("\n=== PRODUCTION CAPACITY ===")
+        
+        try:
+            results = self.fetch_capacity()
+            
+            if not results:
+                print("\nNo products with active recipes found.")
+                return
+            
+            print(f"\n{'Product ID':<12} {'Product Name':<30} {'Max Units':<11} {'Batches':<9} {'Limiting Ingredient'}")
+            print("-" * 95)
+            
+            for row in results:
+                print(f"{row['product_id']:<12} {row['product_name']:<30} "
+                      f"{row['max_units']:<11} {row['max_batches']:<9} "
+                      f"{row['limiting_ingredient_name']} ({row['limiting_on_hand_oz']} oz on hand, "
+                      f"{row['limiting_oz_per_unit']} oz/unit)")
+            
+        except Exception as e:
+            print(f"\n✗ Error: {e}")
     
     def execute_queries(self):
         """Execute required retrieval queries"""
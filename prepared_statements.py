@@ -0,0 +1,164 @@
+"""
+Prepared Statement Module
+Registry of named, server-side prepared statements for hot queries
+"""
+
+from collections import OrderedDict
+import threading
+import weakref
+
+from mysql.connector import Error
+from row_factory import row_class
+
+
+class NamedStatement:
+    """A registered statement and its usage counters"""
+    
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.hits = 0
+        self.prepares = 0
+        self.evictions = 0
+    
+    def as_dict(self):
+        """Counters as a plain dictionary (for reports/CLI output)"""
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'prepares': self.prepares,
+            'evictions': self.evictions
+        }
+
+
+class PreparedStatementRegistry:
+    """
+    Named statements prepared once per connection and run by name
+    
+    Each connection keeps its own LRU of prepared cursors (a server-side
+    statement handle lives on exactly one connection). When a connection
+    holds more than `capacity` statements the least recently used one is
+    closed, which deallocates it on the server.
+    """
+    
+    def __init__(self, capacity=32):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._statements = {}
+        self._cursors = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def register(self, name, sql):
+        """
+        Register (or re-register) a statement under a name
+        
+        Args:
+            name (str): Name used to run the statement
+            sql (str): SQL text with %s placeholders
+        """
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None and existing.sql == sql:
+                return
+            self._statements[name] = NamedStatement(name, sql)
+            # Drop handles prepared for the old SQL text
+            for cache in self._cursors.values():
+                cursor = cache.pop(name, None)
+                if cursor is not None:
+                    self._close_quietly(cursor)
+    
+    def is_registered(self, name):
+        """Whether a statement has been registered under this name"""
+        return name in self._statements
+    
+    def sql(self, name):
+        """SQL text registered under a name"""
+        return self._statements[name].sql
+    
+    def _close_quietly(self, cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+    
+    def _cursor_for(self, connection, statement):
+        """Return the prepared cursor for a statement on a connection"""
+        with self._lock:
+            cache = self._cursors.get(connection)
+            if cache is None:
+                cache = OrderedDict()
+                self._cursors[connection] = cache
+            
+            cursor = cache.get(statement.name)
+            if cursor is not None:
+                cache.move_to_end(statement.name)
+                statement.hits += 1
+                return cursor
+            
+            cursor = connection.cursor(prepared=True)
+            cache[statement.name] = cursor
+            statement.prepares += 1
+            
+            while len(cache) > self.capacity:
+                evicted_name, evicted = cache.popitem(last=False)
+                self._close_quietly(evicted)
+                if evicted_name in self._statements:
+                    self._statements[evicted_name].evictions += 1
+            
+            return cursor
+    
+    def _forget(self, connection, name):
+        """Drop a cursor whose server-side handle may no longer be valid"""
+        with self._lock:
+            cache = self._cursors.get(connection)
+            if cache is not None:
+                cursor = cache.pop(name, None)
+                if cursor is not None:
+                    self._close_quietly(cursor)
+    
+    def execute(self, connection, name, params=None, fetch=True, row_factory='dict'):
+        """
+        Run a registered statement on a connection
+        
+        Args:
+            connection: Open mysql.connector connection
+            name (str): Registered statement name
+            params (tuple): Statement parameters
+            fetch (bool): Whether to fetch results
+            row_factory (str): 'dict', 'row' or 'tuple'
+        
+        Returns:
+            list: Rows if fetch=True, affected row count otherwise
+        """
+        statement = self._statements.get(name)
+        if statement is None:
+            raise KeyError(f"No prepared statement registered as '{name}'")
+        
+        cursor = self._cursor_for(connection, statement)
+        try:
+            # The prepared cursor only re-prepares when the SQL text changes,
+            # so repeat calls send just the statement id and parameters
+            cursor.execute(statement.sql, tuple(params or ()))
+            
+            if not fetch:
+                return cursor.rowcount
+            
+            columns = tuple(cursor.column_names)
+            rows = cursor.fetchall()
+            if row_factory == 'tuple':
+                return rows
+            if row_factory == 'row':
+                make = row_class(columns)
+                return [tuple.__new__(make, row) for row in rows]
+            return [dict(zip(columns, row)) for row in rows]
+        
+        except Error:
+            self._forget(connection, name)
+            raise
+    
+    def stats(self):
+        """Per-statement counters, most used first"""
+        with self._lock:
+            rows = [s.as_dict() for s in self._statements.values()]
+        return sorted(rows, key=lambda r: r['hits'] + r['prepares'], reverse=True)
\ No newline at end of file
@@ -3,8 +3,342 @@ Query Executor Module
 Executes the 5 required retrieval queries
 """
 
+from archive import archive_sql, load_watermark
+from report_output import peek, write_chunks
+
+
+# How a query's hot-table rows combine with archived production history
+# (archive.py): FALLBACK reads the archive only when the hot tables return
+# nothing (the newest batches are always hot); a function
+# merge(hot_rows, archived_rows) combines both answers.
+FALLBACK = 'fallback'
+
+
+class RetrievalQuery:
+    """
+    One of the required queries with its hard-coded values lifted into parameters
+    
+    `sql` answers the question for one entity. `grouped_sql`, where present,
+    answers it for every entity (or a chosen set) in a single statement; its
+    `{key_filter}` placeholder becomes an IN list or IS NOT NULL. Queries
+    over batch history set `history`; the archive is only read once an
+    archive run has moved batches there.
+    """
+    
+    def __init__(self, number, title, sql, params=(), defaults=None,
+                 grouped_sql=None, group_by=(), history=None):
+        self.number = number
+        self.title = title
+        self.sql = sql
+        self.params = params
+        self.defaults = defaults or {}
+        self.grouped_sql = grouped_sql
+        self.group_by = group_by
+        self.history = history
+        
+    def bind(self, **values):
+        """
+        Build the parameter tuple, falling back to the assignment's values
+        
+        Returns:
+            tuple: Parameters in placeholder order
+        """
+        unknown = set(values) - set(self.params)
+        if unknown:
+            raise TypeError(f"Query {self.number} has no parameter(s): {', '.join(sorted(unknown))}")
+        merged = dict(self.defaults, **{k: v for k, v in values.items() if v is not None})
+        return tuple(merged[name] for name in self.params)
+        
+    def run(self, db, **values):
+        """Rows for one entity (parameters not given use the defaults)"""
+        params = self.bind(**values)
+        rows = db.fetch_cached(self.sql, params)
+        if self._reads_archive(db, rows):
+            rows = self._combine(rows, db.fetch_cached(archive_sql(self.sql), params))
+        return rows
+        
+    def stream(self, db, **values):
+        """Rows for one entity in chunks from an unbuffered cursor (bypasses the result cache; hot tables only)"""
+        return db.stream(self.sql, self.bind(**values))
+        
+    def _reads_archive(self, db, hot_rows):
+        """Whether archived batches can change this result"""
+        if self.history is None or (self.history == FALLBACK and hot_rows):
+            return False
+        return not load_watermark(db).empty
+        
+    def _combine(self, hot_rows, archived_rows):
+        if self.history == FALLBACK:
+            return hot_rows or archived_rows
+        return self.history(hot_rows, archived_rows)
+        
+    def _group(self, rows):
+        groups = {}
+        for row in rows:
+            if len(self.group_by) == 1:
+                key = row[self.group_by[0]]
+            else:
+                key = tuple(row[column] for column in self.group_by)
+            groups.setdefault(key, []).append(row)
+        return groups
+    
+    def run_grouped(self, db, keys=None):
+        """
+        Rows for many entities from one statement
+        
+        Args:
+            db (DatabaseConnection): Connection to query through
+            keys (list): Limit to these entities (all of them if omitted)
+        
+        Returns:
+            dict: Group key (value, or tuple for several group_by columns) -> rows
+        """
+        if self.grouped_sql is None:
+            raise ValueError(f"Query {self.number} has no grouped form")
+        
+        if keys:
+            keys = list(dict.fromkeys(keys))
+            key_filter = f"IN ({', '.join(['%s'] * len(keys))})"
+            params = tuple(keys)
+        else:
+            key_filter, params = "IS NOT NULL", ()
+        
+        sql = self.grouped_sql.format(key_filter=key_filter)
+        groups = self._group(db.fetch_cached(sql, params))
+        if self.history is None or load_watermark(db).empty:
+            return groups
+        
+        # Combine group by group, as run() does for one entity
+        archived = self._group(db.fetch_cached(archive_sql(sql), params))
+        combined = {}
+        for key in list(groups) + [key for key in archived if key not in groups]:
+            rows = self._combine(groups.get(key, []), archived.get(key, []))
+            if rows:
+                combined[key] = rows
+        return combined
+
+
+def _sum_spent(hot_rows, archived_rows):
+    """Query 3: hot plus archived spending per supplier, largest first"""
+    totals = {}
+    for row in list(hot_rows) + list(archived_rows):
+        entry = totals.get(row['supplier_id'])
+        if entry is None:
+            totals[row['supplier_id']] = dict(row.items())
+        else:
+            entry['total_spent'] += row['total_spent']
+    return sorted(totals.values(), key=lambda r: r['total_spent'], reverse=True)
+
+
+def _supplied_in_neither(hot_rows, archived_rows):
+    """Query 4: manufacturers the supplier supplied neither recently nor in the archive"""
+    unsupplied = {row['manufacturer_id'] for row in archived_rows}
+    return [row for row in hot_rows if row['manufacturer_id'] in unsupplied]
+
+
+QUERY_1 = RetrievalQuery(
+    1, "All products and their categories",
+    """
+    SELECT 
+        p.product_id,
+        p.name AS product_name,
+        c.name AS category_name,
+        m.name AS manufacturer_name
+    FROM PRODUCT p
+    JOIN CATEGORY c ON p.category_id = c.category_id
+    JOIN MANUFACTURER m ON p.manufacturer_id = m.manufacturer_id
+    ORDER BY c.name, p.name
+    """
+)
+
+# Ingredients of the most recent batch of a product, fetched with the batch in one round trip
+QUERY_2 = RetrievalQuery(
+    2, "Last batch ingredients for a product and manufacturer",
+    """
+    SELECT 
+        pb.lot_number AS product_lot,
+        pb.production_date,
+        pb.quantity_produced,
+        i.ingredient_id,
+        i.name AS ingredient_name,
+        ib.lot_number AS ingredient_lot,
+        bc.quantity_consumed
+    FROM PRODUCT_BATCH pb
+    JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    WHERE pb.lot_number = (
+        SELECT last.lot_number
+        FROM PRODUCT_BATCH last
+        WHERE last.product_id = %s
+          AND last.manufacturer_id = %s
+        ORDER BY last.production_date DESC, last.lot_number DESC
+        LIMIT 1
+    )
+    ORDER BY bc.quantity_consumed DESC
+    """,
+    params=('product_id', 'manufacturer_id'),
+    defaults={'product_id': 100, 'manufacturer_id': 'MFG001'},
+    grouped_sql="""
+    WITH last_batch AS (
+        SELECT 
+            pb.lot_number,
+            pb.product_id,
+            pb.manufacturer_id,
+            pb.production_date,
+            pb.quantity_produced,
+            ROW_NUMBER() OVER (
+                PARTITION BY pb.manufacturer_id, pb.product_id
+                ORDER BY pb.production_date DESC, pb.lot_number DESC
+            ) AS recency
+        FROM PRODUCT_BATCH pb
+        WHERE pb.manufacturer_id {key_filter}
+    )
+    SELECT 
+        lb.manufacturer_id,
+        lb.product_id,
+        lb.lot_number AS product_lot,
+        lb.production_date,
+        lb.quantity_produced,
+        i.ingredient_id,
+        i.name AS ingredient_name,
+        ib.lot_number AS ingredient_lot,
+        bc.quantity_consumed
+    FROM last_batch lb
+    JOIN BATCH_CONSUMPTION bc ON lb.lot_number = bc.product_batch_lot
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    WHERE lb.recency = 1
+    ORDER BY lb.manufacturer_id, lb.product_id, bc.quantity_consumed DESC
+    """,
+    group_by=('manufacturer_id', 'product_id'),
+    history=FALLBACK
+)
+
+QUERY_3 = RetrievalQuery(
+    3, "Suppliers and total spent for a manufacturer",
+    """
+    SELECT 
+        s.supplier_id,
+        s.name AS supplier_name,
+        SUM(bc.quantity_consumed * ib.cost_per_unit) AS total_spent
+    FROM PRODUCT_BATCH pb
+    JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
+    WHERE pb.manufacturer_id = %s
+    GROUP BY s.supplier_id, s.name
+    ORDER BY total_spent DESC
+    """,
+    params=('manufacturer_id',),
+    defaults={'manufacturer_id': 'MFG002'},
+    grouped_sql="""
+    SELECT 
+        pb.manufacturer_id,
+        s.supplier_id,
+        s.name AS supplier_name,
+        SUM(bc.quantity_consumed * ib.cost_per_unit) AS total_spent
+    FROM PRODUCT_BATCH pb
+    JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
+    WHERE pb.manufacturer_id {key_filter}
+    GROUP BY pb.manufacturer_id, s.supplier_id, s.name
+    ORDER BY pb.manufacturer_id, total_spent DESC
+    """,
+    group_by=('manufacturer_id',),
+    history=_sum_spent
+)
+
+QUERY_4 = RetrievalQuery(
+    4, "Manufacturers NOT supplied by a supplier",
+    """
+    SELECT 
+        m.manufacturer_id,
+        m.name AS manufacturer_name
+    FROM MANUFACTURER m
+    WHERE m.manufacturer_id NOT IN (
+        SELECT DISTINCT pb.manufacturer_id
+        FROM PRODUCT_BATCH pb
+        JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
+        JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+        JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+        WHERE i.supplier_id = %s
+    )
+    ORDER BY m.name
+    """,
+    params=('supplier_id',),
+    defaults={'supplier_id': 21},
+    grouped_sql="""
+    SELECT 
+        s.supplier_id,
+        m.manufacturer_id,
+        m.name AS manufacturer_name
+    FROM SUPPLIER s
+    CROSS JOIN MANUFACTURER m
+    WHERE s.supplier_id {key_filter}
+      AND NOT EXISTS (
+        SELECT 1
+        FROM PRODUCT_BATCH pb
+        JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
+        JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+        JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+        WHERE pb.manufacturer_id = m.manufacturer_id
+          AND i.supplier_id = s.supplier_id
+    )
+    ORDER BY s.supplier_id, m.name
+    """,
+    group_by=('supplier_id',),
+    history=_supplied_in_neither
+)
+
+QUERY_5 = RetrievalQuery(
+    5, "Unit cost for a product lot",
+    """
+    SELECT 
+        pb.lot_number,
+        p.name AS product_name,
+        pb.per_unit_cost,
+        pb.total_cost,
+        pb.quantity_produced,
+        pb.production_date
+    FROM PRODUCT_BATCH pb
+    JOIN PRODUCT p ON pb.product_id = p.product_id
+    WHERE pb.lot_number = %s
+    """,
+    params=('lot_number',),
+    defaults={'lot_number': '100-MFG001-B0901'},
+    grouped_sql="""
+    SELECT 
+        pb.lot_number,
+        p.name AS product_name,
+        pb.per_unit_cost,
+        pb.total_cost,
+        pb.quantity_produced,
+        pb.production_date
+    FROM PRODUCT_BATCH pb
+    JOIN PRODUCT p ON pb.product_id = p.product_id
+    WHERE pb.lot_number {key_filter}
+    ORDER BY pb.lot_number
+    """,
+    group_by=('lot_number',),
+    history=FALLBACK
+)
+
+QUERIES = {q.number: q for q in (QUERY_1, QUERY_2, QUERY_3, QUERY_4, QUERY_5)}
+
 
 class QueryExecutor:
+    """
+    Runs the required queries
+    
+    Results come from the connection's result cache (see result_cache.py),
+    so repeated runs only reach the database after the TTL expires or a
+    write invalidates one of the tables a query reads.
+    """
+    
     def __init__(self, db_connection):
         self.db = db_connection
         
@@ -38,97 +372,79 @@ class QueryExecutor:
             else:
                 print("\nInvalid choice.")
     
+    def run_query(self, number, **params):
+        """
+        Run a required query by number without printing
+        
+        Args:
+            number (int): Query number (1-5)
+            **params: Query parameters (see RetrievalQuery.params); defaults
+                      are the values from the assignment
+        
+        Returns:
+            list: Result rows
+        """
+        if number not in QUERIES:
+            raise ValueError(f"Unknown query number: {number}")
+        return QUERIES[number].run(self.db, **params)
+        
+    def run_grouped(self, number, keys=None):
+        """
+        Run a required query for many entities in one statement
+        
+        Args:
+            number (int): Query number (2-5)
+            keys (list): Manufacturer IDs (2, 3), supplier IDs (4) or lot numbers (5);
+                         all of them if omitted
+        
+        Returns:
+            dict: Group key -> result rows
+        """
+        if number not in QUERIES:
+            raise ValueError(f"Unknown query number: {number}")
+        return QUERIES[number].run_grouped(self.db, keys)
+        
     def query_1_all_products(self):
         """Query 1: List all products and their categories"""
         print("\n=== QUERY 1: All Products and Categories ===")
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    p.product_id,
-                    p.name AS product_name,
-                    c.name AS category_name,
-                    m.name AS manufacturer_name
-                FROM PRODUCT p
-                JOIN CATEGORY c ON p.category_id = c.category_id
-                JOIN MANUFACTURER m ON p.manufacturer_id = m.manufacturer_id
-                ORDER BY c.name, p.name
-            """)
-            
-            results = cursor.fetchall()
+            first, chunks = peek(QUERY_1.stream(self.db))
             
-            if not results:
+            if first is None:
                 print("\nNo products found.")
                 return
             
             print(f"\n{'Product ID':<12} {'Product Name':<30} {'Category':<15} {'Manufacturer'}")
             print("-" * 85)
             
-            for row in results:
-                print(f"{row['product_id']:<12} {row['product_name']:<30} "
-                      f"{row['category_name']:<15} {row['manufacturer_name']}")
+            total = write_chunks(chunks, lambda row: (
+                f"{row['product_id']:<12} {row['product_name']:<30} "
+                f"{row['category_name']:<15} {row['manufacturer_name']}"
+            ))
             
-            print(f"\nTotal products: {len(results)}")
+            print(f"\nTotal products: {total}")
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
-    def query_2_last_batch_ingredients(self):
-        """Query 2: List ingredients and lot numbers of last batch of Steak Dinner (100) by MFG001"""
-        print("\n=== QUERY 2: Last Batch Ingredients for Steak Dinner (100) - MFG001 ===")
-        
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
+    def query_2_last_batch_ingredients(self, product_id=100, manufacturer_id='MFG001'):
+        """Query 2: List ingredients and lot numbers of the last batch of a product (default Steak Dinner (100) by MFG001)"""
+        print(f"\n=== QUERY 2: Last Batch Ingredients for Product {product_id} - {manufacturer_id} ===")
         
         try:
-            # First, get the last batch
-            cursor.execute("""
-                SELECT pb.lot_number, pb.production_date, pb.quantity_produced
-                FROM PRODUCT_BATCH pb
-                WHERE pb.product_id = 100
-                  AND pb.manufacturer_id = 'MFG001'
-                ORDER BY pb.production_date DESC
-                LIMIT 1
-            """)
+            # The last batch and its ingredients come back together
+            ingredients = self.run_query(2, product_id=product_id, manufacturer_id=manufacturer_id)
             
-            batch = cursor.fetchone()
-            
-            if not batch:
-                print("\nNo batches found for Steak Dinner (100) by MFG001.")
+            if not ingredients:
+                print(f"\nNo batches with recorded ingredients found for product {product_id} by {manufacturer_id}.")
                 return
             
-            print(f"\nLast Batch: {batch['lot_number']}")
+            batch = ingredients[0]
+            print(f"\nLast Batch: {batch['product_lot']}")
             print(f"Production Date: {batch['production_date']}")
             print(f"Quantity Produced: {batch['quantity_produced']} units")
             
-            # Now get ingredients for this batch
-            cursor.execute("""
-                SELECT 
-                    pb.lot_number AS product_lot,
-                    pb.production_date,
-                    i.ingredient_id,
-                    i.name AS ingredient_name,
-                    ib.lot_number AS ingredient_lot,
-                    bc.quantity_consumed
-                FROM PRODUCT_BATCH pb
-                JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
-                JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
-                JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                WHERE pb.lot_number = %s
-                ORDER BY bc.quantity_consumed DESC
-            """, (batch['lot_number'],))
-            
-            ingredients = cursor.fetchall()
-            
-            if not ingredients:
-                print("\nNo ingredients found for this batch.")
-                return
-            
             print(f"\n{'Ingredient ID':<15} {'Ingredient Name':<30} {'Ingredient Lot':<20} {'Quantity (oz)'}")
             print("-" * 90)
             
@@ -138,36 +454,16 @@ class QueryExecutor:
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
-    def query_3_mfg002_suppliers(self):
-        """Query 3: For MFG002, list all suppliers and total spent per supplier"""
-        print("\n=== QUERY 3: Suppliers and Total Spent for MFG002 ===")
-        
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
+    def query_3_mfg002_suppliers(self, manufacturer_id='MFG002'):
+        """Query 3: For a manufacturer (default MFG002), list all suppliers and total spent per supplier"""
+        print(f"\n=== QUERY 3: Suppliers and Total Spent for {manufacturer_id} ===")
         
         try:
-            cursor.execute("""
-                SELECT 
-                    s.supplier_id,
-                    s.name AS supplier_name,
-                    SUM(bc.quantity_consumed * ib.cost_per_unit) AS total_spent
-                FROM PRODUCT_BATCH pb
-                JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
-                JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
-                JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
-                WHERE pb.manufacturer_id = 'MFG002'
-                GROUP BY s.supplier_id, s.name
-                ORDER BY total_spent DESC
-            """)
-            
-            results = cursor.fetchall()
+            results = self.run_query(3, manufacturer_id=manufacturer_id)
             
             if not results:
-                print("\nNo supplier purchases found for MFG002.")
+                print(f"\nNo supplier purchases found for {manufacturer_id}.")
                 return
             
             print(f"\n{'Supplier ID':<15} {'Supplier Name':<30} {'Total Spent'}")
@@ -183,37 +479,16 @@ class QueryExecutor:
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
-    def query_4_not_supplied_by_21(self):
-        """Query 4: Which manufacturers has Supplier B (21) NOT supplied to?"""
-        print("\n=== QUERY 4: Manufacturers NOT Supplied by Supplier B (21) ===")
-        
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
+    def query_4_not_supplied_by_21(self, supplier_id=21):
+        """Query 4: Which manufacturers has a supplier (default Supplier B (21)) NOT supplied to?"""
+        print(f"\n=== QUERY 4: Manufacturers NOT Supplied by Supplier {supplier_id} ===")
         
         try:
-            cursor.execute("""
-                SELECT 
-                    m.manufacturer_id,
-                    m.name AS manufacturer_name
-                FROM MANUFACTURER m
-                WHERE m.manufacturer_id NOT IN (
-                    SELECT DISTINCT pb.manufacturer_id
-                    FROM PRODUCT_BATCH pb
-                    JOIN BATCH_CONSUMPTION bc ON pb.lot_number = bc.product_batch_lot
-                    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
-                    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                    WHERE i.supplier_id = 21
-                )
-                ORDER BY m.name
-            """)
-            
-            results = cursor.fetchall()
+            results = self.run_query(4, supplier_id=supplier_id)
             
             if not results:
-                print("\nAll manufacturers have been supplied by Supplier B (21).")
+                print(f"\nAll manufacturers have been supplied by Supplier {supplier_id}.")
                 return
             
             print(f"\n{'Manufacturer ID':<20} {'Manufacturer Name'}")
@@ -226,36 +501,20 @@ class QueryExecutor:
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
     
-    def query_5_unit_cost(self):
-        """Query 5: Find unit cost for product lot 100-MFG001-B0901"""
-        print("\n=== QUERY 5: Unit Cost for Product Lot 100-MFG001-B0901 ===")
-        
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
+    def query_5_unit_cost(self, lot_number='100-MFG001-B0901'):
+        """Query 5: Find unit cost for a product lot (default 100-MFG001-B0901)"""
+        print(f"\n=== QUERY 5: Unit Cost for Product Lot {lot_number} ===")
         
         try:
-            cursor.execute("""
-                SELECT 
-                    pb.lot_number,
-                    p.name AS product_name,
-                    pb.per_unit_cost,
-                    pb.total_cost,
-                    pb.quantity_produced,
-                    pb.production_date
-                FROM PRODUCT_BATCH pb
-                JOIN PRODUCT p ON pb.product_id = p.product_id
-                WHERE pb.lot_number = '100-MFG001-B0901'
-            """)
+            rows = self.run_query(5, lot_number=lot_number)
             
-            result = cursor.fetchone()
-            
-            if not result:
-                print("\nProduct batch lot 100-MFG001-B0901 not found.")
+            if not rows:
+                print(f"\nProduct batch lot {lot_number} not found.")
                 return
             
+            result = rows[0]
+            
             print(f"\nProduct: {result['product_name']}")
             print(f"Lot Number: {result['lot_number']}")
             print(f"Production Date: {result['production_date']}")
@@ -264,6 +523,4 @@ class QueryExecutor:
             print(f"Per Unit Cost: ${result['per_unit_cost']:.4f}")
             
         except Exception as e:
-            print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
\ No newline at end of file
+            print(f"\n✗ Error: {e}")
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Report Output Module
+Chunked rendering of streamed query results to stdout
+"""
+
+import sys
+
+
+def write_chunks(chunks, render, out=None):
+    """
+    Render streamed rows and write each chunk with a single write call
+    
+    Args:
+        chunks: Iterable of row lists (e.g. DatabaseConnection.stream)
+        render (callable): Row -> formatted line(s)
+        out: Text stream (defaults to sys.stdout)
+    
+    Returns:
+        int: Number of rows written
+    """
+    out = out or sys.stdout
+    count = 0
+    
+    for rows in chunks:
+        out.write('\n'.join(render(row) for row in rows) + '\n')
+        count += len(rows)
+    
+    out.flush()
+    return count
+
+
+def peek(chunks):
+    """
+    Pull the first chunk so callers can tell an empty result apart
+    
+    Returns:
+        tuple: (first chunk or None, iterator over every chunk including the first)
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return None, iter(())
+    
+    def replay():
+        yield first
+        yield from chunks
+    
+    return first, replay()
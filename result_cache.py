@@ -0,0 +1,166 @@
+"""
+Result Cache Module
+TTL + LRU cache for read query results with table-based invalidation
+"""
+
+from collections import OrderedDict
+import re
+import threading
+import time
+
+
+# Tables a statement reads from / writes to (unquoted or backquoted identifiers)
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r'\b(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)`?',
+    re.IGNORECASE
+)
+
+# Tables that triggers (schema.sql, Section 4) also write when a table is written
+TRIGGER_WRITES = {
+    'BATCH_CONSUMPTION': ('INGREDIENT_BATCH', 'INGREDIENT_STOCK_SUMMARY', 'INVENTORY_LEDGER'),
+    'INGREDIENT_BATCH': ('INGREDIENT_STOCK_SUMMARY', 'INVENTORY_LEDGER'),
+    'PRODUCT_BATCH': ('FINISHED_GOODS_SUMMARY',)
+}
+
+
+def tables_read(sql):
+    """Upper-cased names of the tables a query reads"""
+    return frozenset(name.upper() for name in _READ_TABLES.findall(sql))
+
+
+def with_trigger_writes(tables):
+    """Upper-cased table names plus the tables their triggers also write"""
+    tables = {name.upper() for name in tables}
+    for table in list(tables):
+        tables.update(TRIGGER_WRITES.get(table, ()))
+    return frozenset(tables)
+
+
+def tables_written(sql):
+    """Upper-cased names of the tables a statement modifies, including through triggers"""
+    return with_trigger_writes(_WRITE_TABLES.findall(sql))
+
+
+class CacheEntry:
+    """A cached result and the tables it was computed from"""
+    
+    def __init__(self, value, tables, expires_at):
+        self.value = value
+        self.tables = tables
+        self.expires_at = expires_at
+
+
+class ResultCache:
+    """
+    Size-bounded LRU of query results with a per-entry time-to-live
+    
+    Entries are tagged with the tables they read. invalidate() drops every
+    entry that depends on a written table and bumps that table's generation;
+    a result computed while a write was in flight is not stored, because the
+    generations it started with no longer match.
+    
+    Invalidation only sees writes made through this process, so the TTL
+    bounds staleness for changes made by other clients.
+    """
+    
+    def __init__(self, max_entries=256, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+        
+    def _generation(self, tables):
+        return (self._epoch,) + tuple(self._generations.get(t, 0) for t in sorted(tables))
+        
+    def generation(self, tables):
+        """Snapshot of the write generations for a set of tables"""
+        with self._lock:
+            return self._generation(tables)
+    
+    def get(self, key):
+        """
+        Look up a cached result
+        
+        Returns:
+            tuple: (True, value) on a hit, (False, None) on a miss or expiry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return False, None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry.value
+    
+    def put(self, key, value, tables, generation=None, ttl=None):
+        """
+        Store a result
+        
+        Args:
+            key: Hashable cache key (e.g. SQL text and parameters)
+            value: Result to cache
+            tables (frozenset): Tables the result depends on
+            generation (tuple): generation(tables) taken before the query ran
+            ttl (float): Seconds to keep the entry (defaults to the cache TTL)
+        """
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            if generation is not None and generation != self._generation(tables):
+                return
+            
+            self._entries[key] = CacheEntry(
+                value, tables, time.monotonic() + (self.ttl if ttl is None else ttl)
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, tables):
+        """Drop every entry that depends on any of the given tables"""
+        tables = {t.upper() for t in tables}
+        if not tables:
+            return
+        
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry.tables & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+    
+    def clear(self):
+        """Drop every entry (used when the tables written are unknown)"""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit/miss counters as a plain dictionary"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Retry Policy Module
+Retries transactions that lost a lock conflict, with jittered exponential backoff
+"""
+
+import os
+import random
+import time
+
+
+# InnoDB errors after which the whole transaction has been (or must be)
+# rolled back and can simply be run again
+ER_LOCK_DEADLOCK = 1213
+ER_LOCK_WAIT_TIMEOUT = 1205
+RETRYABLE_ERRORS = (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT)
+
+
+def is_retryable(error):
+    """True for deadlock and lock-wait-timeout errors"""
+    return getattr(error, 'errno', None) in RETRYABLE_ERRORS
+
+
+class RetryPolicy:
+    """
+    Runs a transaction function again when it fails on a lock conflict
+    
+    The delay before retry n is drawn uniformly from
+    [0, min(max_delay, base_delay * 2**n)] ("full jitter"), so sessions that
+    collided do not collide again in lockstep. The function must roll back
+    its own work on failure (DatabaseConnection.call_procedure does).
+    
+    Defaults come from DB_RETRY_ATTEMPTS, DB_RETRY_BASE_MS and DB_RETRY_MAX_MS.
+    """
+    
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None, rng=None):
+        if max_attempts is None:
+            max_attempts = int(os.getenv('DB_RETRY_ATTEMPTS', '5'))
+        if base_delay is None:
+            base_delay = float(os.getenv('DB_RETRY_BASE_MS', '20')) / 1000
+        if max_delay is None:
+            max_delay = float(os.getenv('DB_RETRY_MAX_MS', '1000')) / 1000
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+        self.retries = 0
+        
+    def delay(self, attempt):
+        """Seconds to sleep after the given failed attempt (0-based)"""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        
+    def run(self, func, *args, **kwargs):
+        """
+        Call func until it succeeds, fails with a non-retryable error, or
+        runs out of attempts
+        
+        Returns:
+            The return value of func
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                self.retries += 1
+                time.sleep(self.delay(attempt))
\ No newline at end of file
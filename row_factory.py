@@ -0,0 +1,93 @@
+"""
+Row Factory Module
+Compact row representations for query results
+"""
+
+from functools import lru_cache
+
+
+ROW_FACTORIES = ('dict', 'tuple', 'row')
+
+
+class Row(tuple):
+    """
+    Tuple row that can also be read by column name
+    
+    Subclasses are generated once per result shape by row_class(); they add
+    no per-instance storage (__slots__ = ()), so a row costs the same as a
+    plain tuple and the column names are stored once per shape.
+    """
+    
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+        
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+        
+    def keys(self):
+        return self._fields
+        
+    def items(self):
+        return zip(self._fields, self)
+        
+    def as_dict(self):
+        """Row as a plain dictionary (for JSON/CSV output)"""
+        return dict(zip(self._fields, self))
+        
+    def __repr__(self):
+        values = ', '.join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({values})"
+
+
+@lru_cache(maxsize=256)
+def row_class(columns):
+    """
+    Row subclass for one result shape
+    
+    Args:
+        columns (tuple): Column names in result order
+    
+    Returns:
+        type: Row subclass with _fields and a name -> position index
+    """
+    return type('Row', (Row,), {
+        '__slots__': (),
+        '_fields': columns,
+        '_index': {name: i for i, name in enumerate(columns)}
+    })
+
+
+def check_factory(row_factory):
+    if row_factory not in ROW_FACTORIES:
+        raise ValueError(f"row_factory must be one of {', '.join(ROW_FACTORIES)}")
+    return row_factory
+
+
+def cursor_options(row_factory):
+    """connection.cursor() keyword arguments for a row factory"""
+    return {'dictionary': True} if row_factory == 'dict' else {}
+
+
+def converter(row_factory, cursor):
+    """
+    Function turning the cursor's raw rows into the requested shape
+    
+    Dictionary cursors already return dicts and plain cursors tuples, so
+    only 'row' needs converting; the class is built once per column list.
+    """
+    if row_factory != 'row':
+        return None
+    make = row_class(tuple(cursor.column_names))
+    return lambda rows: [tuple.__new__(make, row) for row in rows]
+
+
+def as_dict(row):
+    """A row of any shape with names (dict or Row) as a dictionary"""
+    return row if isinstance(row, dict) else row.as_dict()
\ No newline at end of file
@@ -166,6 +166,122 @@ CREATE TABLE BATCH_CONSUMPTION (
     CHECK (quantity_consumed > 0)
 );
 
+-- Report Summaries (kept current by the triggers in Section 4;
+-- rebuild/verify with `python main.py summaries`)
+
+CREATE TABLE INGREDIENT_STOCK_SUMMARY (
+    manufacturer_id VARCHAR(20) NOT NULL,
+    ingredient_id INT NOT NULL,
+    on_hand_oz DECIMAL(14,3) NOT NULL DEFAULT 0,
+    open_lots INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (manufacturer_id, ingredient_id),
+    FOREIGN KEY (manufacturer_id) REFERENCES MANUFACTURER(manufacturer_id) ON DELETE CASCADE,
+    FOREIGN KEY (ingredient_id) REFERENCES INGREDIENT(ingredient_id) ON DELETE CASCADE
+);
+
+CREATE TABLE FINISHED_GOODS_SUMMARY (
+    manufacturer_id VARCHAR(20) NOT NULL,
+    product_id INT NOT NULL,
+    units_produced INT NOT NULL DEFAULT 0,
+    batch_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (manufacturer_id, product_id),
+    FOREIGN KEY (manufacturer_id) REFERENCES MANUFACTURER(manufacturer_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES PRODUCT(product_id) ON DELETE CASCADE
+);
+
+-- Inventory Ledger (append-only; written by the triggers in Section 4)
+-- quantity_oz is a signed movement of a manufacturer's stock in one lot.
+-- movement_date is the booking date (CURRENT_DATE when written), so dates
+-- never go backwards past a snapshot already taken.
+
+CREATE TABLE INVENTORY_LEDGER (
+    movement_id BIGINT AUTO_INCREMENT,
+    lot_number VARCHAR(50) NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    ingredient_id INT NOT NULL,
+    movement_type ENUM('RECEIPT', 'CONSUMPTION', 'TRANSFER', 'ADJUSTMENT') NOT NULL,
+    quantity_oz DECIMAL(12,3) NOT NULL,
+    product_batch_lot VARCHAR(50) NULL,
+    movement_date DATE NOT NULL DEFAULT (CURRENT_DATE),
+    PRIMARY KEY (movement_id),
+    INDEX idx_ledger_date (movement_date, manufacturer_id),
+    INDEX idx_ledger_lot (lot_number)
+);
+
+-- Month-end (or any past date) checkpoints: each lot's balance at the end
+-- of snapshot_date, so an as-of query only replays movements after it
+CREATE TABLE INVENTORY_CHECKPOINT (
+    snapshot_date DATE NOT NULL,
+    lot_count INT NOT NULL,
+    on_hand_oz DECIMAL(16,3) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (snapshot_date)
+);
+
+CREATE TABLE INVENTORY_SNAPSHOT (
+    snapshot_date DATE NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    lot_number VARCHAR(50) NOT NULL,
+    ingredient_id INT NOT NULL,
+    on_hand_oz DECIMAL(12,3) NOT NULL,
+    PRIMARY KEY (snapshot_date, manufacturer_id, lot_number),
+    FOREIGN KEY (snapshot_date) REFERENCES INVENTORY_CHECKPOINT(snapshot_date) ON DELETE CASCADE
+);
+
+-- Production History Archive (moved by archive.py; `python main.py archive`)
+-- Product batches produced on or before ARCHIVE_WATERMARK.archived_through
+-- live here, with their consumption rows, instead of in PRODUCT_BATCH and
+-- BATCH_CONSUMPTION. Both tables are partitioned by production_date (one
+-- partition per year, added before each archive run). Partitioned InnoDB
+-- tables cannot have foreign keys, so Triggers 14-19 enforce the same
+-- references. Archived rows are read-only.
+
+CREATE TABLE PRODUCT_BATCH_ARCHIVE (
+    lot_number VARCHAR(50) NOT NULL,
+    product_id INT NOT NULL,
+    manufacturer_id VARCHAR(20) NOT NULL,
+    plan_id INT NOT NULL,
+    batch_id VARCHAR(20) NOT NULL,
+    quantity_produced INT NOT NULL,
+    total_cost DECIMAL(12,2) NOT NULL,
+    per_unit_cost DECIMAL(10,4) NOT NULL,
+    production_date DATE NOT NULL,
+    PRIMARY KEY (lot_number, production_date),
+    INDEX idx_product_batch_archive_mfg_product_date (manufacturer_id, product_id, production_date),
+    INDEX idx_product_batch_archive_product (product_id),
+    INDEX idx_product_batch_archive_plan (plan_id)
+)
+PARTITION BY RANGE COLUMNS (production_date) (
+    PARTITION p_history VALUES LESS THAN ('2000-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+CREATE TABLE BATCH_CONSUMPTION_ARCHIVE (
+    product_batch_lot VARCHAR(50) NOT NULL,
+    ingredient_batch_lot VARCHAR(50) NOT NULL,
+    quantity_consumed DECIMAL(10,3) NOT NULL,
+    production_date DATE NOT NULL,
+    PRIMARY KEY (product_batch_lot, ingredient_batch_lot, production_date),
+    INDEX idx_consumption_archive_ingredient_lot (ingredient_batch_lot, product_batch_lot, quantity_consumed)
+)
+PARTITION BY RANGE COLUMNS (production_date) (
+    PARTITION p_history VALUES LESS THAN ('2000-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- One row. archived_through: last production_date moved to the archive
+-- (NULL = nothing archived). received_through: latest received_date of an
+-- ingredient lot with archived consumption, so forward traces of newer
+-- lots skip the archive.
+CREATE TABLE ARCHIVE_WATERMARK (
+    id TINYINT NOT NULL DEFAULT 1,
+    archived_through DATE NULL,
+    received_through DATE NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    CHECK (id = 1)
+);
+
 -- ============================================================
 -- SECTION 2: INDEXES
 -- ============================================================
@@ -181,11 +297,24 @@ CREATE INDEX idx_recipe_plan_active ON RECIPE_PLAN(product_id, is_active);
 CREATE INDEX idx_formulation_ingredient ON FORMULATION(ingredient_id);
 CREATE INDEX idx_formulation_dates ON FORMULATION(effective_start_date, effective_end_date);
 CREATE INDEX idx_ingredient_batch_ingredient ON INGREDIENT_BATCH(ingredient_id);
-CREATE INDEX idx_ingredient_batch_supplier ON INGREDIENT_BATCH(supplier_id);
-CREATE INDEX idx_ingredient_batch_manufacturer ON INGREDIENT_BATCH(manufacturer_id);
+-- Supplier recall windows (traceability.py); also serves supplier_id lookups
+CREATE INDEX idx_ingredient_batch_supplier_received ON INGREDIENT_BATCH(supplier_id, received_date);
+-- Available lots of an ingredient for a manufacturer, soonest expiry first
+-- (FEFO candidates, capacity, on-hand lots). Covering: lot_number rides along
+-- as the primary key. Also serves manufacturer_id lookups and its foreign key.
+CREATE INDEX idx_ingredient_batch_mfg_ingredient_expiry ON INGREDIENT_BATCH(manufacturer_id, ingredient_id, expiration_date, on_hand_oz);
+-- Almost-expired report: one manufacturer's lots in an expiry range, in expiry order
+CREATE INDEX idx_ingredient_batch_mfg_expiry ON INGREDIENT_BATCH(manufacturer_id, expiration_date, on_hand_oz, ingredient_id);
 CREATE INDEX idx_ingredient_batch_expiration ON INGREDIENT_BATCH(expiration_date);
-CREATE INDEX idx_product_batch_manufacturer ON PRODUCT_BATCH(manufacturer_id);
+-- Latest batch of a (manufacturer, product) pair (Query 2) and a manufacturer's
+-- batches (Query 3); also serves manufacturer_id lookups and its foreign key
+CREATE INDEX idx_product_batch_mfg_product_date ON PRODUCT_BATCH(manufacturer_id, product_id, production_date);
 CREATE INDEX idx_product_batch_product ON PRODUCT_BATCH(product_id);
+-- Oldest batches first for archive runs
+CREATE INDEX idx_product_batch_production_date ON PRODUCT_BATCH(production_date);
+-- Forward lineage (ingredient lot -> product lots); the primary key only
+-- serves the backward direction. Covers the trace query without a row lookup.
+CREATE INDEX idx_consumption_ingredient_lot ON BATCH_CONSUMPTION(ingredient_batch_lot, product_batch_lot, quantity_consumed);
 
 -- ============================================================
 -- SECTION 3: INITIAL DATA
@@ -193,6 +322,8 @@ CREATE INDEX idx_product_batch_product ON PRODUCT_BATCH(product_id);
 
 INSERT INTO CATEGORY (name) VALUES ('Dinners'), ('Sides'), ('Desserts');
 
+INSERT INTO ARCHIVE_WATERMARK (id) VALUES (1);
+
 -- ============================================================
 -- SECTION 4: TRIGGERS
 -- ============================================================
@@ -229,41 +360,326 @@ BEGIN
     SET NEW.on_hand_oz = NEW.quantity;
 END$$
 
--- Trigger 3: Prevent expired consumption
-CREATE TRIGGER trg_prevent_expired_consumption
+-- Trigger 3: Validate and consume an ingredient lot
+-- One locked read of the lot (FOR UPDATE, so a concurrent batch cannot
+-- drain it between the check and the decrement), then one guarded UPDATE.
+CREATE TRIGGER trg_consume_ingredient_lot
 BEFORE INSERT ON BATCH_CONSUMPTION
 FOR EACH ROW
 BEGIN
     DECLARE exp_date DATE;
+    DECLARE current_qty DECIMAL(10,3);
 
-    SELECT expiration_date INTO exp_date
+    SELECT expiration_date, on_hand_oz INTO exp_date, current_qty
     FROM INGREDIENT_BATCH
-    WHERE lot_number = NEW.ingredient_batch_lot;
+    WHERE lot_number = NEW.ingredient_batch_lot
+    FOR UPDATE;
+
+    IF exp_date IS NULL THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Unknown ingredient lot.';
+    END IF;
 
     IF exp_date < CURRENT_DATE() THEN
         SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'Cannot consume expired ingredient lot.';
     END IF;
+
+    IF current_qty < NEW.quantity_consumed THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Insufficient quantity in ingredient lot.';
+    END IF;
+
+    UPDATE INGREDIENT_BATCH
+    SET on_hand_oz = on_hand_oz - NEW.quantity_consumed
+    WHERE lot_number = NEW.ingredient_batch_lot
+      AND on_hand_oz >= NEW.quantity_consumed;
+
+    IF ROW_COUNT() = 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Insufficient quantity in ingredient lot.';
+    END IF;
 END$$
 
--- Trigger 4: Decrement on-hand on consumption
-CREATE TRIGGER trg_decrement_on_hand
-BEFORE INSERT ON BATCH_CONSUMPTION
+-- Triggers 4-6: Keep INGREDIENT_STOCK_SUMMARY current. Every on-hand change
+-- (receipts, trigger 3 for both batch procedures) is a write
+-- to INGREDIENT_BATCH, so maintaining the summary here covers all paths.
+-- Lots without a manufacturer (not yet received) are not counted.
+CREATE TRIGGER trg_stock_summary_insert
+AFTER INSERT ON INGREDIENT_BATCH
 FOR EACH ROW
 BEGIN
-    DECLARE current_qty DECIMAL(10,3);
+    IF NEW.manufacturer_id IS NOT NULL THEN
+        INSERT INTO INGREDIENT_STOCK_SUMMARY (manufacturer_id, ingredient_id, on_hand_oz, open_lots)
+        VALUES (NEW.manufacturer_id, NEW.ingredient_id,
+                COALESCE(NEW.on_hand_oz, 0), COALESCE(NEW.on_hand_oz, 0) > 0)
+        ON DUPLICATE KEY UPDATE
+            on_hand_oz = on_hand_oz + COALESCE(NEW.on_hand_oz, 0),
+            open_lots = open_lots + (COALESCE(NEW.on_hand_oz, 0) > 0);
+    END IF;
+END$$
 
-    SELECT on_hand_oz INTO current_qty
-    FROM INGREDIENT_BATCH
-    WHERE lot_number = NEW.ingredient_batch_lot;
+CREATE TRIGGER trg_stock_summary_update
+AFTER UPDATE ON INGREDIENT_BATCH
+FOR EACH ROW
+BEGIN
+    IF OLD.manufacturer_id <=> NEW.manufacturer_id AND OLD.ingredient_id = NEW.ingredient_id THEN
+        -- Common case: only on_hand_oz moved; apply the delta to one row
+        IF NEW.manufacturer_id IS NOT NULL AND NOT (OLD.on_hand_oz <=> NEW.on_hand_oz) THEN
+            UPDATE INGREDIENT_STOCK_SUMMARY
+            SET on_hand_oz = on_hand_oz + COALESCE(NEW.on_hand_oz, 0) - COALESCE(OLD.on_hand_oz, 0),
+                open_lots = open_lots + (COALESCE(NEW.on_hand_oz, 0) > 0) - (COALESCE(OLD.on_hand_oz, 0) > 0)
+            WHERE manufacturer_id = NEW.manufacturer_id AND ingredient_id = NEW.ingredient_id;
+        END IF;
+    ELSE
+        -- Lot assigned to (or moved between) manufacturers or ingredients
+        IF OLD.manufacturer_id IS NOT NULL THEN
+            UPDATE INGREDIENT_STOCK_SUMMARY
+            SET on_hand_oz = on_hand_oz - COALESCE(OLD.on_hand_oz, 0),
+                open_lots = open_lots - (COALESCE(OLD.on_hand_oz, 0) > 0)
+            WHERE manufacturer_id = OLD.manufacturer_id AND ingredient_id = OLD.ingredient_id;
+        END IF;
+        IF NEW.manufacturer_id IS NOT NULL THEN
+            INSERT INTO INGREDIENT_STOCK_SUMMARY (manufacturer_id, ingredient_id, on_hand_oz, open_lots)
+            VALUES (NEW.manufacturer_id, NEW.ingredient_id,
+                    COALESCE(NEW.on_hand_oz, 0), COALESCE(NEW.on_hand_oz, 0) > 0)
+            ON DUPLICATE KEY UPDATE
+                on_hand_oz = on_hand_oz + COALESCE(NEW.on_hand_oz, 0),
+                open_lots = open_lots + (COALESCE(NEW.on_hand_oz, 0) > 0);
+        END IF;
+    END IF;
+END$$
 
-    IF current_qty < NEW.quantity_consumed THEN
-        SIGNAL SQLSTATE '45000'
-        SET MESSAGE_TEXT = 'Insufficient quantity in ingredient lot.';
+CREATE TRIGGER trg_stock_summary_delete
+AFTER DELETE ON INGREDIENT_BATCH
+FOR EACH ROW
+BEGIN
+    IF OLD.manufacturer_id IS NOT NULL THEN
+        UPDATE INGREDIENT_STOCK_SUMMARY
+        SET on_hand_oz = on_hand_oz - COALESCE(OLD.on_hand_oz, 0),
+            open_lots = open_lots - (COALESCE(OLD.on_hand_oz, 0) > 0)
+        WHERE manufacturer_id = OLD.manufacturer_id AND ingredient_id = OLD.ingredient_id;
+    END IF;
+END$$
+
+-- Triggers 7-9: Keep FINISHED_GOODS_SUMMARY current for both
+-- RecordProductionBatch procedures and any direct PRODUCT_BATCH writes
+CREATE TRIGGER trg_finished_goods_summary_insert
+AFTER INSERT ON PRODUCT_BATCH
+FOR EACH ROW
+BEGIN
+    INSERT INTO FINISHED_GOODS_SUMMARY (manufacturer_id, product_id, units_produced, batch_count)
+    VALUES (NEW.manufacturer_id, NEW.product_id, NEW.quantity_produced, 1)
+    ON DUPLICATE KEY UPDATE
+        units_produced = units_produced + NEW.quantity_produced,
+        batch_count = batch_count + 1;
+END$$
+
+CREATE TRIGGER trg_finished_goods_summary_update
+AFTER UPDATE ON PRODUCT_BATCH
+FOR EACH ROW
+BEGIN
+    IF OLD.manufacturer_id = NEW.manufacturer_id AND OLD.product_id = NEW.product_id THEN
+        -- RecordProductionBatch's cost UPDATE leaves quantity_produced alone
+        IF OLD.quantity_produced <> NEW.quantity_produced THEN
+            UPDATE FINISHED_GOODS_SUMMARY
+            SET units_produced = units_produced + NEW.quantity_produced - OLD.quantity_produced
+            WHERE manufacturer_id = NEW.manufacturer_id AND product_id = NEW.product_id;
+        END IF;
     ELSE
-        UPDATE INGREDIENT_BATCH
-        SET on_hand_oz = on_hand_oz - NEW.quantity_consumed
-        WHERE lot_number = NEW.ingredient_batch_lot;
+        UPDATE FINISHED_GOODS_SUMMARY
+        SET units_produced = units_produced - OLD.quantity_produced,
+            batch_count = batch_count - 1
+        WHERE manufacturer_id = OLD.manufacturer_id AND product_id = OLD.product_id;
+
+        INSERT INTO FINISHED_GOODS_SUMMARY (manufacturer_id, product_id, units_produced, batch_count)
+        VALUES (NEW.manufacturer_id, NEW.product_id, NEW.quantity_produced, 1)
+        ON DUPLICATE KEY UPDATE
+            units_produced = units_produced + NEW.quantity_produced,
+            batch_count = batch_count + 1;
+    END IF;
+END$$
+
+-- A batch already copied to PRODUCT_BATCH_ARCHIVE is being archived, not
+-- removed; it still counts
+CREATE TRIGGER trg_finished_goods_summary_delete
+AFTER DELETE ON PRODUCT_BATCH
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM PRODUCT_BATCH_ARCHIVE
+        WHERE lot_number = OLD.lot_number AND production_date = OLD.production_date
+    ) THEN
+        UPDATE FINISHED_GOODS_SUMMARY
+        SET units_produced = units_produced - OLD.quantity_produced,
+            batch_count = batch_count - 1
+        WHERE manufacturer_id = OLD.manufacturer_id AND product_id = OLD.product_id;
+    END IF;
+END$$
+
+-- Trigger 10: Ledger receipt when a lot arrives already owned by a manufacturer
+CREATE TRIGGER trg_ledger_receipt
+AFTER INSERT ON INGREDIENT_BATCH
+FOR EACH ROW
+BEGIN
+    IF NEW.manufacturer_id IS NOT NULL AND COALESCE(NEW.on_hand_oz, 0) <> 0 THEN
+        INSERT INTO INVENTORY_LEDGER (lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz)
+        VALUES (NEW.lot_number, NEW.manufacturer_id, NEW.ingredient_id, 'RECEIPT', NEW.on_hand_oz);
+    END IF;
+END$$
+
+-- Trigger 11: Ledger receipt (supplier lot assigned to a manufacturer) or
+-- transfer out/in (lot moved between manufacturers)
+CREATE TRIGGER trg_ledger_transfer
+AFTER UPDATE ON INGREDIENT_BATCH
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.manufacturer_id <=> NEW.manufacturer_id) THEN
+        IF OLD.manufacturer_id IS NOT NULL AND COALESCE(OLD.on_hand_oz, 0) <> 0 THEN
+            INSERT INTO INVENTORY_LEDGER (lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz)
+            VALUES (OLD.lot_number, OLD.manufacturer_id, OLD.ingredient_id, 'TRANSFER', -OLD.on_hand_oz);
+        END IF;
+        IF NEW.manufacturer_id IS NOT NULL AND COALESCE(NEW.on_hand_oz, 0) <> 0 THEN
+            INSERT INTO INVENTORY_LEDGER (lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz)
+            VALUES (NEW.lot_number, NEW.manufacturer_id, NEW.ingredient_id,
+                    IF(OLD.manufacturer_id IS NULL, 'RECEIPT', 'TRANSFER'), NEW.on_hand_oz);
+        END IF;
+    END IF;
+END$$
+
+-- Trigger 12: Ledger consumption for every BATCH_CONSUMPTION row (both
+-- batch procedures).
+CREATE TRIGGER trg_ledger_consumption
+AFTER INSERT ON BATCH_CONSUMPTION
+FOR EACH ROW
+BEGIN
+    INSERT INTO INVENTORY_LEDGER (
+        lot_number, manufacturer_id, ingredient_id, movement_type, quantity_oz, product_batch_lot
+    )
+    SELECT ib.lot_number, ib.manufacturer_id, ib.ingredient_id, 'CONSUMPTION',
+           -NEW.quantity_consumed, NEW.product_batch_lot
+    FROM INGREDIENT_BATCH ib
+    WHERE ib.lot_number = NEW.ingredient_batch_lot
+      AND ib.manufacturer_id IS NOT NULL;
+END$$
+
+-- Trigger 13: New batches cannot land in the archived date range, and lot
+-- numbers stay unique across PRODUCT_BATCH and PRODUCT_BATCH_ARCHIVE
+CREATE TRIGGER trg_product_batch_archive_guard
+BEFORE INSERT ON PRODUCT_BATCH
+FOR EACH ROW
+BEGIN
+    IF NEW.production_date <= (SELECT archived_through FROM ARCHIVE_WATERMARK WHERE id = 1) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Production date falls in the archived range.';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM PRODUCT_BATCH_ARCHIVE WHERE lot_number = NEW.lot_number) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Product batch lot number already exists.';
+    END IF;
+END$$
+
+-- Triggers 14-15: Foreign-key checks for rows entering the archive
+CREATE TRIGGER trg_product_batch_archive_refs
+BEFORE INSERT ON PRODUCT_BATCH_ARCHIVE
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM PRODUCT WHERE product_id = NEW.product_id)
+       OR NOT EXISTS (SELECT 1 FROM MANUFACTURER WHERE manufacturer_id = NEW.manufacturer_id)
+       OR NOT EXISTS (SELECT 1 FROM RECIPE_PLAN WHERE plan_id = NEW.plan_id) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Archived product batch references a missing product, manufacturer or plan.';
+    END IF;
+END$$
+
+CREATE TRIGGER trg_consumption_archive_refs
+BEFORE INSERT ON BATCH_CONSUMPTION_ARCHIVE
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM PRODUCT_BATCH_ARCHIVE
+        WHERE lot_number = NEW.product_batch_lot AND production_date = NEW.production_date
+    ) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Archived consumption references a product batch that is not archived.';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM INGREDIENT_BATCH WHERE lot_number = NEW.ingredient_batch_lot) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Archived consumption references a missing ingredient lot.';
+    END IF;
+END$$
+
+-- Triggers 16-17: Archived rows are never updated
+CREATE TRIGGER trg_product_batch_archive_readonly
+BEFORE UPDATE ON PRODUCT_BATCH_ARCHIVE
+FOR EACH ROW
+BEGIN
+    SIGNAL SQLSTATE '45000'
+    SET MESSAGE_TEXT = 'Archived production history is read-only.';
+END$$
+
+CREATE TRIGGER trg_consumption_archive_readonly
+BEFORE UPDATE ON BATCH_CONSUMPTION_ARCHIVE
+FOR EACH ROW
+BEGIN
+    SIGNAL SQLSTATE '45000'
+    SET MESSAGE_TEXT = 'Archived production history is read-only.';
+END$$
+
+-- Trigger 18: ON DELETE RESTRICT for archived batches with consumption rows
+CREATE TRIGGER trg_product_batch_archive_delete
+BEFORE DELETE ON PRODUCT_BATCH_ARCHIVE
+FOR EACH ROW
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM BATCH_CONSUMPTION_ARCHIVE
+        WHERE product_batch_lot = OLD.lot_number AND production_date = OLD.production_date
+    ) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete: referenced by archived production history.';
+    END IF;
+END$$
+
+-- Trigger 19: ON DELETE RESTRICT for rows the archive references
+CREATE TRIGGER trg_product_archive_restrict
+BEFORE DELETE ON PRODUCT
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM PRODUCT_BATCH_ARCHIVE WHERE product_id = OLD.product_id) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete: referenced by archived production history.';
+    END IF;
+END$$
+
+CREATE TRIGGER trg_manufacturer_archive_restrict
+BEFORE DELETE ON MANUFACTURER
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM PRODUCT_BATCH_ARCHIVE WHERE manufacturer_id = OLD.manufacturer_id) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete: referenced by archived production history.';
+    END IF;
+END$$
+
+CREATE TRIGGER trg_recipe_plan_archive_restrict
+BEFORE DELETE ON RECIPE_PLAN
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM PRODUCT_BATCH_ARCHIVE WHERE plan_id = OLD.plan_id) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete: referenced by archived production history.';
+    END IF;
+END$$
+
+CREATE TRIGGER trg_ingredient_batch_archive_restrict
+BEFORE DELETE ON INGREDIENT_BATCH
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM BATCH_CONSUMPTION_ARCHIVE WHERE ingredient_batch_lot = OLD.lot_number) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot delete: referenced by archived production history.';
     END IF;
 END$$
 
@@ -358,6 +774,126 @@ END$$
 
 DELIMITER ;
 
+-- Stored Procedure - RecordProductionBatchSet
+-- Set-based version of RecordProductionBatch for large ingredient lists.
+-- Shreds the JSON list with JSON_TABLE, locks every ingredient lot in
+-- lot_number order with a single SELECT ... FOR UPDATE, validates expiry
+-- and quantity for all lots together, then inserts consumption rows in bulk;
+-- trigger 3 still validates and decrements each row against the lots
+-- already locked here. Same parameters and result set as the original.
+DELIMITER $$
+
+CREATE PROCEDURE RecordProductionBatchSet (
+    IN in_product_id INT,
+    IN in_plan_id INT,
+    IN in_manufacturer_id VARCHAR(20),
+    IN in_batch_id VARCHAR(20),
+    IN in_produced_units INT,
+    IN in_ingredient_list JSON
+)
+BEGIN
+    DECLARE batch_total DECIMAL(12,2) DEFAULT 0.0;
+    DECLARE unit_cost DECIMAL(12,4);
+    DECLARE lot_num VARCHAR(50);
+    DECLARE std_batch_size INT;
+    DECLARE n_lines INT;
+    DECLARE n_found INT;
+    DECLARE n_expired INT;
+    DECLARE n_short INT;
+
+    SELECT standard_batch_size INTO std_batch_size
+    FROM PRODUCT
+    WHERE product_id = in_product_id;
+
+    IF in_produced_units % std_batch_size != 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Produced units must be a multiple of standard batch size.';
+    END IF;
+
+    SET lot_num = CONCAT(in_product_id, '-', in_manufacturer_id, '-', in_batch_id);
+
+    IF EXISTS (SELECT 1 FROM PRODUCT_BATCH WHERE lot_number = lot_num) THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Product batch lot number already exists.';
+    END IF;
+
+    -- Shred the ingredient list once; a lot listed twice becomes one line
+    -- with the summed quantity
+    DROP TEMPORARY TABLE IF EXISTS tmp_batch_lines;
+    CREATE TEMPORARY TABLE tmp_batch_lines (
+        lot VARCHAR(50) NOT NULL,
+        qty DECIMAL(10,3) NOT NULL,
+        PRIMARY KEY (lot)
+    ) ENGINE = InnoDB;
+
+    INSERT INTO tmp_batch_lines (lot, qty)
+    SELECT jt.lot, SUM(jt.qty)
+    FROM JSON_TABLE(
+        in_ingredient_list, '$[*]' COLUMNS (
+            lot VARCHAR(50) PATH '$.lot' ERROR ON EMPTY,
+            qty DECIMAL(10,3) PATH '$.qty' ERROR ON EMPTY
+        )
+    ) AS jt
+    GROUP BY jt.lot;
+
+    SET n_lines = ROW_COUNT();
+
+    -- Lock and validate every lot in one pass. STRAIGHT_JOIN drives the scan
+    -- from the temporary table's primary key, so row locks are always taken
+    -- in lot_number order and concurrent batches cannot lock in opposite orders.
+    SELECT STRAIGHT_JOIN
+        COUNT(*),
+        COALESCE(SUM(ib.expiration_date < CURRENT_DATE()), 0),
+        COALESCE(SUM(ib.on_hand_oz < t.qty), 0),
+        COALESCE(SUM(ib.cost_per_unit * t.qty), 0)
+    INTO n_found, n_expired, n_short, batch_total
+    FROM tmp_batch_lines t
+    JOIN INGREDIENT_BATCH ib ON ib.lot_number = t.lot
+    FOR UPDATE OF ib;
+
+    IF n_found < n_lines THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Unknown ingredient lot in list.';
+    END IF;
+
+    IF n_expired > 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Cannot consume expired ingredient lot.';
+    END IF;
+
+    IF n_short > 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Insufficient quantity in ingredient lot.';
+    END IF;
+
+    SET unit_cost = batch_total / in_produced_units;
+
+    INSERT INTO PRODUCT_BATCH (
+        lot_number, product_id, manufacturer_id, plan_id, batch_id,
+        quantity_produced, total_cost, per_unit_cost, production_date
+    ) VALUES (
+        lot_num, in_product_id, in_manufacturer_id, in_plan_id, in_batch_id,
+        in_produced_units, batch_total, unit_cost, CURRENT_DATE()
+    );
+
+    -- Trigger 3 decrements each lot; its FOR UPDATE finds the lock already held
+    INSERT INTO BATCH_CONSUMPTION (product_batch_lot, ingredient_batch_lot, quantity_consumed)
+    SELECT lot_num, t.lot, t.qty
+    FROM tmp_batch_lines t
+    ORDER BY t.lot;
+
+    DROP TEMPORARY TABLE tmp_batch_lines;
+
+    SELECT
+        lot_num AS product_lot,
+        in_product_id AS product_id,
+        batch_total AS batch_total_cost,
+        unit_cost AS unit_cost,
+        in_produced_units AS produced_units;
+END$$
+
+DELIMITER ;
+
 -- ============================================================
 -- SECTION 6: VIEWS
 -- ============================================================
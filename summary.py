@@ -0,0 +1,127 @@
+"""
+Summary Module
+Rebuild and verify the trigger-maintained report summary tables
+
+INGREDIENT_STOCK_SUMMARY (on-hand per manufacturer and ingredient) and
+FINISHED_GOODS_SUMMARY (units produced per manufacturer and product, with
+archived batches still counted) are kept current by triggers on
+INGREDIENT_BATCH and PRODUCT_BATCH. verify()
+recomputes both from the base tables and reports any row that has drifted
+(e.g. after a bulk load with triggers dropped, or on a database created
+before the tables existed); rebuild() recomputes them in one transaction.
+"""
+
+from decimal import Decimal
+
+
+# Each summary: key columns, value columns, and the query that derives it
+# from the base table (selecting key columns then value columns)
+SUMMARY_TABLES = {
+    'INGREDIENT_STOCK_SUMMARY': (
+        ('manufacturer_id', 'ingredient_id'),
+        ('on_hand_oz', 'open_lots'),
+        """
+            SELECT manufacturer_id, ingredient_id,
+                   COALESCE(SUM(on_hand_oz), 0) AS on_hand_oz,
+                   SUM(COALESCE(on_hand_oz, 0) > 0) AS open_lots
+            FROM INGREDIENT_BATCH
+            WHERE manufacturer_id IS NOT NULL
+            GROUP BY manufacturer_id, ingredient_id
+        """
+    ),
+    'FINISHED_GOODS_SUMMARY': (
+        ('manufacturer_id', 'product_id'),
+        ('units_produced', 'batch_count'),
+        """
+            SELECT manufacturer_id, product_id,
+                   SUM(quantity_produced) AS units_produced,
+                   COUNT(*) AS batch_count
+            FROM (
+                SELECT manufacturer_id, product_id, quantity_produced FROM PRODUCT_BATCH
+                UNION ALL
+                SELECT manufacturer_id, product_id, quantity_produced FROM PRODUCT_BATCH_ARCHIVE
+            ) pb
+            GROUP BY manufacturer_id, product_id
+        """
+    )
+}
+
+
+def _by_key(rows, key_columns, value_columns):
+    return {
+        tuple(row[c] for c in key_columns): tuple(Decimal(row[c]) for c in value_columns)
+        for row in rows
+    }
+
+
+def verify(db_connection, tables=None):
+    """
+    Compare each summary table with a fresh aggregate of its base table
+    
+    Missing summary rows count as zero, so products that were never
+    produced do not show up as drift.
+    
+    Args:
+        tables (list): Summary tables to check (default: all)
+    
+    Returns:
+        list: One dictionary per drifted row (table, key columns, expected and actual values)
+    """
+    drift = []
+    for table in tables or SUMMARY_TABLES:
+        key_columns, value_columns, source_sql = SUMMARY_TABLES[table]
+        expected = _by_key(
+            db_connection.fetch_all(source_sql, row_factory='dict'), key_columns, value_columns
+        )
+        actual = _by_key(
+            db_connection.fetch_all(
+                f"SELECT {', '.join(key_columns + value_columns)} FROM {table}", row_factory='dict'
+            ),
+            key_columns, value_columns
+        )
+        zero = (Decimal(0),) * len(value_columns)
+        for key in sorted(expected.keys() | actual.keys(), key=lambda k: tuple(map(str, k))):
+            want = expected.get(key, zero)
+            have = actual.get(key, zero)
+            if want != have:
+                row = {'table': table, **dict(zip(key_columns, key))}
+                for column, w, h in zip(value_columns, want, have):
+                    row[f'expected_{column}'] = w
+                    row[f'actual_{column}'] = h
+                drift.append(row)
+    return drift
+
+
+def rebuild(db_connection, tables=None):
+    """
+    Recompute summary tables from their base tables in one transaction
+    
+    INSERT ... SELECT share-locks the base rows it reads, so writers that
+    would fire the maintenance triggers wait until the rebuild commits.
+    
+    Args:
+        tables (list): Summary tables to rebuild (default: all)
+    
+    Returns:
+        dict: table -> rows written
+    """
+    tables = list(tables or SUMMARY_TABLES)
+    counts = {}
+    with db_connection.checkout() as connection:
+        cursor = connection.cursor()
+        try:
+            for table in tables:
+                key_columns, value_columns, source_sql = SUMMARY_TABLES[table]
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(key_columns + value_columns)}) {source_sql}"
+                )
+                counts[table] = cursor.rowcount
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    db_connection.invalidate(tables)
+    return counts
\ No newline at end of file
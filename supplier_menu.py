@@ -3,6 +3,8 @@ Supplier Menu Module
 Handles all supplier-specific operations
 """
 
+from batch_import import IngredientBatchImporter, compute_lot_number
+
 
 class SupplierMenu:
     def __init__(self, db_connection, user):
@@ -20,9 +22,10 @@ class SupplierMenu:
             print("2. Define/Update Ingredient")
             print("3. Create Ingredient Batch")
             print("4. Execute Queries")
-            print("5. Logout")
+            print("5. Import Ingredient Batches (CSV/JSONL)")
+            print("6. Logout")
             
-            choice = input("\nEnter choice (1-5): ").strip()
+            choice = input("\nEnter choice (1-6): ").strip()
             
             if choice == '1':
                 self.view_ingredients_supplied()
@@ -33,6 +36,8 @@ class SupplierMenu:
             elif choice == '4':
                 self.execute_queries()
             elif choice == '5':
+                self.import_ingredient_batches()
+            elif choice == '6':
                 print("\nLogging out...")
                 break
             else:
@@ -155,6 +160,7 @@ class SupplierMenu:
                     print("✓ Material added")
             
             connection.commit()
+            self.db.invalidate(['INGREDIENT', 'FORMULATION', 'FORMULATION_MATERIAL'])
             print(f"\n✓ Ingredient fully defined!")
             
         except Exception as e:
@@ -212,16 +218,10 @@ class SupplierMenu:
                   cost_per_unit, expiration_date))
             
             connection.commit()
+            self.db.invalidate(['INGREDIENT_BATCH'])
             
-            # Get the generated lot number
-            cursor.execute("""
-                SELECT lot_number 
-                FROM INGREDIENT_BATCH 
-                WHERE ingredient_id = %s AND supplier_id = %s AND batch_id = %s
-            """, (ingredient_id, self.supplier_id, batch_id))
-            
-            result = cursor.fetchone()
-            lot_number = result['lot_number'] if result else 'Unknown'
+            # Same format the lot-number trigger generates
+            lot_number = compute_lot_number(ingredient_id, self.supplier_id, batch_id)
             
             print(f"\n✓ Ingredient batch created successfully!")
             print(f"   Lot Number: {lot_number}")
@@ -233,6 +233,26 @@ class SupplierMenu:
         finally:
             cursor.close()
     
+    def import_ingredient_batches(self):
+        """Create many ingredient batches from a CSV or JSONL file"""
+        print("\n=== IMPORT INGREDIENT BATCHES ===")
+        print("Columns: ingredient_id, batch_id, quantity, cost_per_unit, expiration_date")
+        
+        path = input("File path: ").strip()
+        
+        try:
+            importer = IngredientBatchImporter(self.db, supplier_id=self.supplier_id)
+            report = importer.import_file(path)
+        except Exception as e:
+            print(f"\n✗ Error importing ingredient batches: {e}")
+            return
+        
+        print(f"\n✓ Imported {report.inserted} ingredient batches")
+        if report.errors:
+            print(f"✗ {len(report.errors)} rows rejected:")
+            for err in report.errors:
+                print(f"   line {err['line']}: {err['error']}")
+    
     def execute_queries(self):
         """Execute required retrieval queries"""
         from query_executor import QueryExecutor
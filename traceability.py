@@ -0,0 +1,612 @@
+"""
+Traceability Module
+Forward and backward lot genealogy for recalls
+
+Backward: a product lot to the ingredient lots (and suppliers) it consumed.
+Forward: ingredient lots, or every lot a supplier delivered in a date
+window, to the product lots and manufacturers that consumed them.
+
+Queries run against the database by default. LineageIndex loads every
+consumption edge into compact in-memory adjacency arrays so repeated
+recall questions are answered without touching the server. Archived
+production history (archive.py) is searched only for lots and windows the
+archive watermark says it can hold.
+
+Usage (index maintenance and timing):
+    python traceability.py --create-indexes
+    python traceability.py --index-stats --supplier 20 --from 2024-01-01 --to 2024-03-31
+"""
+
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from decimal import Decimal
+import sys
+import time
+
+from archive import WATERMARK_SQL, archive_sql, load_watermark
+from database_connection import DatabaseConnection
+
+
+# Supporting indexes for the forward (ingredient lot -> product lot) direction.
+# The BATCH_CONSUMPTION primary key only serves product lot -> ingredient lots.
+TRACE_INDEXES = {
+    'idx_consumption_ingredient_lot': (
+        'BATCH_CONSUMPTION',
+        "CREATE INDEX idx_consumption_ingredient_lot "
+        "ON BATCH_CONSUMPTION(ingredient_batch_lot, product_batch_lot, quantity_consumed)"
+    ),
+    'idx_ingredient_batch_supplier_received': (
+        'INGREDIENT_BATCH',
+        "CREATE INDEX idx_ingredient_batch_supplier_received "
+        "ON INGREDIENT_BATCH(supplier_id, received_date)"
+    )
+}
+
+EXISTING_INDEXES_SQL = """
+    SELECT DISTINCT index_name
+    FROM information_schema.STATISTICS
+    WHERE table_schema = DATABASE() AND table_name IN ('BATCH_CONSUMPTION', 'INGREDIENT_BATCH')
+"""
+
+FORWARD_COLUMNS = """
+        bc.ingredient_batch_lot AS ingredient_lot,
+        bc.product_batch_lot AS product_lot,
+        pb.product_id,
+        p.name AS product_name,
+        pb.manufacturer_id,
+        m.name AS manufacturer_name,
+        pb.production_date,
+        bc.quantity_consumed
+"""
+
+# Product lots that consumed any of the given ingredient lots
+TRACE_FORWARD_SQL = """
+    SELECT {columns}
+    FROM BATCH_CONSUMPTION bc
+    JOIN PRODUCT_BATCH pb ON bc.product_batch_lot = pb.lot_number
+    JOIN PRODUCT p ON pb.product_id = p.product_id
+    JOIN MANUFACTURER m ON pb.manufacturer_id = m.manufacturer_id
+    WHERE bc.ingredient_batch_lot IN ({placeholders})
+    ORDER BY pb.manufacturer_id, bc.product_batch_lot, bc.ingredient_batch_lot
+"""
+
+# Product lots that consumed any lot a supplier delivered in a date window
+TRACE_SUPPLIER_SQL = """
+    SELECT {columns}
+    FROM INGREDIENT_BATCH ib
+    JOIN BATCH_CONSUMPTION bc ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN PRODUCT_BATCH pb ON bc.product_batch_lot = pb.lot_number
+    JOIN PRODUCT p ON pb.product_id = p.product_id
+    JOIN MANUFACTURER m ON pb.manufacturer_id = m.manufacturer_id
+    WHERE ib.supplier_id = %s
+      AND ib.received_date BETWEEN %s AND %s
+      AND (%s IS NULL OR ib.ingredient_id = %s)
+    ORDER BY pb.manufacturer_id, bc.product_batch_lot, bc.ingredient_batch_lot
+"""
+
+# Ingredient lots consumed by any of the given product lots
+TRACE_BACKWARD_SQL = """
+    SELECT
+        bc.product_batch_lot AS product_lot,
+        bc.ingredient_batch_lot AS ingredient_lot,
+        ib.ingredient_id,
+        i.name AS ingredient_name,
+        ib.supplier_id,
+        s.name AS supplier_name,
+        ib.received_date,
+        ib.expiration_date,
+        bc.quantity_consumed
+    FROM BATCH_CONSUMPTION bc
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    JOIN SUPPLIER s ON ib.supplier_id = s.supplier_id
+    WHERE bc.product_batch_lot IN ({placeholders})
+    ORDER BY bc.product_batch_lot, bc.ingredient_batch_lot
+"""
+
+# Requested ingredient lots received early enough to have archived consumption
+ARCHIVE_CANDIDATE_LOTS_SQL = """
+    SELECT lot_number
+    FROM INGREDIENT_BATCH
+    WHERE received_date <= %s AND lot_number IN ({placeholders})
+"""
+
+# Sources for LineageIndex.build (streamed; the supplier order feeds the window lookup)
+INDEX_INGREDIENT_LOTS_SQL = """
+    SELECT lot_number, supplier_id, ingredient_id, received_date, expiration_date
+    FROM INGREDIENT_BATCH
+    ORDER BY supplier_id, received_date, lot_number
+"""
+
+INDEX_PRODUCT_LOTS_SQL = """
+    SELECT lot_number, product_id, manufacturer_id, production_date
+    FROM PRODUCT_BATCH
+"""
+
+INDEX_EDGES_SQL = """
+    SELECT ingredient_batch_lot, product_batch_lot, quantity_consumed
+    FROM BATCH_CONSUMPTION
+"""
+
+INDEX_NAMES_SQL = {
+    'product': "SELECT product_id, name FROM PRODUCT",
+    'manufacturer': "SELECT manufacturer_id, name FROM MANUFACTURER",
+    'ingredient': "SELECT ingredient_id, name FROM INGREDIENT",
+    'supplier': "SELECT supplier_id, name FROM SUPPLIER"
+}
+
+# Widest window accepted by DATE columns
+MIN_DATE = date(1000, 1, 1)
+MAX_DATE = date(9999, 12, 31)
+
+IN_LIST_CHUNK = 1000
+
+# Decimal places of BATCH_CONSUMPTION.quantity_consumed; the index stores
+# quantities as integer thousandths so rows match the SQL path exactly
+QUANTITY_SCALE = 3
+
+
+def ensure_indexes(db_connection):
+    """
+    Create any missing traceability index
+    
+    Returns:
+        list: Names of the indexes created
+    """
+    existing = {row[0] for row in db_connection.fetch_all(EXISTING_INDEXES_SQL, row_factory='tuple')}
+    created = []
+    for name, (_, ddl) in TRACE_INDEXES.items():
+        if name not in existing:
+            db_connection.execute_query(ddl, fetch=False)
+            created.append(name)
+    return created
+
+
+class RecallReport:
+    """Affected lots and manufacturers for a set of forward trace rows"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.ingredient_lots = sorted({row['ingredient_lot'] for row in rows})
+        self.product_lots = sorted({row['product_lot'] for row in rows})
+        self.manufacturers = {}
+        seen = set()
+        for row in rows:
+            entry = self.manufacturers.setdefault(row['manufacturer_id'], {
+                'manufacturer_id': row['manufacturer_id'],
+                'manufacturer_name': row['manufacturer_name'],
+                'product_lots': 0
+            })
+            if row['product_lot'] not in seen:
+                seen.add(row['product_lot'])
+                entry['product_lots'] += 1
+    
+    def as_dict(self):
+        return {
+            'ingredient_lots': self.ingredient_lots,
+            'product_lots': self.product_lots,
+            'manufacturers': sorted(self.manufacturers.values(), key=lambda m: m['manufacturer_id'])
+        }
+
+
+class _Interner:
+    """Dense integer ids for lot numbers"""
+    
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        
+    def add(self, name):
+        node = self.ids.get(name)
+        if node is None:
+            node = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return node
+
+
+def _adjacency(sources, targets, n_nodes):
+    """
+    Compressed sparse row adjacency: the neighbours of node n are
+    neighbours[offsets[n]:offsets[n + 1]], with the matching edge numbers
+    in edges[offsets[n]:offsets[n + 1]]
+    """
+    counts = array('Q', bytes(8 * (n_nodes + 1)))
+    for node in sources:
+        counts[node + 1] += 1
+    for node in range(n_nodes):
+        counts[node + 1] += counts[node]
+    
+    neighbours = array('I', bytes(4 * len(sources)))
+    edges = array('I', bytes(4 * len(sources)))
+    position = counts[:-1]
+    for edge, (source, target) in enumerate(zip(sources, targets)):
+        slot = position[source]
+        neighbours[slot] = target
+        edges[slot] = edge
+        position[source] = slot + 1
+    return counts, neighbours, edges
+
+
+class LineageIndex:
+    """
+    In-memory snapshot of the lot genealogy
+    
+    Lot numbers are interned to integers and edges stored as array-backed
+    adjacency lists in both directions (about 24 bytes per consumption
+    edge), so a recall touching thousands of lots is a few slice reads.
+    The index reflects the database when build() ran; rebuild it (or use
+    the SQL path) when recent batches matter.
+    """
+    
+    def __init__(self):
+        self.ingredient_lots = _Interner()
+        self.product_lots = _Interner()
+        self.skipped_edges = 0
+        self.built_at = None
+        self.build_seconds = None
+        
+    @classmethod
+    def build(cls, db_connection, chunk_size=None):
+        """
+        Load every lot and consumption edge from the database
+        
+        Every statement runs on one connection inside a single read-only
+        START TRANSACTION WITH CONSISTENT SNAPSHOT (which, like any START
+        TRANSACTION, ends a transaction already open on that connection),
+        so lots, batches, edges and the archive split all come from the same
+        point in time. Edges whose lots are still missing are counted in
+        skipped_edges rather than failing the build.
+        """
+        index = cls()
+        started = time.perf_counter()
+        chunk_size = chunk_size or db_connection.stream_chunk_size
+        
+        with db_connection.checkout() as connection:
+            cursor = connection.cursor()
+            
+            def stream(sql):
+                stream_cursor = connection.cursor(buffered=False)
+                try:
+                    stream_cursor.execute(sql)
+                    while True:
+                        rows = stream_cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    if connection.unread_result:
+                        connection.consume_results()
+                    stream_cursor.close()
+            
+            try:
+                cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+                
+                # Archived batches are part of the genealogy: stream them after the hot ones
+                cursor.execute(WATERMARK_SQL)
+                watermark = cursor.fetchall()
+                archived = bool(watermark) and watermark[0][0] is not None
+                
+                def history(sql):
+                    yield from stream(sql)
+                    if archived:
+                        yield from stream(archive_sql(sql))
+                
+                index.names = {}
+                for kind, sql in INDEX_NAMES_SQL.items():
+                    cursor.execute(sql)
+                    index.names[kind] = dict(cursor.fetchall())
+                
+                index._load(stream, history)
+            finally:
+                connection.rollback()
+                cursor.close()
+        
+        index.built_at = time.time()
+        index.build_seconds = time.perf_counter() - started
+        return index
+        
+    def _load(self, stream, history):
+        """Fill the arrays from the lot, batch and edge streams"""
+        # Ingredient lots arrive grouped by supplier in received order, so
+        # each supplier's lots form one sorted run for bisecting date windows
+        lots = self.ingredient_lots
+        self.supplier_id = array('i')
+        self.ingredient_id = array('i')
+        self.received = array('i')
+        self.expiration = array('i')
+        self.supplier_runs = {}
+        for chunk in stream(INDEX_INGREDIENT_LOTS_SQL):
+            for lot_number, supplier_id, ingredient_id, received, expiration in chunk:
+                if lot_number in lots.ids:
+                    continue
+                node = lots.add(lot_number)
+                self.supplier_id.append(supplier_id)
+                self.ingredient_id.append(ingredient_id)
+                self.received.append(received.toordinal())
+                self.expiration.append(expiration.toordinal())
+                run = self.supplier_runs.setdefault(supplier_id, [node, node])
+                run[1] = node + 1
+        
+        # A lot seen both hot and archived keeps its first (hot) entry, so
+        # the per-lot arrays stay aligned with product_lots.names
+        products = self.product_lots
+        self.manufacturers = []
+        manufacturer_ids = {}
+        self.product_id = array('i')
+        self.manufacturer = array('I')
+        self.produced = array('i')
+        for chunk in history(INDEX_PRODUCT_LOTS_SQL):
+            for lot_number, product_id, manufacturer_id, produced in chunk:
+                if lot_number in products.ids:
+                    continue
+                products.add(lot_number)
+                if manufacturer_id not in manufacturer_ids:
+                    manufacturer_ids[manufacturer_id] = len(self.manufacturers)
+                    self.manufacturers.append(manufacturer_id)
+                self.product_id.append(product_id)
+                self.manufacturer.append(manufacturer_ids[manufacturer_id])
+                self.produced.append(produced.toordinal())
+        
+        sources = array('I')
+        targets = array('I')
+        self.quantity = array('q')
+        self.skipped_edges = 0
+        lot_ids = lots.ids
+        product_ids = products.ids
+        for chunk in history(INDEX_EDGES_SQL):
+            for ingredient_lot, product_lot, quantity in chunk:
+                source = lot_ids.get(ingredient_lot)
+                target = product_ids.get(product_lot)
+                if source is None or target is None:
+                    self.skipped_edges += 1
+                    continue
+                sources.append(source)
+                targets.append(target)
+                self.quantity.append(int(Decimal(quantity).scaleb(QUANTITY_SCALE)))
+        
+        self.forward_edges = _adjacency(sources, targets, len(lots.names))
+        self.backward_edges = _adjacency(targets, sources, len(products.names))
+        
+    @property
+    def edge_count(self):
+        return len(self.quantity)
+        
+    def _quantity(self, edge):
+        return Decimal(self.quantity[edge]).scaleb(-QUANTITY_SCALE)
+        
+    def _neighbours(self, adjacency, node):
+        offsets, neighbours, edges = adjacency
+        start, end = offsets[node], offsets[node + 1]
+        return zip(neighbours[start:end], edges[start:end])
+        
+    def _forward_row(self, lot_node, product_node, edge):
+        manufacturer_id = self.manufacturers[self.manufacturer[product_node]]
+        product_id = self.product_id[product_node]
+        return {
+            'ingredient_lot': self.ingredient_lots.names[lot_node],
+            'product_lot': self.product_lots.names[product_node],
+            'product_id': product_id,
+            'product_name': self.names['product'].get(product_id),
+            'manufacturer_id': manufacturer_id,
+            'manufacturer_name': self.names['manufacturer'].get(manufacturer_id),
+            'production_date': date.fromordinal(self.produced[product_node]),
+            'quantity_consumed': self._quantity(edge)
+        }
+        
+    def _forward(self, lot_nodes):
+        rows = [
+            self._forward_row(lot_node, product_node, edge)
+            for lot_node in lot_nodes
+            for product_node, edge in self._neighbours(self.forward_edges, lot_node)
+        ]
+        rows.sort(key=lambda r: (r['manufacturer_id'], r['product_lot'], r['ingredient_lot']))
+        return rows
+        
+    def forward(self, ingredient_lots):
+        """Rows shaped like TRACE_FORWARD_SQL for the given ingredient lots"""
+        ids = self.ingredient_lots.ids
+        return self._forward(ids[lot] for lot in dict.fromkeys(ingredient_lots) if lot in ids)
+        
+    def supplier_lots(self, supplier_id, start=None, end=None, ingredient_id=None):
+        """Ingredient lot nodes a supplier delivered between start and end (inclusive)"""
+        run = self.supplier_runs.get(supplier_id)
+        if run is None:
+            return []
+        first = bisect_left(self.received, (start or MIN_DATE).toordinal(), run[0], run[1])
+        last = bisect_right(self.received, (end or MAX_DATE).toordinal(), run[0], run[1])
+        nodes = range(first, last)
+        if ingredient_id is not None:
+            nodes = [node for node in nodes if self.ingredient_id[node] == ingredient_id]
+        return nodes
+        
+    def supplier_window(self, supplier_id, start=None, end=None, ingredient_id=None):
+        """Rows shaped like TRACE_SUPPLIER_SQL"""
+        return self._forward(self.supplier_lots(supplier_id, start, end, ingredient_id))
+        
+    def backward(self, product_lots):
+        """Rows shaped like TRACE_BACKWARD_SQL for the given product lots"""
+        ids = self.product_lots.ids
+        rows = []
+        for product_lot in sorted(set(product_lots)):
+            product_node = ids.get(product_lot)
+            if product_node is None:
+                continue
+            lines = []
+            for lot_node, edge in self._neighbours(self.backward_edges, product_node):
+                supplier_id = self.supplier_id[lot_node]
+                ingredient_id = self.ingredient_id[lot_node]
+                lines.append({
+                    'product_lot': product_lot,
+                    'ingredient_lot': self.ingredient_lots.names[lot_node],
+                    'ingredient_id': ingredient_id,
+                    'ingredient_name': self.names['ingredient'].get(ingredient_id),
+                    'supplier_id': supplier_id,
+                    'supplier_name': self.names['supplier'].get(supplier_id),
+                    'received_date': date.fromordinal(self.received[lot_node]),
+                    'expiration_date': date.fromordinal(self.expiration[lot_node]),
+                    'quantity_consumed': self._quantity(edge)
+                })
+            rows.extend(sorted(lines, key=lambda r: r['ingredient_lot']))
+        return rows
+
+
+class Traceability:
+    """
+    Lineage queries, answered from a LineageIndex when one is attached and
+    from the database otherwise (both return the same row dictionaries)
+    """
+    
+    def __init__(self, db_connection, index=None):
+        self.db = db_connection
+        self.index = index
+        
+    def build_index(self, chunk_size=None):
+        """Build (or rebuild) the in-memory index and use it from now on"""
+        self.index = LineageIndex.build(self.db, chunk_size)
+        return self.index
+        
+    def _in_chunks(self, sql, lots, columns=None):
+        lots = list(dict.fromkeys(lots))
+        rows = []
+        for i in range(0, len(lots), IN_LIST_CHUNK):
+            chunk = lots[i:i + IN_LIST_CHUNK]
+            query = sql.format(columns=columns, placeholders=', '.join(['%s'] * len(chunk)))
+            rows.extend(self.db.fetch_all(query, tuple(chunk), row_factory='dict'))
+        return rows
+        
+    def _archive_candidates(self, ingredient_lots):
+        """Requested ingredient lots whose consumption can be in the archive"""
+        watermark = load_watermark(self.db)
+        if not watermark.covers_receipts():
+            return []
+        lots = list(dict.fromkeys(ingredient_lots))
+        candidates = []
+        for i in range(0, len(lots), IN_LIST_CHUNK):
+            chunk = lots[i:i + IN_LIST_CHUNK]
+            query = ARCHIVE_CANDIDATE_LOTS_SQL.format(placeholders=', '.join(['%s'] * len(chunk)))
+            rows = self.db.fetch_all(query, (watermark.received_through, *chunk), row_factory='tuple')
+            candidates.extend(row[0] for row in rows)
+        return candidates
+        
+    def backward(self, product_lots):
+        """
+        Ingredient lots consumed by product lots
+        
+        Args:
+            product_lots (list): Product batch lot numbers
+        
+        Returns:
+            list: Rows with ingredient, supplier and quantity consumed
+        """
+        if self.index is not None:
+            return self.index.backward(product_lots)
+        rows = self._in_chunks(TRACE_BACKWARD_SQL, product_lots)
+        if not load_watermark(self.db).empty:
+            # A product lot is either hot or archived; look up the ones not found
+            found = {row['product_lot'] for row in rows}
+            missing = [lot for lot in product_lots if lot not in found]
+            if missing:
+                rows.extend(self._in_chunks(archive_sql(TRACE_BACKWARD_SQL), missing))
+        rows.sort(key=lambda r: (r['product_lot'], r['ingredient_lot']))
+        return rows
+        
+    def forward(self, ingredient_lots):
+        """
+        Product lots that consumed any of the given ingredient lots
+        
+        Args:
+            ingredient_lots (list): Ingredient batch lot numbers
+        
+        Returns:
+            list: Rows with product lot, manufacturer and quantity consumed
+        """
+        if self.index is not None:
+            return self.index.forward(ingredient_lots)
+        rows = self._in_chunks(TRACE_FORWARD_SQL, ingredient_lots, FORWARD_COLUMNS)
+        archived = self._archive_candidates(ingredient_lots)
+        if archived:
+            rows.extend(self._in_chunks(archive_sql(TRACE_FORWARD_SQL), archived, FORWARD_COLUMNS))
+        rows.sort(key=lambda r: (r['manufacturer_id'], r['product_lot'], r['ingredient_lot']))
+        return rows
+        
+    def supplier_window(self, supplier_id, start=None, end=None, ingredient_id=None):
+        """
+        Product lots that consumed any lot a supplier delivered in a window
+        
+        Args:
+            supplier_id (int): Supplier ID
+            start (date): First received date (open-ended when None)
+            end (date): Last received date (open-ended when None)
+            ingredient_id (int): Limit to one ingredient (optional)
+        
+        Returns:
+            list: Rows shaped like forward()
+        """
+        if self.index is not None:
+            return self.index.supplier_window(supplier_id, start, end, ingredient_id)
+        sql = TRACE_SUPPLIER_SQL.format(columns=FORWARD_COLUMNS)
+        params = (supplier_id, start or MIN_DATE, end or MAX_DATE, ingredient_id, ingredient_id)
+        rows = self.db.fetch_all(sql, params, row_factory='dict')
+        if load_watermark(self.db).covers_receipts(start):
+            rows.extend(self.db.fetch_all(archive_sql(sql), params, row_factory='dict'))
+            rows.sort(key=lambda r: (r['manufacturer_id'], r['product_lot'], r['ingredient_lot']))
+        return rows
+        
+    @staticmethod
+    def recall(rows):
+        """Summarize forward rows into affected lots and manufacturers"""
+        return RecallReport(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traceability index maintenance and timing")
+    parser.add_argument('--create-indexes', action='store_true',
+                        help="Create the supporting indexes if they are missing")
+    parser.add_argument('--index-stats', action='store_true',
+                        help="Build the in-memory index and time a supplier recall against it and SQL")
+    parser.add_argument('--supplier', type=int, help="Supplier ID for --index-stats")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat)
+    parser.add_argument('--to', dest='end', type=date.fromisoformat)
+    args = parser.parse_args(argv)
+    
+    if not (args.create_indexes or args.index_stats):
+        parser.error("nothing to do: pass --create-indexes and/or --index-stats")
+    if args.index_stats and args.supplier is None:
+        parser.error("--index-stats needs --supplier")
+    
+    db = DatabaseConnection(verbose=False)
+    try:
+        if args.create_indexes:
+            created = ensure_indexes(db)
+            print(f"✓ Created {', '.join(created)}" if created else "✓ Indexes already present")
+        
+        if args.index_stats:
+            trace = Traceability(db)
+            started = time.perf_counter()
+            sql_rows = trace.supplier_window(args.supplier, args.start, args.end)
+            sql_ms = (time.perf_counter() - started) * 1000
+            
+            index = trace.build_index()
+            started = time.perf_counter()
+            index_rows = trace.supplier_window(args.supplier, args.start, args.end)
+            index_ms = (time.perf_counter() - started) * 1000
+            
+            report = trace.recall(index_rows)
+            print(f"Index: {len(index.ingredient_lots.names):,} ingredient lots, "
+                  f"{len(index.product_lots.names):,} product lots, {index.edge_count:,} edges "
+                  f"built in {index.build_seconds:.2f}s")
+            if index.skipped_edges:
+                print(f"Skipped {index.skipped_edges:,} edges with an unknown lot")
+            print(f"Recall: {len(report.product_lots):,} product lots at "
+                  f"{len(report.manufacturers)} manufacturers")
+            print(f"SQL {sql_ms:.1f} ms ({len(sql_rows)} rows), index {index_ms:.1f} ms "
+                  f"({len(index_rows)} rows)")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
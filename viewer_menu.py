@@ -3,6 +3,47 @@ Viewer Menu Module
 Handles all viewer (read-only) operations
 """
 
+from archive import archive_sql, load_watermark
+from bom import BillOfMaterials
+from report_output import peek, write_chunks
+
+
+BROWSE_PRODUCTS_SQL = """
+    SELECT 
+        p.product_id,
+        p.name AS product_name,
+        c.name AS category_name,
+        m.name AS manufacturer_name,
+        p.standard_batch_size
+    FROM PRODUCT p
+    JOIN CATEGORY c ON p.category_id = c.category_id
+    JOIN MANUFACTURER m ON p.manufacturer_id = m.manufacturer_id
+    ORDER BY m.name, c.name, p.name
+"""
+
+# Ingredients consumed by one product batch (also used by the command-line interface)
+INGREDIENT_LIST_SQL = """
+    SELECT 
+        i.ingredient_id,
+        i.name AS ingredient_name,
+        s.name AS supplier_name,
+        i.type,
+        bc.quantity_consumed
+    FROM BATCH_CONSUMPTION bc
+    JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
+    JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
+    JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
+    WHERE bc.product_batch_lot = %s
+    ORDER BY bc.quantity_consumed DESC, i.name
+"""
+
+# Production date of one batch (dates the formulations behind its compounds)
+PRODUCTION_DATE_SQL = """
+    SELECT production_date
+    FROM PRODUCT_BATCH
+    WHERE lot_number = %s
+"""
+
 
 class ViewerMenu:
     def __init__(self, db_connection):
@@ -37,26 +78,10 @@ class ViewerMenu:
         """Browse all products organized by manufacturer and category"""
         print("\n=== BROWSE PRODUCTS ===")
         
-        connection = self.db.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         try:
-            cursor.execute("""
-                SELECT 
-                    p.product_id,
-                    p.name AS product_name,
-                    c.name AS category_name,
-                    m.name AS manufacturer_name,
-                    p.standard_batch_size
-                FROM PRODUCT p
-                JOIN CATEGORY c ON p.category_id = c.category_id
-                JOIN MANUFACTURER m ON p.manufacturer_id = m.manufacturer_id
-                ORDER BY m.name, c.name, p.name
-            """)
+            first, chunks = peek(self.db.stream(BROWSE_PRODUCTS_SQL))
             
-            products = cursor.fetchall()
-            
-            if not products:
+            if first is None:
                 print("\nNo products available.")
                 return
             
@@ -64,19 +89,35 @@ class ViewerMenu:
             print("-" * 100)
             
             current_manufacturer = None
-            for p in products:
+            
+            def render(p):
+                nonlocal current_manufacturer
+                line = (f"{p['product_id']:<8} {p['product_name']:<30} {p['category_name']:<15} "
+                        f"{p['manufacturer_name']:<20} {p['standard_batch_size']}")
                 # Print manufacturer header when it changes
                 if current_manufacturer != p['manufacturer_name']:
                     current_manufacturer = p['manufacturer_name']
-                    print(f"\n--- {current_manufacturer} ---")
-                
-                print(f"{p['product_id']:<8} {p['product_name']:<30} {p['category_name']:<15} "
-                      f"{p['manufacturer_name']:<20} {p['standard_batch_size']}")
+                    return f"\n--- {current_manufacturer} ---\n{line}"
+                return line
+            
+            write_chunks(chunks, render)
             
         except Exception as e:
             print(f"\n✗ Error: {e}")
-        finally:
-            cursor.close()
+    
+    def fetch_ingredient_list(self, product_batch_lot):
+        """Ingredients consumed by a product batch (hot or archived)"""
+        rows = self.db.fetch_all(INGREDIENT_LIST_SQL, (product_batch_lot,))
+        if not rows and not load_watermark(self.db).empty:
+            rows = self.db.fetch_all(archive_sql(INGREDIENT_LIST_SQL), (product_batch_lot,))
+        return rows
+    
+    def fetch_production_date(self, product_batch_lot):
+        """Production date of a product batch (hot or archived), or None"""
+        row = self.db.fetch_one(PRODUCTION_DATE_SQL, (product_batch_lot,))
+        if row is None and not load_watermark(self.db).empty:
+            row = self.db.fetch_one(archive_sql(PRODUCTION_DATE_SQL), (product_batch_lot,))
+        return row['production_date'] if row else None
     
     def generate_ingredient_list(self):
         """
@@ -131,22 +172,7 @@ class ViewerMenu:
             product_batch_lot = input("\nSelect Product Batch Lot Number: ").strip()
             
             # Step 3: Display ingredients consumed in that batch
-            cursor.execute("""
-                SELECT 
-                    i.ingredient_id,
-                    i.name AS ingredient_name,
-                    s.name AS supplier_name,
-                    i.type,
-                    bc.quantity_consumed
-                FROM BATCH_CONSUMPTION bc
-                JOIN INGREDIENT_BATCH ib ON bc.ingredient_batch_lot = ib.lot_number
-                JOIN INGREDIENT i ON ib.ingredient_id = i.ingredient_id
-                JOIN SUPPLIER s ON i.supplier_id = s.supplier_id
-                WHERE bc.product_batch_lot = %s
-                ORDER BY bc.quantity_consumed DESC, i.name
-            """, (product_batch_lot,))
-            
-            ingredients = cursor.fetchall()
+            ingredients = self.fetch_ingredient_list(product_batch_lot)
             
             if not ingredients:
                 print("\nNo ingredients found for this batch.")
@@ -166,27 +192,25 @@ class ViewerMenu:
             if compound_ingredients:
                 print("\n--- Compound Ingredient Materials ---")
                 
+                # One load for every compound, expanded through the
+                # formulations in effect when the batch was produced
+                bom = BillOfMaterials.load(self.db, with_recipes=False)
+                as_of = self.fetch_production_date(product_batch_lot)
+                
                 for comp in compound_ingredients:
                     print(f"\n{comp['ingredient_name']} contains:")
                     
-                    # Get materials for this compound ingredient
-                    cursor.execute("""
-                        SELECT 
-                            i.name AS material_name,
-                            fm.quantity_required
-                        FROM FORMULATION f
-                        JOIN FORMULATION_MATERIAL fm ON f.formulation_id = fm.formulation_id
-                        JOIN INGREDIENT i ON fm.material_ingredient_id = i.ingredient_id
-                        WHERE f.ingredient_id = %s
-                          AND (f.effective_end_date IS NULL OR f.effective_end_date >= CURRENT_DATE)
-                          AND f.effective_start_date <= CURRENT_DATE
-                        ORDER BY fm.quantity_required DESC
-                    """, (comp['ingredient_id'],))
-                    
-                    materials = cursor.fetchall()
+                    formulation = bom.formulation_for(comp['ingredient_id'], as_of)
+                    materials = formulation.materials if formulation else []
+                    for material_id, quantity in sorted(materials, key=lambda m: -m[1]):
+                        print(f"  - {bom.ingredients[material_id]['name']}: {quantity} oz")
                     
-                    for mat in materials:
-                        print(f"  - {mat['material_name']}: {mat['quantity_required']} oz")
+                    # Nested compounds: also show the rolled-up atomic materials
+                    if any(bom.ingredients[m]['type'] == 'COMPOUND' for m, _ in materials):
+                        atomic = bom.explode(comp['ingredient_id'], comp['quantity_consumed'], as_of)
+                        print(f"  Atomic materials in {comp['quantity_consumed']} oz:")
+                        for material_id, amount in sorted(atomic.items(), key=lambda a: -a[1]):
+                            print(f"    {bom.ingredients[material_id]['name']}: {amount:.3f} oz")
             
         except Exception as e:
             print(f"\n✗ Error: {e}")